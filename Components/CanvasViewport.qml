@@ -66,6 +66,12 @@ Item {
             tempStart: 0.0
             tempEnd: 1.0
             tempPauseOnIdle: true
+            viewScale: root.viewportScale
+            // Visible part of the canvas, in canvas pixels
+            viewRect: Qt.rect(-root.viewportOffsetX / root.viewportScale,
+                              -root.viewportOffsetY / root.viewportScale,
+                              root.width / root.viewportScale,
+                              root.height / root.viewportScale)
         }
     }
 
@@ -85,7 +91,7 @@ Item {
                 lastY = mouse.y
             } else if (mouse.button === Qt.LeftButton) {
                 var pt = canvas.mapFromItem(viewMouseArea, mouse.x, mouse.y)
-                canvas.inputPressed(pt.x, pt.y)
+                canvas.inputPressedAt(pt.x, pt.y, canvas.pointerTimestamp())
             }
         }
         onPositionChanged: function(mouse) {
@@ -98,7 +104,7 @@ Item {
                 lastY = mouse.y
             } else if (mouse.buttons & Qt.LeftButton) {
                 var pt = canvas.mapFromItem(viewMouseArea, mouse.x, mouse.y)
-                canvas.inputMoved(pt.x, pt.y)
+                canvas.inputMovedAt(pt.x, pt.y, canvas.pointerTimestamp())
             }
         }
         onReleased: function(mouse) {
@@ -106,7 +112,7 @@ Item {
                 panning = false
             } else if (mouse.button === Qt.LeftButton) {
                 var pt = canvas.mapFromItem(viewMouseArea, mouse.x, mouse.y)
-                canvas.inputReleased(pt.x, pt.y)
+                canvas.inputReleasedAt(pt.x, pt.y, canvas.pointerTimestamp())
             }
         }
         onWheel: function(wheel) {
@@ -34,7 +34,7 @@ RowLayout {
         icon.height: iconSize
         implicitWidth: buttonSize
         implicitHeight: buttonSize
-        enabled: backend ? backend.layersModel.length > 1 : false
+        enabled: backend ? backend.layersModel.count > 1 : false
         onClicked: if (backend) backend.deleteActiveLayer()
     }
     ToolButton {
@@ -38,6 +38,21 @@ Rectangle {
             }
         }
 
+        Rectangle {
+            implicitWidth: 56
+            implicitHeight: 56
+            radius: 4
+            color: "#1d2027"
+            border.color: Theme.colors.layerInactiveBorder
+            Image {
+                anchors.fill: parent
+                anchors.margins: 2
+                source: layerData && layerData.thumbnail ? layerData.thumbnail : ""
+                fillMode: Image.PreserveAspectFit
+                smooth: true
+            }
+        }
+
         ColumnLayout {
             spacing: 4
             Label {
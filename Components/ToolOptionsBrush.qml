@@ -28,4 +28,21 @@ import "../Theme.js" as Theme
         palette.text: Theme.colors.textOnLight
         palette.buttonText: Theme.colors.textOnLight
     }
+
+    Label {
+        text: "Strength"
+        visible: strengthSpin.visible
+        font.family: Theme.fonts.sans
+        color: Theme.colors.textPrimary
+    }
+    SpinBox {
+        id: strengthSpin
+        visible: canvas && (canvas.toolMode === "blur" || canvas.toolMode === "smudge")
+        from: 0; to: 100; stepSize: 5
+        editable: true
+        value: canvas ? Math.round(canvas.brushStrength * 100) : 0
+        onValueModified: if (canvas) canvas.brushStrength = value / 100
+        palette.text: Theme.colors.textOnLight
+        palette.buttonText: Theme.colors.textOnLight
+    }
 }
@@ -18,7 +18,9 @@ Dialog {
         if (backend) {
             const newW = Math.max(1, backend.canvasWidth + addWidthSpin.value)
             const newH = Math.max(1, backend.canvasHeight + addHeightSpin.value)
+            backend.beginTransaction()
             backend.resizeCanvas(newW, newH, anchorCombo.currentText)
+            backend.commitTransaction()
         }
     }
 
@@ -22,7 +22,9 @@ Dialog {
             if (createNew) {
                 backend.newCanvas(widthSpin.value, heightSpin.value)
             } else {
+                backend.beginTransaction()
                 backend.resizeCanvas(widthSpin.value, heightSpin.value, anchorCombo.currentText)
+                backend.commitTransaction()
             }
         }
         createNew = false
@@ -0,0 +1,88 @@
+import QtQuick 2.15
+import QtQuick.Controls 2.15
+import QtQuick.Layouts 1.15
+
+Dialog {
+    id: scaleDialog
+    property var backend
+    property real aspect: 1.0
+    property bool syncing: false
+    title: "Scale Canvas"
+    modal: true
+    standardButtons: Dialog.Ok | Dialog.Cancel
+    onOpened: {
+        if (backend) {
+            syncing = true
+            widthSpin.value = backend.canvasWidth
+            heightSpin.value = backend.canvasHeight
+            aspect = backend.canvasWidth / Math.max(1, backend.canvasHeight)
+            syncing = false
+        }
+    }
+    onAccepted: {
+        if (backend) {
+            backend.beginTransaction()
+            backend.scaleCanvas(widthSpin.value, heightSpin.value, methodCombo.currentText)
+            backend.commitTransaction()
+        }
+    }
+
+    ColumnLayout {
+        anchors.fill: parent
+        anchors.margins: 16
+        spacing: 12
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Width"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            SpinBox {
+                id: widthSpin
+                from: 1; to: 16384; stepSize: 8
+                Layout.fillWidth: true
+                editable: true
+                onValueModified: {
+                    if (keepAspect.checked && !syncing) {
+                        syncing = true
+                        heightSpin.value = Math.max(1, Math.round(value / aspect))
+                        syncing = false
+                    }
+                }
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Height"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            SpinBox {
+                id: heightSpin
+                from: 1; to: 16384; stepSize: 8
+                Layout.fillWidth: true
+                editable: true
+                onValueModified: {
+                    if (keepAspect.checked && !syncing) {
+                        syncing = true
+                        widthSpin.value = Math.max(1, Math.round(value * aspect))
+                        syncing = false
+                    }
+                }
+            }
+        }
+
+        CheckBox {
+            id: keepAspect
+            text: "Keep aspect ratio"
+            checked: true
+        }
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Filter"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            ComboBox {
+                id: methodCombo
+                Layout.fillWidth: true
+                model: ["lanczos", "area", "box"]
+                currentIndex: 0
+            }
+        }
+    }
+}
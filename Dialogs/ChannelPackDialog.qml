@@ -0,0 +1,95 @@
+import QtQuick 2.15
+import QtQuick.Controls 2.15
+import QtQuick.Layouts 1.15
+
+Dialog {
+    id: channelPackDialog
+    property var backend
+    // Layer indices flattened into each of R, G, B, A
+    property var groups: [[], [], [], []]
+    title: "Export Channel Pack"
+    modal: true
+    standardButtons: Dialog.Ok | Dialog.Cancel
+
+    function toggleLayer(channel, layer, on) {
+        var copy = groups.slice()
+        var group = copy[channel].filter(function(idx) { return idx !== layer })
+        if (on)
+            group.push(layer)
+        copy[channel] = group
+        groups = copy
+    }
+
+    onOpened: groups = [[], [], [], []]
+    onAccepted: {
+        var path = pathField.text.trim()
+        if (!backend || !path)
+            return
+        var lower = path.toLowerCase()
+        if (!(lower.endsWith(".png") || lower.endsWith(".npy")))
+            path = path + ".png"
+        var channels = alphaCheck.checked ? groups : groups.slice(0, 3)
+        backend.exportChannelPack(path, channels, depthCombo.currentIndex === 0 ? 8 : 16)
+    }
+
+    ColumnLayout {
+        anchors.fill: parent
+        anchors.margins: 16
+        spacing: 12
+
+        Repeater {
+            model: ["Red", "Green", "Blue", "Alpha"]
+            delegate: RowLayout {
+                id: channelRow
+                property int channel: index
+                spacing: 8
+                enabled: index < 3 || alphaCheck.checked
+                Label {
+                    text: modelData
+                    color: "#dfe2e7"
+                    font.family: "Fira Sans"
+                    Layout.preferredWidth: 48
+                }
+                Flow {
+                    Layout.fillWidth: true
+                    spacing: 4
+                    Repeater {
+                        model: backend ? backend.layersModel : null
+                        delegate: CheckBox {
+                            text: model.name
+                            checked: channelPackDialog.groups[channelRow.channel].indexOf(index) >= 0
+                            onToggled: channelPackDialog.toggleLayer(channelRow.channel, index, checked)
+                        }
+                    }
+                }
+            }
+        }
+
+        CheckBox {
+            id: alphaCheck
+            text: "Alpha channel"
+            checked: true
+        }
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Depth"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            ComboBox {
+                id: depthCombo
+                Layout.fillWidth: true
+                model: ["8-bit", "16-bit"]
+                currentIndex: 0
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            Label { text: "File"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            TextField {
+                id: pathField
+                Layout.fillWidth: true
+                placeholderText: "ex: C:/Users/you/masks.png (.npy for float32)"
+            }
+        }
+    }
+}
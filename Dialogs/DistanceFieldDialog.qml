@@ -0,0 +1,67 @@
+import QtQuick 2.15
+import QtQuick.Controls 2.15
+import QtQuick.Layouts 1.15
+
+Dialog {
+    id: distanceDialog
+    property var backend
+    title: "Distance Field"
+    modal: true
+    standardButtons: Dialog.Ok | Dialog.Cancel
+    onAccepted: {
+        if (backend)
+            backend.distanceFieldLayer(backend.activeLayerIndex, modeCombo.currentValue, radiusSpin.value,
+                                       thresholdSpin.value, smoothCheck.checked)
+    }
+
+    ColumnLayout {
+        anchors.fill: parent
+        anchors.margins: 16
+        spacing: 12
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Mode"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            ComboBox {
+                id: modeCombo
+                Layout.fillWidth: true
+                textRole: "text"
+                valueRole: "value"
+                model: [
+                    { text: "Outside falloff", value: "outside" },
+                    { text: "Inside bevel", value: "inside" },
+                    { text: "Signed", value: "signed" }
+                ]
+                currentIndex: 2
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Radius"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            SpinBox {
+                id: radiusSpin
+                from: 1; to: 4096; value: 32
+                Layout.fillWidth: true
+                editable: true
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Mask threshold"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            SpinBox {
+                id: thresholdSpin
+                from: 1; to: 255; value: 128
+                Layout.fillWidth: true
+                editable: true
+            }
+        }
+
+        CheckBox {
+            id: smoothCheck
+            text: "Smooth falloff"
+            checked: false
+        }
+    }
+}
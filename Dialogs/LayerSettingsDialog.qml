@@ -18,6 +18,9 @@ Dialog {
             blendCombo.currentIndex = blendCombo.model.indexOf(layerData.blendMode)
             opacitySlider.value = layerData.opacity
         }
+        // Live edits below are previewed on the canvas and land as one undo step
+        if (backend)
+            backend.beginTransaction()
         open()
     }
 
@@ -26,6 +29,13 @@ Dialog {
             backend.setLayerBlendMode(layerIndex, blendCombo.model[blendCombo.currentIndex])
             backend.setLayerOpacity(layerIndex, opacitySlider.value)
         }
+        if (backend)
+            backend.commitTransaction()
+    }
+
+    onRejected: {
+        if (backend)
+            backend.cancelTransaction()
     }
 
     ColumnLayout {
@@ -40,6 +50,10 @@ Dialog {
                 id: blendCombo
                 Layout.fillWidth: true
                 model: ["normal", "add", "multiply", "xor"]
+                onActivated: {
+                    if (backend && layerIndex >= 0)
+                        backend.setLayerBlendMode(layerIndex, model[currentIndex])
+                }
             }
         }
 
@@ -50,6 +64,10 @@ Dialog {
                 id: opacitySlider
                 from: 0; to: 1; stepSize: 0.01
                 Layout.fillWidth: true
+                onMoved: {
+                    if (backend && layerIndex >= 0)
+                        backend.setLayerOpacity(layerIndex, value)
+                }
             }
             Label {
                 text: Math.round(opacitySlider.value * 100) + "%"
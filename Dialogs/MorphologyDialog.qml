@@ -0,0 +1,85 @@
+import QtQuick 2.15
+import QtQuick.Controls 2.15
+import QtQuick.Layouts 1.15
+
+Dialog {
+    id: morphologyDialog
+    property var backend
+    readonly property bool thresholding: opCombo.currentValue === "threshold"
+    title: "Morphology"
+    modal: true
+    standardButtons: Dialog.Ok | Dialog.Cancel
+    onAccepted: {
+        if (!backend)
+            return
+        if (thresholding)
+            backend.thresholdToMask(backend.activeLayerIndex, thresholdSpin.value)
+        else
+            backend.applyMorphology(backend.activeLayerIndex, opCombo.currentValue, radiusSpin.value,
+                                    shapeCombo.currentValue)
+    }
+
+    ColumnLayout {
+        anchors.fill: parent
+        anchors.margins: 16
+        spacing: 12
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Operation"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            ComboBox {
+                id: opCombo
+                Layout.fillWidth: true
+                textRole: "text"
+                valueRole: "value"
+                model: [
+                    { text: "Grow", value: "dilate" },
+                    { text: "Shrink", value: "erode" },
+                    { text: "Open (remove specks)", value: "open" },
+                    { text: "Close (fill holes)", value: "close" },
+                    { text: "Threshold to mask", value: "threshold" }
+                ]
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            visible: !morphologyDialog.thresholding
+            Label { text: "Radius"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            SpinBox {
+                id: radiusSpin
+                from: 1; to: 512; value: 4
+                Layout.fillWidth: true
+                editable: true
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            visible: !morphologyDialog.thresholding
+            Label { text: "Shape"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            ComboBox {
+                id: shapeCombo
+                Layout.fillWidth: true
+                textRole: "text"
+                valueRole: "value"
+                model: [
+                    { text: "Round", value: "round" },
+                    { text: "Square", value: "square" }
+                ]
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            visible: morphologyDialog.thresholding
+            Label { text: "Threshold"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            SpinBox {
+                id: thresholdSpin
+                from: 1; to: 255; value: 128
+                Layout.fillWidth: true
+                editable: true
+            }
+        }
+    }
+}
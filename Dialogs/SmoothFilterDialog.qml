@@ -0,0 +1,100 @@
+import QtQuick 2.15
+import QtQuick.Controls 2.15
+import QtQuick.Layouts 1.15
+
+Dialog {
+    id: smoothDialog
+    property var backend
+    title: "Smooth"
+    modal: true
+    standardButtons: Dialog.Ok | Dialog.Cancel
+
+    function refreshPreview() {
+        if (backend && visible)
+            preview.source = backend.previewSmoothFilter(backend.activeLayerIndex, kindCombo.currentValue,
+                                                         radiusSlider.value, edgeSlider.value)
+    }
+
+    onOpened: refreshPreview()
+    onAccepted: {
+        if (backend)
+            backend.applySmoothFilter(backend.activeLayerIndex, kindCombo.currentValue, radiusSlider.value, edgeSlider.value)
+    }
+
+    // Coalesces slider drags into one preview render per pause
+    Timer {
+        id: previewTimer
+        interval: 80
+        onTriggered: smoothDialog.refreshPreview()
+    }
+
+    ColumnLayout {
+        anchors.fill: parent
+        anchors.margins: 16
+        spacing: 12
+
+        Image {
+            id: preview
+            Layout.alignment: Qt.AlignHCenter
+            Layout.preferredWidth: 256
+            Layout.preferredHeight: 256
+            fillMode: Image.PreserveAspectFit
+            cache: false
+            smooth: true
+        }
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Filter"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            ComboBox {
+                id: kindCombo
+                Layout.fillWidth: true
+                textRole: "text"
+                valueRole: "value"
+                model: [
+                    { text: "Gaussian", value: "gaussian" },
+                    { text: "Box", value: "box" },
+                    { text: "Bilateral (keep edges)", value: "bilateral" }
+                ]
+                onActivated: previewTimer.restart()
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            Label { text: "Radius"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            Slider {
+                id: radiusSlider
+                from: 1; to: 128; stepSize: 1; value: 8
+                Layout.fillWidth: true
+                onMoved: previewTimer.restart()
+            }
+            Label {
+                text: radiusSlider.value + " px"
+                width: 50
+                horizontalAlignment: Text.AlignHCenter
+                color: "#8ca0b3"
+                font.family: "Fira Mono"
+            }
+        }
+
+        RowLayout {
+            spacing: 8
+            enabled: kindCombo.currentValue === "bilateral"
+            Label { text: "Edge"; color: "#dfe2e7"; font.family: "Fira Sans" }
+            Slider {
+                id: edgeSlider
+                from: 1; to: 128; stepSize: 1; value: 32
+                Layout.fillWidth: true
+                onMoved: previewTimer.restart()
+            }
+            Label {
+                text: edgeSlider.value
+                width: 50
+                horizontalAlignment: Text.AlignHCenter
+                color: "#8ca0b3"
+                font.family: "Fira Mono"
+            }
+        }
+    }
+}
@@ -1,22 +1,109 @@
 from __future__ import annotations
 
 import base64
+import functools
 import json
 import math
-from dataclasses import dataclass
+import os
+import zlib
+from dataclasses import dataclass, field
 import time
+from contextlib import contextmanager
 from enum import Enum
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
-from PySide6.QtCore import QBuffer, QPointF, Property, QRectF, Signal, Slot, Qt
-from PySide6.QtGui import QColor, QGradient, QImage, QPainter, QPen, QLinearGradient, QRadialGradient
+import numpy as np
+
+from PySide6.QtCore import QBuffer, QObject, QPointF, Property, QRect, QRectF, QSize, QTimer, Signal, Slot, Qt
+from PySide6.QtGui import QColor, QImage, QImageReader, QPainter, QPen, QRegion
 from PySide6.QtQuick import QQuickPaintedItem
 
+from checkpoint import CheckpointSnapshot
+from dabs import DabStroke
+from distance import DistanceMode, distance_field, gray_buffer, mask_from_buffer
+from filters import FILTER_PREVIEW_SIZE, SMOOTH_MAX_RADIUS, SmoothFilter, smooth_pixels, smooth_tiles
+from export import LayerSource, export_channel_pack, export_heightmap, heightmap_format
+from journal import CallOp, GestureOp, Journal, Operation
+from latency import LatencyLog, PointerClock, monotonic_ms
+from layermodel import LayerListModel
+from mipmap import MipPyramid, coarse_rects
+from morphology import MORPHOLOGY_MAX_RADIUS, MorphologyOp, StructuringShape, morph_bands, morphology_reach
+from paging import CompressionService, tile_pager
+from raster import (
+    GRAY_CHANNELS,
+    ALPHA_CHANNEL,
+    RGB_CHANNELS,
+    Rect,
+    const_image_array,
+    flood_region,
+    gray_pixels,
+    gray_values,
+    image_array,
+    intersect_rects,
+    match_values,
+    premultiply,
+    rasterize_gradient,
+    worker_pool,
+    write_gray,
+)
+from replay import load_operations
+from resample import ResampleFilter, resample_buffer
+from selection import Selection, blend_masked
+from stroke import StrokePath
+from thumbnails import ThumbnailService, render_thumbnail, thumbnail_cache, thumbnail_key, thumbnail_url
+from tiles import TileBuffer, tile_image
+
 
 def _clamp(value: float, min_value: float, max_value: float) -> float:
     return max(min_value, min(max_value, value))
 
 
+def _journaled(method: Callable) -> Callable:
+    """
+    Records a document-changing slot in the session journal and allows it in
+    replay scripts. Only the outermost call is recorded, so slots built on
+    other slots (and replayed operations) are not logged twice. Slots that
+    finish by writing a checkpoint (new, load, import) discard their own
+    record along with the rest of the journal.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: "PainterBackend", *args: Any) -> Any:
+        if self._journal_depth == 0 and self._journal is not None:
+            # Logged before running, so a checkpoint written by the slot covers it
+            self._journal.append(CallOp(method.__name__, args))
+        self._journal_depth += 1
+        try:
+            return method(self, *args)
+        finally:
+            self._journal_depth -= 1
+
+    wrapper.journaled = True
+    return wrapper
+
+
+def _decode_layer_image(path: str, width: int, height: int) -> Optional[TileBuffer]:
+    """
+    Decodes ``path`` into a layer buffer of the canvas size. Safe to run off
+    the GUI thread. Formats that can (JPEG) decode straight at the target
+    size; others are smooth-scaled in their own pixel format before the
+    conversion to 8-bit premultiplied, so 16-bit grayscale sources are
+    rounded once instead of truncated and then filtered.
+    """
+    reader = QImageReader(path)
+    size = reader.size()
+    if size.isValid() and (size.width() != width or size.height() != height):
+        reader.setScaledSize(QSize(width, height))
+    img = reader.read()
+    if img.isNull():
+        return None
+    if img.width() != width or img.height() != height:
+        img = img.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    if img.format() != QImage.Format_ARGB32_Premultiplied:
+        img = img.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    return TileBuffer.from_image(img)
+
+
 class ToolMode(str, Enum):
     BRUSH = "brush"
     ERASER = "eraser"
@@ -25,6 +112,11 @@ class ToolMode(str, Enum):
     LINEAR_GRADIENT = "linearGradient"
     RADIAL_GRADIENT = "radialGradient"
     PICKER = "picker"
+    SELECT_RECT = "selectRect"
+    SELECT_LASSO = "selectLasso"
+    SELECT_VALUE = "selectValue"
+    BLUR = "blur"
+    SMUDGE = "smudge"
 
 
 class BlendMode(str, Enum):
@@ -45,10 +137,12 @@ class CanvasAnchor(str, Enum):
 @dataclass
 class Layer:
     name: str
-    image: QImage
+    buffer: TileBuffer
     opacity: float = 1.0
     visible: bool = True
     blend_mode: BlendMode = BlendMode.NORMAL
+    # image:// URL of the newest ready preview; may lag behind the pixels
+    thumbnail: str = field(default="", compare=False)
 
 
 @dataclass
@@ -65,6 +159,7 @@ class PainterBackend(QQuickPaintedItem):
     """
 
     brushSizeChanged = Signal()
+    brushStrengthChanged = Signal()
     grayValueChanged = Signal()
     toolModeChanged = Signal()
     tempStartChanged = Signal()
@@ -80,16 +175,56 @@ class PainterBackend(QQuickPaintedItem):
     gradientClampChanged = Signal()
     gradientSampleStartChanged = Signal()
     gradientSampleEndChanged = Signal()
+    sampleRadiusChanged = Signal()
     layersChanged = Signal()
     activeLayerChanged = Signal()
     canvasSizeChanged = Signal()
+    selectionChanged = Signal()
+    viewScaleChanged = Signal()
+    viewRectChanged = Signal()
     undoAvailableChanged = Signal()
     redoAvailableChanged = Signal()
     statsUpdated = Signal(str)
     modifiedChanged = Signal()
+    journalDirectoryChanged = Signal()
+    diskBackedLayersChanged = Signal()
+    scratchDirectoryChanged = Signal()
+    memoryStatsChanged = Signal()
+    inputLatencyChanged = Signal()
 
     DEFAULT_SIZE = 1024
     UNDO_LIMIT = 20
+    # Screen pixels refreshed around the visible area so small pans stay cheap.
+    VIEW_MARGIN = 128
+    # Quiet period after the last pixel change before thumbnails are refreshed.
+    THUMBNAIL_DELAY_MS = 300
+    # How often cold layers are looked for, and how long a visible layer must
+    # go unedited to count as cold (hidden layers always are).
+    COMPRESS_INTERVAL_MS = 5000
+    # How often the input latency statistics shown in the UI are refreshed.
+    LATENCY_REFRESH_MS = 1000
+    COLD_LAYER_SECONDS = 30.0
+    # Tool properties stored with each journaled gesture and restored on replay.
+    GESTURE_SETTINGS = (
+        "toolMode",
+        "brushSize",
+        "brushStrength",
+        "grayValue",
+        "tempStart",
+        "tempEnd",
+        "tempPauseOnIdle",
+        "tempSampleStart",
+        "tempSampleEnd",
+        "fillTolerance",
+        "fillSampleAllLayers",
+        "fillContiguous",
+        "gradientStart",
+        "gradientEnd",
+        "gradientClamp",
+        "gradientSampleStart",
+        "gradientSampleEnd",
+        "sampleRadius",
+    )
 
     def __init__(self, parent: Optional[QQuickPaintedItem] = None) -> None:
         super().__init__(parent)
@@ -98,6 +233,7 @@ class PainterBackend(QQuickPaintedItem):
         self.setFillColor(Qt.transparent)
 
         self._brush_size: int = 20
+        self._brush_strength: float = 0.5  # blur / smudge amount per dab
         self._gray_value: int = 255
         self._tool_mode: ToolMode = ToolMode.BRUSH
         self._temp_start: float = 0.0
@@ -113,6 +249,7 @@ class PainterBackend(QQuickPaintedItem):
         self._gradient_clamp: bool = True
         self._gradient_sample_start: bool = False
         self._gradient_sample_end: bool = False
+        self._sample_radius: int = 0
 
         self._canvas_width: int = self.DEFAULT_SIZE
         self._canvas_height: int = self.DEFAULT_SIZE
@@ -120,19 +257,89 @@ class PainterBackend(QQuickPaintedItem):
         base_layer = self._make_blank_layer("Layer 1")
         self._layers: List[Layer] = [base_layer]
         self._active_layer_index: int = 0
+        self._layer_model: LayerListModel = LayerListModel(self)
+        self._layer_model.sync(self._layers, self._active_layer_index)
+        # Every stack change funnels through layersChanged; the model turns it
+        # into row-level notifications.
+        self.layersChanged.connect(self._sync_layer_model)
+
+        self._thumbnails: ThumbnailService = ThumbnailService(self)
+        self._thumbnails.ready.connect(lambda _key: self._refresh_thumbnails(request=False))
+        self._thumbnail_timer: QTimer = QTimer(self)
+        self._thumbnail_timer.setSingleShot(True)
+        self._thumbnail_timer.setInterval(self.THUMBNAIL_DELAY_MS)
+        self._thumbnail_timer.timeout.connect(self._refresh_thumbnails)
+        self._thumbnail_timer.start()
+        # Downsampled layer behind the filter preview, keyed like its thumbnail
+        self._filter_preview_base: Optional[Tuple[str, np.ndarray]] = None
+        self._filter_preview_key = ""
+        self._filter_preview_serial = 0
+
+        # Background compression of cold layers (see _compress_cold_layers)
+        self._compressor: CompressionService = CompressionService(self)
+        self._compressor.finished.connect(self._update_memory_stats)
+        self._compress_timer: QTimer = QTimer(self)
+        self._compress_timer.setInterval(self.COMPRESS_INTERVAL_MS)
+        self._compress_timer.timeout.connect(self._compress_cold_layers)
+        self._compress_timer.start()
+        # Buffer generation -> when it was first seen, to find layers left alone
+        self._layer_seen: Dict[int, float] = {}
+        self._memory_stats: Tuple[int, int] = (0, 0)
+
+        # Pointer event timestamps (see latency.py) and input-to-paint latency
+        self._pointer_clock: PointerClock = PointerClock(self)
+        self.windowChanged.connect(self._pointer_clock.attach)
+        self._latency: LatencyLog = LatencyLog()
+        # Monotonic time of the oldest input not yet on screen
+        self._input_pending: Optional[float] = None
+        self._latency_summary: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+        self._latency_count = 0
+        self._latency_timer: QTimer = QTimer(self)
+        self._latency_timer.setInterval(self.LATENCY_REFRESH_MS)
+        self._latency_timer.timeout.connect(self._update_latency_stats)
+        self._latency_timer.start()
 
         self._composite: QImage = self._make_canvas_image()
-        self._composite_dirty: bool = True
-
-        self._temp_path: List[QPointF] = []
-        self._temp_times: List[float] = []
+        self._composite_dirty: QRegion = QRegion(0, 0, self._canvas_width, self._canvas_height)
+        self._mips: MipPyramid = MipPyramid(self._canvas_width, self._canvas_height)
+        self._view_scale: float = 1.0
+        self._view_rect: QRectF = QRectF()
+        self._display_level: int = 0
+
+        self._selection: Selection = Selection(self._canvas_width, self._canvas_height)
+        self._selection_overlay: Optional[QImage] = None
+        self._select_anchor: Optional[QPointF] = None
+        self._select_current: Optional[QPointF] = None
+
+        self._temp_path: StrokePath = StrokePath()
         self._last_point: Optional[QPointF] = None
         self._stroke_begun: bool = False
+        # Dab placement and smudge pickup of the current blur / smudge stroke
+        self._dabs: Optional[DabStroke] = None
         self._gradient_start_point: Optional[QPointF] = None
 
         self._undo_stack: List[LayerState] = []
         self._redo_stack: List[LayerState] = []
         self._dirty: bool = False
+        # Open transactions (nesting depth) and whether one already pushed its entry
+        self._transaction_depth: int = 0
+        self._transaction_pushed: bool = False
+
+        # Where disk-backed layers page tiles out to; "" is the system temp directory
+        self._scratch_dir: str = ""
+
+        # Crash-recovery journal (see journal.py); None until journalDirectory is set
+        self._journal: Optional[Journal] = None
+        self._journal_dir: str = ""
+        # Nesting of journaled slots; recording only happens at depth 0
+        self._journal_depth: int = 0
+        # Points (x, y, ms) and tool settings of the gesture being recorded
+        self._gesture: Optional[List[Tuple[float, float, float]]] = None
+        self._gesture_settings: Dict[str, Any] = {}
+        # Undo/redo entries created since the last checkpoint. Only those can be
+        # rebuilt by replaying the journal; stepping past them needs a checkpoint.
+        self._journal_undo_depth: int = 0
+        self._journal_redo_depth: int = 0
 
     # --- Properties exposed to QML ---
 
@@ -148,6 +355,17 @@ class PainterBackend(QQuickPaintedItem):
             print(f"[debug] brushSize set to {value}")
             self.brushSizeChanged.emit()
 
+    @Property(float, notify=brushStrengthChanged)
+    def brushStrength(self) -> float:
+        return self._brush_strength
+
+    @brushStrength.setter
+    def brushStrength(self, value: float) -> None:
+        value = _clamp(float(value), 0.0, 1.0)
+        if not math.isclose(value, self._brush_strength):
+            self._brush_strength = value
+            self.brushStrengthChanged.emit()
+
     @Property(int, notify=grayValueChanged)
     def grayValue(self) -> int:
         return self._gray_value
@@ -317,6 +535,17 @@ class PainterBackend(QQuickPaintedItem):
             self._gradient_sample_end = value
             self.gradientSampleEndChanged.emit()
 
+    @Property(int, notify=sampleRadiusChanged)
+    def sampleRadius(self) -> int:
+        return self._sample_radius
+
+    @sampleRadius.setter
+    def sampleRadius(self, value: int) -> None:
+        value = int(_clamp(value, 0, 16))
+        if value != self._sample_radius:
+            self._sample_radius = value
+            self.sampleRadiusChanged.emit()
+
     @Property(int, notify=canvasSizeChanged)
     def canvasWidth(self) -> int:
         return self._canvas_width
@@ -325,23 +554,42 @@ class PainterBackend(QQuickPaintedItem):
     def canvasHeight(self) -> int:
         return self._canvas_height
 
+    @Property(float, notify=viewScaleChanged)
+    def viewScale(self) -> float:
+        return self._view_scale
+
+    @viewScale.setter
+    def viewScale(self, value: float) -> None:
+        value = max(1e-3, float(value))
+        if not math.isclose(value, self._view_scale):
+            self._view_scale = value
+            self.viewScaleChanged.emit()
+            self._update_display_level()
+
+    @Property(QRectF, notify=viewRectChanged)
+    def viewRect(self) -> QRectF:
+        return self._view_rect
+
+    @viewRect.setter
+    def viewRect(self, value: QRectF) -> None:
+        value = QRectF(value)
+        if value != self._view_rect:
+            self._view_rect = value
+            self.viewRectChanged.emit()
+            # Regions left dirty while off-screen are composited on this repaint
+            self.update()
+
     @Property(int, notify=activeLayerChanged)
     def activeLayerIndex(self) -> int:
         return self._active_layer_index
 
-    @Property("QVariantList", notify=layersChanged)
-    def layersModel(self) -> List[dict]:
-        return [
-            {
-                "name": layer.name,
-                "opacity": layer.opacity,
-                "visible": layer.visible,
-                "blendMode": layer.blend_mode.value,
-                "index": idx,
-                "active": idx == self._active_layer_index,
-            }
-            for idx, layer in enumerate(self._layers)
-        ]
+    @Property(QObject, constant=True)
+    def layersModel(self) -> LayerListModel:
+        return self._layer_model
+
+    @Property(bool, notify=selectionChanged)
+    def hasSelection(self) -> bool:
+        return not self._selection.is_empty
 
     @Property(bool, notify=undoAvailableChanged)
     def undoAvailable(self) -> bool:
@@ -359,35 +607,246 @@ class PainterBackend(QQuickPaintedItem):
     def markClean(self) -> None:
         self._set_dirty(False)
 
+    @Property(str, notify=journalDirectoryChanged)
+    def journalDirectory(self) -> str:
+        return self._journal_dir
+
+    @journalDirectory.setter
+    def journalDirectory(self, value: str) -> None:
+        """
+        Starts crash-recovery journaling in ``value``. A session left there by
+        a crash is rebuilt first (checkpoint plus journal), then journaling
+        continues on it.
+        """
+        value = str(value or "")
+        if value == self._journal_dir:
+            return
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        self._journal_dir = value
+        if value:
+            journal = Journal(value)
+            recovered = journal.recover()
+            self._journal = journal
+            if recovered is None:
+                self._write_checkpoint()
+            else:
+                self._recover_session(*recovered)
+        self.journalDirectoryChanged.emit()
+
+    @Property(bool, notify=diskBackedLayersChanged)
+    def diskBackedLayers(self) -> bool:
+        return tile_pager().enabled
+
+    @diskBackedLayers.setter
+    def diskBackedLayers(self, value: bool) -> None:
+        """
+        Keeps only a bounded working set of layer tiles in memory and pages the
+        rest to memory-mapped scratch files (see paging.py), for documents
+        larger than RAM. The setting is process-wide.
+        """
+        value = bool(value)
+        if value == tile_pager().enabled:
+            return
+        if value:
+            tile_pager().enable(self._scratch_dir)
+        else:
+            tile_pager().disable()
+        # Move the full-size composite into (or out of) a scratch file as well
+        self._reset_composite()
+        self.update()
+        self.diskBackedLayersChanged.emit()
+
+    @Property(str, notify=scratchDirectoryChanged)
+    def scratchDirectory(self) -> str:
+        return self._scratch_dir
+
+    @scratchDirectory.setter
+    def scratchDirectory(self, value: str) -> None:
+        value = str(value or "")
+        if value == self._scratch_dir:
+            return
+        if value:
+            os.makedirs(value, exist_ok=True)
+        self._scratch_dir = value
+        if tile_pager().enabled:
+            # Scratch files created from now on go to the new directory
+            tile_pager().enable(value)
+        self.scratchDirectoryChanged.emit()
+
+    @Property("qint64", notify=memoryStatsChanged)
+    def residentBytes(self) -> int:
+        """Uncompressed layer tile bytes in memory (all documents, undo history included)."""
+        return self._memory_stats[0]
+
+    @Property("qint64", notify=memoryStatsChanged)
+    def compressedBytes(self) -> int:
+        """Bytes of compressed cold tiles in memory."""
+        return self._memory_stats[1]
+
+    @Property(float, notify=inputLatencyChanged)
+    def inputLatencyMs(self) -> float:
+        """Median delay from pointer event to the frame showing it, over the recent events."""
+        return self._latency_summary[0]
+
+    @Property(float, notify=inputLatencyChanged)
+    def inputLatencyP95Ms(self) -> float:
+        return self._latency_summary[1]
+
+    @Property(float, notify=inputLatencyChanged)
+    def inputLatencyMaxMs(self) -> float:
+        return self._latency_summary[2]
+
+    @Slot(result=list)
+    def inputLatencySamples(self) -> List[float]:
+        """The recent input-to-paint latencies (ms), oldest first."""
+        return self._latency.samples().tolist()
+
+    @Slot()
+    def closeJournal(self) -> None:
+        """Ends journaling on a clean exit and removes the recovery files."""
+        if self._journal is not None:
+            self._journal.close(discard=True)
+            self._journal = None
+
     # --- Rendering ---
 
     def paint(self, painter: QPainter) -> None:
-        self._ensure_composite()
-        painter.drawImage(0, 0, self._composite)
+        # The input's latency runs until this frame is composited and drawn
+        pending, self._input_pending = self._input_pending, None
+        try:
+            self._paint_frame(painter)
+        finally:
+            if pending is not None:
+                self._latency.record(monotonic_ms() - pending)
 
-        if self._tool_mode == ToolMode.TEMPORAL and len(self._temp_path) > 1:
+    def _paint_frame(self, painter: QPainter) -> None:
+        area = self._visible_area()
+        if area.isEmpty():
+            return
+        self._ensure_composite(area)
+        painter.save()
+        painter.setClipRect(area)
+        if self._display_level == 0:
+            painter.drawImage(area.topLeft(), self._composite, area)
+        else:
+            # The texture is sized to this level (see _update_display_level),
+            # so the scaled draw is a 1:1 copy into the smaller texture.
+            level = self._mips.image(self._composite, self._display_level, area)
+            sx = level.width() / self._canvas_width
+            sy = level.height() / self._canvas_height
+            source = QRectF(area.x() * sx, area.y() * sy, area.width() * sx, area.height() * sy)
+            painter.drawImage(QRectF(area), level, source)
+        painter.restore()
+
+        if self._selection_overlay is not None:
+            bounds = self._selection.bounds
+            painter.drawImage(bounds[0], bounds[1], self._selection_overlay)
+
+        if self._tool_mode in (ToolMode.TEMPORAL, ToolMode.SELECT_LASSO) and len(self._temp_path) > 1:
             preview_pen = QPen(QColor(255, 50, 50, 128), 2)
             painter.setPen(preview_pen)
-            painter.drawPolyline(self._temp_path)
-
-    def _ensure_composite(self) -> None:
-        if not self._composite_dirty:
+            painter.drawPolyline(self._temp_path.preview)
+        elif self._tool_mode == ToolMode.SELECT_RECT and self._select_anchor is not None and self._select_current is not None:
+            painter.setPen(QPen(QColor(77, 136, 255, 200), 1, Qt.DashLine))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(QRectF(self._select_anchor, self._select_current).normalized())
+
+    def _ensure_composite(self, area: Optional[QRect] = None) -> None:
+        """Recomposites dirty pixels, limited to ``area`` when given (the rest stays pending)."""
+        if self._composite_dirty.isEmpty():
             return
 
-        composite = self._make_canvas_image(fill_transparent=True)
-        painter = QPainter(composite)
-        painter.setRenderHint(QPainter.Antialiasing)
+        todo = self._composite_dirty if area is None else self._composite_dirty.intersected(area)
+        if todo.isEmpty():
+            return
+        painter = QPainter(self._composite)
+        for rect in coarse_rects(todo):
+            self._draw_layers(painter, rect)
+        painter.end()
+        self._mips.invalidate(todo)
+        self._composite_dirty = self._composite_dirty.subtracted(todo)
 
+    def _draw_layers(self, painter: QPainter, rect: QRect) -> None:
+        """Replaces ``rect`` (canvas coordinates) on the painter's device with the blended layer stack."""
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.setOpacity(1.0)
+        painter.fillRect(rect, Qt.transparent)
+        bounds = (rect.x(), rect.y(), rect.width(), rect.height())
         for layer in self._layers:
             if not layer.visible:
                 continue
             painter.setOpacity(_clamp(layer.opacity, 0.0, 1.0))
             painter.setCompositionMode(self._qt_composition_mode(layer.blend_mode))
-            painter.drawImage(0, 0, layer.image)
-
+            # Missing tiles are transparent, which leaves the destination
+            # unchanged in every supported blend mode.
+            for tx, ty, pixels, visible in layer.buffer.tiles_in(bounds):
+                part = rect.intersected(QRect(*visible))
+                if not part.isEmpty():
+                    painter.drawImage(part.topLeft(), tile_image(pixels), part.translated(-tx, -ty))
+
+    def _composite_region(self, rect: QRect) -> np.ndarray:
+        """
+        Blended pixels for a small ``rect`` without touching the cached
+        composite: clean pixels are copied from it, otherwise only the layer
+        tiles under ``rect`` are blended.
+        """
+        if not self._composite_dirty.intersects(rect):
+            pixels = const_image_array(self._composite)
+            return pixels[rect.top():rect.bottom() + 1, rect.left():rect.right() + 1].copy()
+        # Qt's blend kernels round differently in their SIMD body and scalar
+        # edges; blending whole 4-pixel column groups (as in the composite)
+        # keeps samples identical to what is displayed.
+        left = rect.left() & ~3
+        right = min(self._canvas_width, (rect.right() + 4) & ~3)
+        span = QRect(left, rect.top(), right - left, rect.height())
+        image = QImage(span.width(), span.height(), QImage.Format_ARGB32_Premultiplied)
+        painter = QPainter(image)
+        painter.translate(-span.x(), -span.y())
+        self._draw_layers(painter, span)
         painter.end()
-        self._composite = composite
-        self._composite_dirty = False
+        # Copy: the view must not outlive the temporary image
+        return const_image_array(image)[:, rect.left() - left:rect.right() + 1 - left].copy()
+
+    def _visible_area(self) -> QRect:
+        canvas = QRect(0, 0, self._canvas_width, self._canvas_height)
+        if self._view_rect.isEmpty():
+            return canvas
+        margin = self.VIEW_MARGIN / self._view_scale
+        visible = self._view_rect.adjusted(-margin, -margin, margin, margin).toAlignedRect()
+        if self._display_level > 0:
+            # Snap to the mip grid so level pixels are never partially refreshed
+            step = 1 << self._display_level
+            left = (visible.left() // step) * step
+            top = (visible.top() // step) * step
+            visible = QRect(left, top, visible.right() + 1 - left + step, visible.bottom() + 1 - top + step)
+        return visible.intersected(canvas)
+
+    def _update_display_level(self) -> None:
+        level = self._mips.level_for_scale(self._view_scale)
+        if level == self._display_level:
+            return
+        self._display_level = level
+        self.setTextureSize(self._mips.size(level))
+        self.update()
+
+    def _reset_composite(self) -> None:
+        # No fill: every pixel is dirty and gets cleared before it is composited
+        if tile_pager().enabled:
+            backing = tile_pager().scratch_array((self._canvas_height, self._canvas_width * 4))
+            self._composite = QImage(
+                backing.data, self._canvas_width, self._canvas_height, self._canvas_width * 4, QImage.Format_ARGB32_Premultiplied
+            )
+        else:
+            backing = None
+            self._composite = QImage(self._canvas_width, self._canvas_height, QImage.Format_ARGB32_Premultiplied)
+        # Owns the scratch-file pixels of the composite while it wraps them
+        self._composite_backing = backing
+        self._composite_dirty = QRegion(0, 0, self._canvas_width, self._canvas_height)
+        self._mips = MipPyramid(self._canvas_width, self._canvas_height)
+        self._display_level = -1
+        self._update_display_level()
 
     # --- Geometry handling (keep item size independent from canvas size) ---
 
@@ -399,93 +858,43 @@ class PainterBackend(QQuickPaintedItem):
 
     @Slot(float, float)
     def inputPressed(self, x: float, y: float) -> None:
-        point = QPointF(x, y)
-        self._last_point = point
-
-        if self._tool_mode == ToolMode.TEMPORAL:
-            self._begin_stroke()
-            self._temp_path = [point]
-            self._temp_times = [self._monotonic_ms()]
-            self.update()
-        elif self._tool_mode == ToolMode.FILL:
-            self._begin_stroke()
-            self._apply_fill(point)
-            self._stroke_begun = False
-        elif self._tool_mode in (ToolMode.LINEAR_GRADIENT, ToolMode.RADIAL_GRADIENT):
-            self._begin_stroke()
-            self._gradient_start_point = point
-        elif self._tool_mode == ToolMode.PICKER:
-            sampled = self._sample_point(point)
-            if sampled is not None:
-                self.grayValue = sampled
-        else:
-            print(f"[debug] press tool={self._tool_mode.value} brushSize={self._brush_size} gray={self._gray_value}")
-            self._begin_stroke()
-            self._paint_stroke(point, point)
+        self._input_press(x, y, self._monotonic_ms())
 
     @Slot(float, float)
     def inputMoved(self, x: float, y: float) -> None:
-        point = QPointF(x, y)
-
-        if self._tool_mode == ToolMode.TEMPORAL:
-            if not self._temp_path:
-                self._temp_path = [point]
-                self._temp_times = [self._monotonic_ms()]
-                self.update()
-                return
-
-            if (point - self._temp_path[-1]).manhattanLength() > 1.5:
-                self._temp_path.append(point)
-                self._temp_times.append(self._monotonic_ms())
-            self.update()
-        elif self._tool_mode == ToolMode.FILL:
-            # Fill only on press for now
-            return
-        elif self._tool_mode in (ToolMode.LINEAR_GRADIENT, ToolMode.RADIAL_GRADIENT):
-            return
-        elif self._tool_mode == ToolMode.PICKER:
-            return
-        else:
-            if self._last_point is None:
-                self._last_point = point
-            self._paint_stroke(self._last_point, point)
-            self._last_point = point
+        self._input_move(x, y, self._monotonic_ms())
 
     @Slot(float, float)
     def inputReleased(self, x: float, y: float) -> None:
-        point = QPointF(x, y)
+        self._input_release(x, y, self._monotonic_ms())
 
-        if self._tool_mode == ToolMode.TEMPORAL:
-            if not self._temp_path:
-                self._temp_path = [point]
-                self._temp_times = [self._monotonic_ms()]
-            else:
-                self._temp_path.append(point)
-                self._temp_times.append(self._monotonic_ms())
-            self._bake_temporal_gradient()
-            self._temp_path = []
-            self._temp_times = []
-            self.update()
-        elif self._tool_mode == ToolMode.FILL:
-            return
-        elif self._tool_mode == ToolMode.PICKER:
-            sampled = self._sample_point(point)
-            if sampled is not None:
-                self.grayValue = sampled
-        elif self._tool_mode in (ToolMode.LINEAR_GRADIENT, ToolMode.RADIAL_GRADIENT):
-            if self._gradient_start_point is None:
-                self._gradient_start_point = point
-            self._apply_gradient(self._gradient_start_point, point, self._tool_mode)
-            self._gradient_start_point = None
-        else:
-            if self._last_point is None:
-                self._last_point = point
-            self._paint_stroke(self._last_point, point)
-            self._last_point = None
+    # Event-timestamped variants: ``t`` is the pointer event's own timestamp
+    # (ms, see pointerTimestamp), so stalls between the event and its
+    # handling do not distort Temporal Pen timing.
 
-        self._stroke_begun = False
+    @Slot(float, float, float)
+    def inputPressedAt(self, x: float, y: float, t: float) -> None:
+        self._note_input(t)
+        self._input_press(x, y, t)
+
+    @Slot(float, float, float)
+    def inputMovedAt(self, x: float, y: float, t: float) -> None:
+        self._note_input(t)
+        self._input_move(x, y, t)
+
+    @Slot(float, float, float)
+    def inputReleasedAt(self, x: float, y: float, t: float) -> None:
+        self._note_input(t)
+        self._input_release(x, y, t)
+
+    @Slot(result=float)
+    def pointerTimestamp(self) -> float:
+        """Timestamp (ms) of the pointer event being handled, for the input*At slots."""
+        stamp = self._pointer_clock.timestamp()
+        return self._monotonic_ms() if stamp is None else stamp
 
     @Slot(int, int, str)
+    @_journaled
     def resizeCanvas(self, width: int, height: int, anchor: str = "center") -> None:
         width = max(1, int(width))
         height = max(1, int(height))
@@ -498,18 +907,55 @@ class PainterBackend(QQuickPaintedItem):
             return
 
         self._push_undo_state()
+        old_w, old_h = self._canvas_width, self._canvas_height
         self._canvas_width = width
         self._canvas_height = height
 
-        for idx, layer in enumerate(self._layers):
-            self._layers[idx] = self._resize_layer(layer, width, height, anchor_enum)
+        # Layers are moved and trimmed by metadata only; the undo snapshot
+        # keeps its own buffer clones with the old origin.
+        dx, dy = self._anchor_offset(old_w, old_h, width, height, anchor_enum)
+        hides_pixels = dx < 0 or dy < 0 or dx + old_w > width or dy + old_h > height
+        for layer in self._layers:
+            layer.buffer.shift(dx, dy)
+            if hides_pixels:
+                layer.buffer.crop((0, 0, width, height))
 
-        self._mark_composite_dirty()
+        self._reset_selection()
+        self._reset_composite()
+        self.canvasSizeChanged.emit()
+        self.layersChanged.emit()
+        self.update()
+
+    @Slot(int, int, str)
+    @_journaled
+    def scaleCanvas(self, width: int, height: int, method: str = "lanczos") -> None:
+        """Resamples every layer to the new canvas size (box, lanczos or area filter)."""
+        width = max(1, int(width))
+        height = max(1, int(height))
+        try:
+            filter_enum = ResampleFilter(method)
+        except ValueError:
+            filter_enum = ResampleFilter.LANCZOS
+
+        if width == self._canvas_width and height == self._canvas_height:
+            return
+
+        self._push_undo_state()
+        source = (0, 0, self._canvas_width, self._canvas_height)
+        for layer in self._layers:
+            # The old buffer stays alive only through the undo snapshot
+            layer.buffer = resample_buffer(layer.buffer, source, (width, height), filter_enum)
+        self._canvas_width = width
+        self._canvas_height = height
+
+        self._reset_selection()
+        self._reset_composite()
         self.canvasSizeChanged.emit()
         self.layersChanged.emit()
         self.update()
 
     @Slot()
+    @_journaled
     def addLayer(self) -> None:
         self._push_undo_state()
         layer = self._make_blank_layer(f"Layer {len(self._layers)+1}")
@@ -518,6 +964,7 @@ class PainterBackend(QQuickPaintedItem):
         self._mark_layers_changed()
 
     @Slot(int)
+    @_journaled
     def duplicateLayer(self, index: int) -> None:
         if index < 0 or index >= len(self._layers):
             return
@@ -530,10 +977,41 @@ class PainterBackend(QQuickPaintedItem):
         self._mark_layers_changed()
 
     @Slot()
+    @_journaled
     def duplicateActiveLayer(self) -> None:
         self.duplicateLayer(self._active_layer_index)
 
+    @Slot(int, str, float, int, bool)
+    @_journaled
+    def distanceFieldLayer(self, index: int, mode: str, radius: float, threshold: int = 128, smooth: bool = False) -> None:
+        """
+        Adds the distance field of a layer's mask (pixels at least
+        ``threshold`` gray) above it: outside falloff, inside bevel or signed,
+        remapped over ``radius`` pixels.
+        """
+        if index < 0 or index >= len(self._layers):
+            return
+        try:
+            mode_enum = DistanceMode(mode)
+        except ValueError:
+            mode_enum = DistanceMode.SIGNED
+        source = self._layers[index]
+        mask = mask_from_buffer(source.buffer, self._canvas_width, self._canvas_height, int(_clamp(threshold, 1, 255)))
+        values = distance_field(mask, mode_enum, max(1.0, float(radius)), bool(smooth))
+        self._push_undo_state()
+        layer = Layer(
+            name=f"{source.name} distance",
+            buffer=gray_buffer(values),
+            opacity=1.0,
+            visible=True,
+            blend_mode=BlendMode.NORMAL,
+        )
+        self._layers.insert(index + 1, layer)
+        self._active_layer_index = index + 1
+        self._mark_layers_changed()
+
     @Slot(int)
+    @_journaled
     def deleteLayer(self, index: int) -> None:
         if len(self._layers) <= 1:
             return
@@ -545,10 +1023,12 @@ class PainterBackend(QQuickPaintedItem):
         self._mark_layers_changed()
 
     @Slot()
+    @_journaled
     def deleteActiveLayer(self) -> None:
         self.deleteLayer(self._active_layer_index)
 
     @Slot(int)
+    @_journaled
     def setActiveLayer(self, index: int) -> None:
         if index < 0 or index >= len(self._layers):
             return
@@ -558,6 +1038,7 @@ class PainterBackend(QQuickPaintedItem):
             self.layersChanged.emit()
 
     @Slot(int, float)
+    @_journaled
     def setLayerOpacity(self, index: int, opacity: float) -> None:
         if index < 0 or index >= len(self._layers):
             return
@@ -569,6 +1050,7 @@ class PainterBackend(QQuickPaintedItem):
         self._mark_layers_changed()
 
     @Slot(int, bool)
+    @_journaled
     def setLayerVisible(self, index: int, visible: bool) -> None:
         if index < 0 or index >= len(self._layers):
             return
@@ -579,6 +1061,7 @@ class PainterBackend(QQuickPaintedItem):
         self._mark_layers_changed()
 
     @Slot(int, str)
+    @_journaled
     def setLayerBlendMode(self, index: int, mode: str) -> None:
         if index < 0 or index >= len(self._layers):
             return
@@ -593,6 +1076,7 @@ class PainterBackend(QQuickPaintedItem):
         self._mark_layers_changed()
 
     @Slot(int, int)
+    @_journaled
     def moveLayer(self, from_index: int, to_index: int) -> None:
         if from_index < 0 or from_index >= len(self._layers):
             return
@@ -602,19 +1086,23 @@ class PainterBackend(QQuickPaintedItem):
         self._push_undo_state()
         layer = self._layers.pop(from_index)
         self._layers.insert(to_index, layer)
+        self._layer_model.move(from_index, to_index)
         if self._active_layer_index == from_index:
             self._active_layer_index = to_index
         self._mark_layers_changed()
 
     @Slot(int)
+    @_journaled
     def moveLayerUp(self, index: int) -> None:
         self.moveLayer(index, index + 1)
 
     @Slot(int)
+    @_journaled
     def moveLayerDown(self, index: int) -> None:
         self.moveLayer(index, index - 1)
 
     @Slot(int, int, int)
+    @_journaled
     def applyHistogram(self, index: int, min_value: int, max_value: int, center_value: int) -> None:
         if index < 0 or index >= len(self._layers):
             return
@@ -624,48 +1112,255 @@ class PainterBackend(QQuickPaintedItem):
         if max_value <= min_value:
             return
 
+        rect, coverage = self._selection_work_area()
         self._push_undo_state()
         layer = self._layers[index]
-        img = layer.image
-        width, height = img.width(), img.height()
         min_f = float(min_value)
         max_f = float(max_value)
         inv_range = 1.0 / (max_f - min_f)
         center_shift = (center_value / 255.0) - 0.5
 
-        for y in range(height):
-            for x in range(width):
-                c = img.pixelColor(x, y)
-                v = c.red()
-                norm = (v - min_f) * inv_range
-                norm = _clamp(norm + center_shift, 0.0, 1.0)
-                out_v = int(_clamp(norm * 255.0, 0.0, 255.0))
-                c.setRed(out_v)
-                c.setGreen(out_v)
-                c.setBlue(out_v)
-                img.setPixelColor(x, y, c)
+        def adjust(pixels: np.ndarray) -> None:
+            norm = np.clip((gray_values(pixels) - min_f) * inv_range + center_shift, 0.0, 1.0)
+            out_v = np.clip(norm * 255.0, 0.0, 255.0).astype(np.uint8)
+            pixels[..., GRAY_CHANNELS] = premultiply(out_v, pixels[..., ALPHA_CHANNEL])[..., None]
+
+        rx, ry = rect[0], rect[1]
+        # Transparent pixels map to themselves, so only tiles with content are
+        # visited, and a uniform tile is adjusted through a single pixel.
+        for part, uniform in list(layer.buffer.content_parts(rect)):
+            px, py, pw, ph = part
+            part_coverage = None if coverage is None else coverage[py - ry:py - ry + ph, px - rx:px - rx + pw]
+            if part_coverage is not None and not part_coverage.any():
+                continue
+            with layer.buffer.edit(part) as pixels:
+                original = pixels.copy() if part_coverage is not None else None
+                if uniform is not None:
+                    adjust(pixels[:1, :1])
+                    pixels[...] = pixels[:1, :1]
+                else:
+                    adjust(pixels)
+                if original is not None:
+                    blend_masked(pixels, original, part_coverage)
+
+        self._mark_layers_changed()
+
+    @Slot(int, str, int, float)
+    @_journaled
+    def applySmoothFilter(self, index: int, kind: str, radius: int, edge: float = 32.0) -> None:
+        """
+        Smooths a layer (or the selected part of it) with a Gaussian, box or
+        edge-preserving bilateral filter reaching ``radius`` pixels; ``edge``
+        is the bilateral filter's gray-level tolerance.
+        """
+        if index < 0 or index >= len(self._layers):
+            return
+        try:
+            kind_enum = SmoothFilter(kind)
+        except ValueError:
+            kind_enum = SmoothFilter.GAUSSIAN
+        radius = int(_clamp(radius, 0, SMOOTH_MAX_RADIUS))
+        layer = self._layers[index]
+        bounds = layer.buffer.bounds()
+        if radius == 0 or bounds is None:
+            return
+        rect, coverage = self._selection_work_area()
+        # Pixels further than the radius from any content stay transparent
+        reach = (bounds[0] - radius, bounds[1] - radius, bounds[2] + 2 * radius, bounds[3] + 2 * radius)
+        work = intersect_rects(rect, reach)
+        if work is None:
+            return
+        if coverage is not None:
+            coverage = coverage[work[1] - rect[1]:work[1] - rect[1] + work[3], work[0] - rect[0]:work[0] - rect[0] + work[2]]
 
+        self._push_undo_state()
+        # Tiles read their halo from an O(1) clone, untouched by the writes below
+        source = layer.buffer.clone()
+        canvas = (0, 0, self._canvas_width, self._canvas_height)
+        for tile, pixels in smooth_tiles(source, work, canvas, kind_enum, radius, max(1.0, float(edge)), coverage):
+            layer.buffer.write(tile, pixels)
         self._mark_layers_changed()
 
+    @Slot(int, str, int, str)
+    @_journaled
+    def applyMorphology(self, index: int, op: str, radius: int, shape: str = "round") -> None:
+        """
+        Grows (dilate), shrinks (erode), opens (removes specks narrower than
+        the element) or closes (fills holes and gaps) a layer's mask with a
+        round or square element of ``radius`` pixels, within the selection.
+        """
+        if index < 0 or index >= len(self._layers):
+            return
+        try:
+            op_enum = MorphologyOp(op)
+        except ValueError:
+            return
+        try:
+            shape_enum = StructuringShape(shape)
+        except ValueError:
+            shape_enum = StructuringShape.ROUND
+        radius = int(_clamp(radius, 0, MORPHOLOGY_MAX_RADIUS))
+        layer = self._layers[index]
+        bounds = layer.buffer.bounds()
+        if radius == 0 or bounds is None:
+            return
+        rect, coverage = self._selection_work_area()
+        reach = morphology_reach(op_enum, radius)
+        work = intersect_rects(rect, (bounds[0] - reach, bounds[1] - reach, bounds[2] + 2 * reach, bounds[3] + 2 * reach))
+        if work is None:
+            return
+        if coverage is not None:
+            coverage = coverage[work[1] - rect[1]:work[1] - rect[1] + work[3], work[0] - rect[0]:work[0] - rect[0] + work[2]]
+
+        self._push_undo_state()
+        source = layer.buffer.clone()
+        canvas = (0, 0, self._canvas_width, self._canvas_height)
+        for band, pixels in morph_bands(source, work, canvas, op_enum, radius, shape_enum, coverage):
+            layer.buffer.write(band, pixels)
+        self._mark_layers_changed()
+
+    @Slot(int, int)
+    @_journaled
+    def thresholdToMask(self, index: int, threshold: int = 128) -> None:
+        """
+        Hardens a layer into a binary mask: pixels whose flattened gray level
+        is at least ``threshold`` become opaque white, the others black (with
+        their coverage kept), within the selection.
+        """
+        if index < 0 or index >= len(self._layers):
+            return
+        threshold = int(_clamp(threshold, 1, 255))
+        rect, coverage = self._selection_work_area()
+        self._push_undo_state()
+        layer = self._layers[index]
+
+        def harden(pixels: np.ndarray) -> None:
+            on = pixels[..., RGB_CHANNELS[0]] >= threshold
+            alpha = np.where(on, np.uint8(255), pixels[..., ALPHA_CHANNEL])
+            pixels[...] = gray_pixels(np.where(on, np.uint8(255), np.uint8(0)), alpha)
+
+        rx, ry = rect[0], rect[1]
+        # Transparent pixels stay transparent, so only content is visited
+        for part, uniform in list(layer.buffer.content_parts(rect)):
+            px, py, pw, ph = part
+            part_coverage = None if coverage is None else coverage[py - ry:py - ry + ph, px - rx:px - rx + pw]
+            if part_coverage is not None and not part_coverage.any():
+                continue
+            with layer.buffer.edit(part) as pixels:
+                original = pixels.copy() if part_coverage is not None else None
+                if uniform is not None:
+                    harden(pixels[:1, :1])
+                    pixels[...] = pixels[:1, :1]
+                else:
+                    harden(pixels)
+                if original is not None:
+                    blend_masked(pixels, original, part_coverage)
+
+        self._mark_layers_changed()
+
+    @Slot(int, str, int, float, result=str)
+    def previewSmoothFilter(self, index: int, kind: str, radius: int, edge: float = 32.0) -> str:
+        """
+        Image URL of a low-resolution preview of ``applySmoothFilter`` on the
+        whole layer, filtered from a downsampled copy (kept until the layer
+        changes) with the radius scaled to match.
+        """
+        if index < 0 or index >= len(self._layers):
+            return ""
+        try:
+            kind_enum = SmoothFilter(kind)
+        except ValueError:
+            kind_enum = SmoothFilter.GAUSSIAN
+        width, height = self._canvas_width, self._canvas_height
+        buffer = self._layers[index].buffer
+        key = thumbnail_key(buffer.generation, width, height)
+        if self._filter_preview_base is None or self._filter_preview_base[0] != key:
+            image = render_thumbnail(buffer, width, height, FILTER_PREVIEW_SIZE)
+            self._filter_preview_base = (key, const_image_array(image).copy())
+        base = self._filter_preview_base[1]
+        scale = base.shape[1] / width
+        preview_radius = int(round(_clamp(radius, 0, SMOOTH_MAX_RADIUS) * scale))
+        pixels = smooth_pixels(base, kind_enum, preview_radius, max(1.0, float(edge)))
+        image = QImage(pixels.shape[1], pixels.shape[0], QImage.Format_ARGB32_Premultiplied)
+        image_array(image)[...] = pixels
+
+        cache = thumbnail_cache()
+        cache.discard(self._filter_preview_key)
+        self._filter_preview_serial += 1
+        self._filter_preview_key = f"filter-{self._filter_preview_serial}"
+        cache.put(self._filter_preview_key, image)
+        return thumbnail_url(self._filter_preview_key)
+
+    @Slot()
+    @_journaled
+    def selectAll(self) -> None:
+        self._set_selection(Selection.from_rect(self._canvas_width, self._canvas_height, (0, 0, self._canvas_width, self._canvas_height)))
+
+    @Slot()
+    @_journaled
+    def clearSelection(self) -> None:
+        if not self._selection.is_empty:
+            self._set_selection(Selection(self._canvas_width, self._canvas_height))
+
+    @Slot()
+    @_journaled
+    def invertSelection(self) -> None:
+        self._set_selection(self._selection.inverted())
+
     @Slot()
+    @_journaled
+    def beginTransaction(self) -> None:
+        """Groups every change until the matching commitTransaction() into one history entry."""
+        self._transaction_depth += 1
+
+    @Slot()
+    @_journaled
+    def commitTransaction(self) -> None:
+        if self._transaction_depth == 0:
+            return
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self._transaction_pushed = False
+
+    @Slot()
+    @_journaled
+    def cancelTransaction(self) -> None:
+        """Closes all open transactions and reverts the changes made inside them."""
+        if self._transaction_depth == 0:
+            return
+        pushed = self._transaction_pushed
+        self._end_transactions()
+        if pushed and self._undo_stack:
+            self._restore_state(self._undo_stack.pop())
+            self._update_undo_redo_flags()
+            self._journal_history_step(undo=True)
+
+    @Slot()
+    @_journaled
     def undo(self) -> None:
+        self._end_transactions()
         if not self._undo_stack:
             return
         state = self._undo_stack.pop()
         self._redo_stack.append(self._capture_state())
         self._restore_state(state)
         self._update_undo_redo_flags()
+        self._journal_history_step(undo=True, redo_entry=True)
 
     @Slot()
+    @_journaled
     def redo(self) -> None:
+        self._end_transactions()
         if not self._redo_stack:
             return
         state = self._redo_stack.pop()
         self._undo_stack.append(self._capture_state())
         self._restore_state(state)
         self._update_undo_redo_flags()
+        self._journal_history_step(undo=False)
 
     @Slot(int, int)
+    @_journaled
     def newCanvas(self, width: int, height: int) -> None:
         width = max(1, int(width))
         height = max(1, int(height))
@@ -673,15 +1368,17 @@ class PainterBackend(QQuickPaintedItem):
         self._canvas_height = height
         self._layers = [self._make_blank_layer("Layer 1")]
         self._active_layer_index = 0
-        self._composite = self._make_canvas_image(fill_transparent=True)
         self._undo_stack.clear()
         self._redo_stack.clear()
-        self._mark_composite_dirty()
+        self._end_transactions()
+        self._reset_selection()
+        self._reset_composite()
         self.canvasSizeChanged.emit()
         self.layersChanged.emit()
         self.activeLayerChanged.emit()
         self._update_undo_redo_flags()
         self._set_dirty(False)
+        self._write_checkpoint()
         self.update()
 
     @Slot(str, result=bool)
@@ -693,12 +1390,14 @@ class PainterBackend(QQuickPaintedItem):
             with open(path, "w", encoding="utf-8") as f:
                 json.dump(payload, f)
             self._set_dirty(False)
+            self._write_checkpoint()
             return True
         except Exception as exc:
             print(f"Failed to save project: {exc}")
             return False
 
     @Slot(str, result=bool)
+    @_journaled
     def loadProject(self, path: str) -> bool:
         if not path:
             return False
@@ -708,7 +1407,312 @@ class PainterBackend(QQuickPaintedItem):
         except Exception as exc:
             print(f"Failed to load project: {exc}")
             return False
+        self._load_project_data(data)
+        self._write_checkpoint()
+        return True
+
+    @Slot(str, result=bool)
+    def exportPng(self, path: str) -> bool:
+        if not path:
+            return False
+        try:
+            self._ensure_composite()
+            return self._composite.save(path, "PNG")
+        except Exception as exc:
+            print(f"Failed to export png: {exc}")
+            return False
+
+    @Slot(str, result=bool)
+    def exportHeightmap(self, path: str) -> bool:
+        """
+        Streams the flattened gray levels to a 16-bit grayscale .png, a 16-bit
+        little-endian .r16/.raw or a float32 .npy, chosen by extension.
+        """
+        fmt = heightmap_format(path) if path else None
+        if fmt is None:
+            return False
+        try:
+            export_heightmap(self._layer_sources(), self._canvas_width, self._canvas_height, path, fmt)
+            return True
+        except Exception as exc:
+            print(f"Failed to export heightmap: {exc}")
+            return False
+
+    @Slot(str, list, int, result=bool)
+    def exportChannelPack(self, path: str, channels: list, bit_depth: int = 8) -> bool:
+        """
+        Packs layer groups into the channels of one image in a single pass.
+        ``channels`` holds, per output channel (gray, gray+alpha, RGB or
+        RGBA), the indices of the layers flattened into it; an empty group
+        exports as 0. Grouped layers are used even when hidden.
+        """
+        if not path or not 1 <= len(channels) <= 4 or bit_depth not in (8, 16):
+            return False
+        try:
+            groups = [self._layer_sources([int(idx) for idx in group]) for group in channels]
+            export_channel_pack(groups, self._canvas_width, self._canvas_height, path, bit_depth)
+            return True
+        except Exception as exc:
+            print(f"Failed to export channel pack: {exc}")
+            return False
+
+    @Slot(str, result=bool)
+    def playMacro(self, path: str) -> bool:
+        """Replays a JSON script or session journal on the document as one history entry."""
+        try:
+            ops = load_operations(path)
+        except (OSError, ValueError) as exc:
+            print(f"Failed to load macro: {exc}")
+            return False
+        self.beginTransaction()
+        try:
+            # Recorded like live edits, so the journal covers the macro's effects
+            self._replay_operations(ops, record=True)
+        except Exception as exc:
+            print(f"Macro failed, changes reverted: {exc}")
+            self.cancelTransaction()
+            return False
+        self.commitTransaction()
+        return True
+
+    @Slot(str, result=bool)
+    @_journaled
+    def importImageAsLayer(self, path: str) -> bool:
+        if not path:
+            return False
+        return self.importImagesAsLayers([path]) > 0
+
+    @Slot(list, result=int)
+    @_journaled
+    def importImagesAsLayers(self, paths: list) -> int:
+        """
+        Adds one layer per readable image, decoded in parallel on the worker
+        pool, as a single undo step. Returns the number of layers added.
+        """
+        paths = [str(path) for path in paths if path]
+        if not paths:
+            return 0
+        width, height = self._canvas_width, self._canvas_height
+        buffers = [
+            buffer
+            for buffer in worker_pool().map(lambda path: _decode_layer_image(path, width, height), paths)
+            if buffer is not None
+        ]
+        if not buffers:
+            return 0
+        self._push_undo_state()
+        for buffer in buffers:
+            self._layers.append(
+                Layer(
+                    name=f"Imported {len(self._layers)+1}",
+                    buffer=buffer,
+                    opacity=1.0,
+                    visible=True,
+                    blend_mode=BlendMode.NORMAL,
+                )
+            )
+        self._active_layer_index = len(self._layers) - 1
+        self._mark_layers_changed()
+        # Imported pixels cannot be replayed from the journal
+        self._write_checkpoint(replayable=False)
+        return len(buffers)
+
+    # --- Internal logic ---
+
+    def _input_press(self, x: float, y: float, t: float) -> None:
+        point = QPointF(x, y)
+        self._gesture_begin(x, y, t)
+        self._last_point = point
+
+        if self._tool_mode == ToolMode.TEMPORAL:
+            self._begin_stroke()
+            self._temp_path.reset(x, y, t)
+            self.update()
+        elif self._tool_mode == ToolMode.FILL:
+            self._begin_stroke()
+            self._apply_fill(point)
+            self._stroke_begun = False
+        elif self._tool_mode in (ToolMode.LINEAR_GRADIENT, ToolMode.RADIAL_GRADIENT):
+            self._begin_stroke()
+            self._gradient_start_point = point
+        elif self._tool_mode == ToolMode.PICKER:
+            sampled = self._sample_point(point)
+            if sampled is not None:
+                self.grayValue = sampled
+        elif self._tool_mode == ToolMode.SELECT_RECT:
+            self._select_anchor = point
+            self._select_current = point
+        elif self._tool_mode == ToolMode.SELECT_LASSO:
+            self._temp_path.reset(x, y, t)
+            self.update()
+        elif self._tool_mode == ToolMode.SELECT_VALUE:
+            self._select_by_value(point)
+        else:
+            print(f"[debug] press tool={self._tool_mode.value} brushSize={self._brush_size} gray={self._gray_value}")
+            self._begin_stroke()
+            self._dabs = None
+            self._paint_stroke(point, point)
+
+    def _input_move(self, x: float, y: float, t: float) -> None:
+        point = QPointF(x, y)
+        self._gesture_point(x, y, t)
+
+        if self._tool_mode == ToolMode.TEMPORAL:
+            if not self._temp_path:
+                self._temp_path.reset(x, y, t)
+                self.update()
+                return
 
+            if (point - self._temp_path.last()).manhattanLength() > 1.5:
+                self._temp_path.append(x, y, t)
+            self.update()
+        elif self._tool_mode == ToolMode.FILL:
+            # Fill only on press for now
+            return
+        elif self._tool_mode in (ToolMode.LINEAR_GRADIENT, ToolMode.RADIAL_GRADIENT):
+            return
+        elif self._tool_mode == ToolMode.PICKER:
+            return
+        elif self._tool_mode == ToolMode.SELECT_RECT:
+            if self._select_anchor is not None:
+                self._select_current = point
+                self.update()
+        elif self._tool_mode == ToolMode.SELECT_LASSO:
+            if self._temp_path and (point - self._temp_path.last()).manhattanLength() > 1.5:
+                self._temp_path.append(x, y, t)
+                self.update()
+        elif self._tool_mode == ToolMode.SELECT_VALUE:
+            return
+        else:
+            if self._last_point is None:
+                self._last_point = point
+            self._paint_stroke(self._last_point, point)
+            self._last_point = point
+
+    def _input_release(self, x: float, y: float, t: float) -> None:
+        point = QPointF(x, y)
+        self._gesture_point(x, y, t)
+
+        if self._tool_mode == ToolMode.TEMPORAL:
+            if not self._temp_path:
+                self._temp_path.reset(x, y, t)
+            else:
+                self._temp_path.append(x, y, t)
+            self._bake_temporal_gradient()
+            self._temp_path.clear()
+            self.update()
+        elif self._tool_mode == ToolMode.FILL:
+            # Applied on press
+            pass
+        elif self._tool_mode == ToolMode.PICKER:
+            sampled = self._sample_point(point)
+            if sampled is not None:
+                self.grayValue = sampled
+        elif self._tool_mode in (ToolMode.LINEAR_GRADIENT, ToolMode.RADIAL_GRADIENT):
+            if self._gradient_start_point is None:
+                self._gradient_start_point = point
+            self._apply_gradient(self._gradient_start_point, point, self._tool_mode)
+            self._gradient_start_point = None
+        elif self._tool_mode == ToolMode.SELECT_RECT:
+            if self._select_anchor is not None:
+                rect = QRectF(self._select_anchor, point).normalized()
+                if rect.width() < 1 or rect.height() < 1:
+                    self.clearSelection()
+                else:
+                    left, top = math.floor(rect.left()), math.floor(rect.top())
+                    right, bottom = math.ceil(rect.right()), math.ceil(rect.bottom())
+                    self._set_selection(Selection.from_rect(self._canvas_width, self._canvas_height, (left, top, right - left, bottom - top)))
+            self._select_anchor = None
+            self._select_current = None
+            self.update()
+        elif self._tool_mode == ToolMode.SELECT_LASSO:
+            if self._temp_path:
+                self._temp_path.append(x, y, t)
+                self._temp_path.simplify()
+                points = [(float(px), float(py)) for px, py in self._temp_path.points]
+                if len(points) < 3:
+                    self.clearSelection()
+                else:
+                    self._set_selection(Selection.from_polygon(self._canvas_width, self._canvas_height, points))
+            self._temp_path.clear()
+            self.update()
+        elif self._tool_mode == ToolMode.SELECT_VALUE:
+            pass
+        else:
+            if self._last_point is None:
+                self._last_point = point
+            self._paint_stroke(self._last_point, point)
+            self._last_point = None
+            self._dabs = None
+
+        self._stroke_begun = False
+        self._gesture_end()
+
+    def _gesture_begin(self, x: float, y: float, t: float) -> None:
+        # The picker only changes grayValue, which later gestures carry anyway
+        if self._journal is None or self._journal_depth > 0 or self._tool_mode == ToolMode.PICKER:
+            self._gesture = None
+            return
+        self._gesture = [(x, y, t)]
+        self._gesture_settings = {name: getattr(self, name) for name in self.GESTURE_SETTINGS}
+
+    def _gesture_point(self, x: float, y: float, t: float) -> None:
+        if self._gesture is not None:
+            self._gesture.append((x, y, t))
+
+    def _gesture_end(self) -> None:
+        """Journals the finished gesture; it is a committed operation once released."""
+        if self._gesture is None:
+            return
+        points = np.array(self._gesture, dtype=np.float64)
+        self._gesture = None
+        if self._journal is not None:
+            self._journal.append(GestureOp(self._gesture_settings, points))
+
+    def _replay_operations(
+        self,
+        ops: Sequence[Operation],
+        record: bool = False,
+        step: Optional[Callable[[Operation], None]] = None,
+    ) -> None:
+        """
+        Re-executes operations in order; ``step`` is called after each one.
+        Without ``record`` they are not journaled again (recovery, headless
+        runs). Tool settings are restored afterwards, since gestures carry
+        their own.
+        """
+        settings = {name: getattr(self, name) for name in self.GESTURE_SETTINGS}
+        depth = 0 if record else 1
+        self._journal_depth += depth
+        try:
+            for op in ops:
+                self._replay_operation(op)
+                if step is not None:
+                    step(op)
+        finally:
+            self._journal_depth -= depth
+            for name, value in settings.items():
+                setattr(self, name, value)
+
+    def _replay_operation(self, op: Operation) -> None:
+        if isinstance(op, CallOp):
+            method = getattr(type(self), op.name, None)
+            if not getattr(method, "journaled", False):
+                raise ValueError(f"{op.name} is not a journaled operation")
+            getattr(self, op.name)(*op.args)
+            return
+        for name, value in op.settings.items():
+            if name in self.GESTURE_SETTINGS:
+                setattr(self, name, value)
+        points = op.points
+        if len(points) == 0:
+            return
+        self._input_press(*points[0])
+        for x, y, t in points[1:-1]:
+            self._input_move(x, y, t)
+        self._input_release(*points[-1])
+
+    def _load_project_data(self, data: dict) -> None:
         width = int(data.get("width", self._canvas_width))
         height = int(data.get("height", self._canvas_height))
         layers_data = data.get("layers", [])
@@ -716,19 +1720,28 @@ class PainterBackend(QQuickPaintedItem):
         for idx, entry in enumerate(layers_data):
             if not isinstance(entry, dict):
                 continue
-            encoded_img = entry.get("image", "")
-            img = self._image_from_base64(encoded_img) if encoded_img else None
-            if img is None:
-                continue
-            if img.width() != width or img.height() != height:
-                img = img.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            # Checkpoints hold their pixels already in tiles; the clone leaves
+            # them untouched for another load (replay --repeat)
+            buffer = entry.get("buffer")
+            if isinstance(buffer, TileBuffer):
+                buffer = buffer.clone()
+            else:
+                encoded_img = entry.get("image", "")
+                img = self._image_from_base64(encoded_img) if encoded_img else None
+                if img is None:
+                    continue
+                offset = entry.get("offset")
+                if offset is None and (img.width() != width or img.height() != height):
+                    img = img.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+                x, y = (int(v) for v in offset) if offset is not None else (0, 0)
+                buffer = TileBuffer.from_image(img, x, y)
             try:
                 blend_mode = BlendMode(entry.get("blendMode", BlendMode.NORMAL.value))
             except ValueError:
                 blend_mode = BlendMode.NORMAL
             layer = Layer(
                 name=str(entry.get("name", f"Layer {idx+1}")),
-                image=img,
+                buffer=buffer,
                 opacity=float(entry.get("opacity", 1.0)),
                 visible=bool(entry.get("visible", True)),
                 blend_mode=blend_mode,
@@ -745,54 +1758,17 @@ class PainterBackend(QQuickPaintedItem):
         self.brushSize = int(data.get("brushSize", self._brush_size))
         self.grayValue = int(data.get("grayValue", self._gray_value))
         self.toolMode = str(data.get("toolMode", self._tool_mode.value))
-        self._composite = self._make_canvas_image(fill_transparent=True)
-        self._mark_composite_dirty()
+        self._reset_selection()
+        self._reset_composite()
         self.canvasSizeChanged.emit()
         self.layersChanged.emit()
         self.activeLayerChanged.emit()
         self._undo_stack.clear()
         self._redo_stack.clear()
+        self._end_transactions()
         self._update_undo_redo_flags()
         self._set_dirty(False)
         self.update()
-        return True
-
-    @Slot(str, result=bool)
-    def exportPng(self, path: str) -> bool:
-        if not path:
-            return False
-        try:
-            self._ensure_composite()
-            return self._composite.save(path, "PNG")
-        except Exception as exc:
-            print(f"Failed to export png: {exc}")
-            return False
-
-    @Slot(str, result=bool)
-    def importImageAsLayer(self, path: str) -> bool:
-        if not path:
-            return False
-        img = QImage(path)
-        if img.isNull():
-            return False
-        if img.format() != QImage.Format_ARGB32_Premultiplied:
-            img = img.convertToFormat(QImage.Format_ARGB32_Premultiplied)
-        if img.width() != self._canvas_width or img.height() != self._canvas_height:
-            img = img.scaled(self._canvas_width, self._canvas_height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-        self._push_undo_state()
-        layer = Layer(
-            name=f"Imported {len(self._layers)+1}",
-            image=img,
-            opacity=1.0,
-            visible=True,
-            blend_mode=BlendMode.NORMAL,
-        )
-        self._layers.append(layer)
-        self._active_layer_index = len(self._layers) - 1
-        self._mark_layers_changed()
-        return True
-
-    # --- Internal logic ---
 
     def _make_canvas_image(self, fill_transparent: bool = True) -> QImage:
         image = QImage(self._canvas_width, self._canvas_height, QImage.Format_ARGB32_Premultiplied)
@@ -803,16 +1779,16 @@ class PainterBackend(QQuickPaintedItem):
         return image
 
     def _make_blank_layer(self, name: str) -> Layer:
-        img = self._make_canvas_image(fill_transparent=True)
-        return Layer(name=name, image=img)
+        return Layer(name=name, buffer=TileBuffer())
 
     def _clone_layer(self, layer: Layer) -> Layer:
         return Layer(
             name=layer.name,
-            image=layer.image.copy(),
+            buffer=layer.buffer.clone(),
             opacity=layer.opacity,
             visible=layer.visible,
             blend_mode=layer.blend_mode,
+            thumbnail=layer.thumbnail,
         )
 
     def _begin_stroke(self) -> None:
@@ -829,9 +1805,32 @@ class PainterBackend(QQuickPaintedItem):
         layer = self._active_layer()
         if layer is None:
             return
-        painter = QPainter(layer.image)
-        painter.setRenderHint(QPainter.Antialiasing)
+        if self._tool_mode in (ToolMode.BLUR, ToolMode.SMUDGE):
+            self._paint_dabs(layer, start, end)
+            return
+        bounds = self._stroke_bounds(start, end)
+        with self._layer_painter(layer, bounds) as painter:
+            if painter is not None:
+                self._draw_stroke(painter, start, end)
 
+        self._mark_composite_dirty(bounds)
+        self.update()
+
+    def _paint_dabs(self, layer: Layer, start: QPointF, end: QPointF) -> None:
+        """Blur / smudge dabs along the segment; each reads and writes only its own footprint (plus the blur halo)."""
+        if self._dabs is None:
+            self._dabs = DabStroke(self._brush_size, self._brush_strength, smudge=self._tool_mode == ToolMode.SMUDGE)
+        canvas = (0, 0, self._canvas_width, self._canvas_height)
+        for x, y in self._dabs.positions(start.x(), start.y(), end.x(), end.y()):
+            result = self._dabs.dab(layer.buffer, canvas, x, y, self._selection)
+            if result is None:
+                continue
+            rect, pixels = result
+            layer.buffer.write(rect, pixels)
+            self._mark_composite_dirty(rect)
+        self.update()
+
+    def _draw_stroke(self, painter: QPainter, start: QPointF, end: QPointF) -> None:
         if self._tool_mode == ToolMode.ERASER:
             painter.setCompositionMode(QPainter.CompositionMode_Clear)
             pen_color = Qt.transparent
@@ -852,115 +1851,138 @@ class PainterBackend(QQuickPaintedItem):
             pen = QPen(pen_color, self._brush_size, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
             painter.setPen(pen)
             painter.drawLine(start, end)
-        painter.end()
 
-        self._mark_composite_dirty()
-        self.update()
+    def _stroke_bounds(self, start: QPointF, end: QPointF) -> QRectF:
+        pad = self._brush_size * 0.5 + 2.0
+        return QRectF(start, end).normalized().adjusted(-pad, -pad, pad, pad)
+
+    @contextmanager
+    def _layer_painter(self, layer: Layer, bounds: QRectF) -> Iterator[Optional[QPainter]]:
+        """
+        Antialiased painter on the layer. With an active selection, painting is
+        clipped to the selection box and blended back through its coverage;
+        yields None when ``bounds`` misses the selection entirely.
+        """
+        area = bounds.toAlignedRect().intersected(QRect(0, 0, self._canvas_width, self._canvas_height))
+        rect: Optional[Rect] = (area.x(), area.y(), area.width(), area.height())
+        if area.isEmpty():
+            rect = None
+        elif not self._selection.is_empty:
+            rect = self._selection.clip(rect)
+        if rect is None:
+            yield None
+            return
+
+        # Paint into a detached copy of just the touched region, then store it
+        # back; only the tiles under ``rect`` are copied-on-write.
+        x, y, w, h = rect
+        image = layer.buffer.image(rect)
+        original = const_image_array(image).copy() if not self._selection.is_empty else None
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.translate(-x, -y)
+        try:
+            yield painter
+        finally:
+            painter.end()
+        if original is not None:
+            blend_masked(image_array(image), original, self._selection.mask_for(rect))
+        layer.buffer.write_image(x, y, image)
 
     def _sample_point(self, point: QPointF) -> Optional[int]:
+        """Composite gray level at ``point``, averaged over ``sampleRadius``; None off-canvas."""
         x = int(point.x())
         y = int(point.y())
         if x < 0 or y < 0 or x >= self._canvas_width or y >= self._canvas_height:
             return None
-        self._ensure_composite()
-        color = self._composite.pixelColor(x, y)
-        return color.red()
+        radius = self._sample_radius
+        rect = QRect(x - radius, y - radius, 2 * radius + 1, 2 * radius + 1)
+        pixels = self._composite_region(rect.intersected(QRect(0, 0, self._canvas_width, self._canvas_height)))
+        if radius > 0:
+            # Average premultiplied values so transparent pixels weigh nothing
+            mean = np.floor(pixels.reshape(-1, 4).mean(axis=0) + 0.5)
+            pixels = mean.astype(np.uint8).reshape(1, 1, 4)
+        return int(gray_values(pixels[:1, :1])[0, 0])
 
     def _bake_temporal_gradient(self) -> None:
         layer = self._active_layer()
         if layer is None:
             return
 
-        if len(self._temp_path) < 2:
+        path = self._temp_path
+        if len(path) < 2:
             value = self._temp_start * 255.0
-            if self._temp_sample_start or self._temp_sample_end:
-                self._ensure_composite()
-                src = self._composite
-                if self._temp_sample_start and self._temp_path:
-                    sx = int(self._temp_path[0].x())
-                    sy = int(self._temp_path[0].y())
-                    if 0 <= sx < src.width() and 0 <= sy < src.height():
-                        value = src.pixelColor(sx, sy).red()
-            self._stroke_single_point(self._temp_path[0], int(_clamp(value, 0, 255)))
+            if self._temp_sample_start and path:
+                sampled = self._sample_point(path.first())
+                if sampled is not None:
+                    value = sampled
+            self._stroke_single_point(path.first(), int(_clamp(value, 0, 255)))
             return
 
         start_v = self._temp_start * 255.0
         end_v = self._temp_end * 255.0
-        if self._temp_sample_start or self._temp_sample_end:
-            self._ensure_composite()
-            src = self._composite
-            if self._temp_sample_start and self._temp_path:
-                sx = int(self._temp_path[0].x())
-                sy = int(self._temp_path[0].y())
-                if 0 <= sx < src.width() and 0 <= sy < src.height():
-                    start_v = src.pixelColor(sx, sy).red()
-            if self._temp_sample_end and self._temp_path:
-                ex = int(self._temp_path[-1].x())
-                ey = int(self._temp_path[-1].y())
-                if 0 <= ex < src.width() and 0 <= ey < src.height():
-                    end_v = src.pixelColor(ex, ey).red()
-
-        use_time = not self._temp_pause_on_idle and len(self._temp_times) == len(self._temp_path)
+        if self._temp_sample_start:
+            sampled = self._sample_point(path.first())
+            if sampled is not None:
+                start_v = sampled
+        if self._temp_sample_end:
+            sampled = self._sample_point(path.last())
+            if sampled is not None:
+                end_v = sampled
+
+        # Sub-pixel simplification keeps the baked segment count proportional
+        # to the stroke's shape rather than to how slowly it was drawn.
+        path.simplify()
+        points = path.points
+        use_time = not self._temp_pause_on_idle
 
         if use_time:
-            cumulative = [0.0]
-            total = 0.0
-            start_time = self._temp_times[0]
-            last_time = start_time
-            for t in self._temp_times[1:]:
-                delta = max(0.0, t - last_time)
-                total += delta
-                cumulative.append(total)
-                last_time = t
+            deltas = np.maximum(np.diff(path.times), 0.0)
+            cumulative = np.concatenate(([0.0], np.cumsum(deltas)))
+            total = float(cumulative[-1])
             if total <= 1e-6:
                 use_time = False
         if not use_time:
-            cumulative = [0.0]
-            total = 0.0
-            for i in range(1, len(self._temp_path)):
-                segment = self._temp_path[i] - self._temp_path[i - 1]
-                distance = math.hypot(segment.x(), segment.y())
-                total += distance
-                cumulative.append(total)
+            segments = np.diff(points, axis=0)
+            cumulative = np.concatenate(([0.0], np.cumsum(np.hypot(segments[:, 0], segments[:, 1]))))
+            total = float(cumulative[-1])
             if total <= 1e-6:
                 value = int(_clamp(start_v, 0, 255))
-                self._stroke_single_point(self._temp_path[0], value)
+                self._stroke_single_point(path.first(), value)
                 return
 
         start_v = _clamp(start_v, 0, 255)
         end_v = _clamp(end_v, 0, 255)
-
-        painter = QPainter(layer.image)
-        painter.setRenderHint(QPainter.Antialiasing)
-
-        for i in range(1, len(self._temp_path)):
-            t1 = cumulative[i - 1] / total
-            t2 = cumulative[i] / total
-            t_mid = (t1 + t2) * 0.5
-            value = int(_clamp(start_v + (end_v - start_v) * t_mid, 0, 255))
-
-            pen = QPen(QColor(value, value, value), self._brush_size, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
-            painter.setPen(pen)
-            painter.drawLine(self._temp_path[i - 1], self._temp_path[i])
-
-        painter.end()
-        self._mark_composite_dirty()
+        t_mid = (cumulative[:-1] + cumulative[1:]) * (0.5 / total)
+        values = np.clip(start_v + (end_v - start_v) * t_mid, 0, 255).astype(np.int32)
+
+        lo = points.min(axis=0)
+        hi = points.max(axis=0)
+        bounds = self._stroke_bounds(QPointF(lo[0], lo[1]), QPointF(hi[0], hi[1]))
+        with self._layer_painter(layer, bounds) as painter:
+            if painter is not None:
+                for i in range(1, len(points)):
+                    value = int(values[i - 1])
+                    pen = QPen(QColor(value, value, value), self._brush_size, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
+                    painter.setPen(pen)
+                    painter.drawLine(QPointF(*points[i - 1]), QPointF(*points[i]))
+
+        self._mark_composite_dirty(bounds)
         self.update()
 
     def _stroke_single_point(self, point: QPointF, value: int) -> None:
         layer = self._active_layer()
         if layer is None:
             return
-        painter = QPainter(layer.image)
-        painter.setRenderHint(QPainter.Antialiasing)
-        painter.setPen(Qt.NoPen)
-        painter.setBrush(QColor(value, value, value))
-
-        radius = self._brush_size * 0.5
-        painter.drawEllipse(QRectF(point.x() - radius, point.y() - radius, self._brush_size, self._brush_size))
-        painter.end()
-
-        self._mark_composite_dirty()
+        bounds = self._stroke_bounds(point, point)
+        with self._layer_painter(layer, bounds) as painter:
+            if painter is not None:
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(QColor(value, value, value))
+                radius = self._brush_size * 0.5
+                painter.drawEllipse(QRectF(point.x() - radius, point.y() - radius, self._brush_size, self._brush_size))
+
+        self._mark_composite_dirty(bounds)
         self.update()
 
     def _apply_fill(self, point: QPointF) -> None:
@@ -973,96 +1995,64 @@ class PainterBackend(QQuickPaintedItem):
         if x < 0 or y < 0 or x >= self._canvas_width or y >= self._canvas_height:
             return
 
-        # Reference image for sampling
-        if self._fill_sample_all_layers:
-            self._ensure_composite()
-            src_img = self._composite
-        else:
-            src_img = layer.image
+        rect, coverage = self._selection_work_area()
+        rx, ry, rw, rh = rect
+        if not (rx <= x < rx + rw and ry <= y < ry + rh):
+            return
 
-        seed_color = src_img.pixelColor(x, y)
-        seed_val = seed_color.red()
-        seed_alpha = seed_color.alpha()
+        src = self._fill_source(layer, rect)
+        seed = src[y - ry:y - ry + 1, x - rx:x - rx + 1]
+        seed_val = int(gray_values(seed)[0, 0])
         target_val = int(_clamp(self._gray_value, 0, 255))
 
         if seed_val == target_val and not self._fill_sample_all_layers:
             # Nothing to do if replacing same value on same layer
             return
 
-        tol = int(_clamp(self._fill_tolerance, 0, 100))
-        threshold = int(255 * (tol / 100.0))
-
-        if self._fill_contiguous:
-            self._flood_fill(layer.image, src_img, x, y, seed_val, seed_alpha, target_val, threshold)
-        else:
-            self._global_fill(layer.image, src_img, seed_val, seed_alpha, target_val, threshold)
+        region = self._value_region(src, x - rx, y - ry, coverage)
+        with layer.buffer.edit(rect) as pixels:
+            original = pixels.copy() if coverage is not None else None
+            write_gray(pixels, target_val, region)
+            if original is not None:
+                blend_masked(pixels, original, coverage)
 
-        self._mark_composite_dirty()
+        self._mark_composite_dirty(rect)
         self.update()
 
-    def _within_tol(self, value: int, seed: int, threshold: int) -> bool:
-        return abs(value - seed) <= threshold
-
-    def _match_pixel(self, color: QColor, seed_val: int, seed_alpha: int, threshold: int) -> bool:
-        if seed_alpha == 0:
-            # Transparent seed: only match transparent pixels
-            return color.alpha() == 0
-        return color.alpha() != 0 and self._within_tol(color.red(), seed_val, threshold)
-
-    def _flood_fill(
-        self,
-        dst_img: QImage,
-        src_img: QImage,
-        x: int,
-        y: int,
-        seed_val: int,
-        seed_alpha: int,
-        target_val: int,
-        threshold: int,
-    ) -> None:
-        width = src_img.width()
-        height = src_img.height()
-        visited = bytearray(width * height)
-        stack = [(x, y)]
-
-        while stack:
-            cx, cy = stack.pop()
-            idx = cy * width + cx
-            if visited[idx]:
-                continue
-            visited[idx] = 1
-
-            c = src_img.pixelColor(cx, cy)
-            if not self._match_pixel(c, seed_val, seed_alpha, threshold):
-                continue
-
-            dst_img.setPixelColor(cx, cy, QColor(target_val, target_val, target_val, 255))
+    def _fill_source(self, layer: Layer, rect: Rect) -> np.ndarray:
+        # Reference pixels for sampling
+        x, y, w, h = rect
+        if self._fill_sample_all_layers:
+            # Only the work area needs to be current, not the whole canvas
+            self._ensure_composite(QRect(x, y, w, h))
+            return const_image_array(self._composite)[y:y + h, x:x + w]
+        return layer.buffer.read(rect)
+
+    def _value_region(self, src: np.ndarray, x: int, y: int, coverage: Optional[np.ndarray] = None) -> np.ndarray:
+        """Pixels of ``src`` matching the seed at local (x, y) under the fill tolerance and contiguity settings."""
+        seed = src[y:y + 1, x:x + 1]
+        seed_val = int(gray_values(seed)[0, 0])
+        seed_alpha = int(seed[0, 0, ALPHA_CHANNEL])
+        tol = int(_clamp(self._fill_tolerance, 0, 100))
+        threshold = int(255 * (tol / 100.0))
 
-            if cx > 0:
-                stack.append((cx - 1, cy))
-            if cx < width - 1:
-                stack.append((cx + 1, cy))
-            if cy > 0:
-                stack.append((cx, cy - 1))
-            if cy < height - 1:
-                stack.append((cx, cy + 1))
+        match = match_values(src, seed_val, seed_alpha, threshold)
+        if coverage is not None:
+            match &= coverage > 0
+        if self._fill_contiguous:
+            return flood_region(match, x, y)
+        return match
 
-    def _global_fill(
-        self,
-        dst_img: QImage,
-        src_img: QImage,
-        seed_val: int,
-        seed_alpha: int,
-        target_val: int,
-        threshold: int,
-    ) -> None:
-        width = src_img.width()
-        height = src_img.height()
-        for cy in range(height):
-            for cx in range(width):
-                c = src_img.pixelColor(cx, cy)
-                if self._match_pixel(c, seed_val, seed_alpha, threshold):
-                    dst_img.setPixelColor(cx, cy, QColor(target_val, target_val, target_val, 255))
+    def _select_by_value(self, point: QPointF) -> None:
+        layer = self._active_layer()
+        x = int(point.x())
+        y = int(point.y())
+        if layer is None or x < 0 or y < 0 or x >= self._canvas_width or y >= self._canvas_height:
+            return
+        src = self._fill_source(layer, (0, 0, self._canvas_width, self._canvas_height))
+        region = self._value_region(src, x, y)
+        mask = region.astype(np.uint8) * np.uint8(255)
+        self._set_selection(Selection.from_mask(self._canvas_width, self._canvas_height, mask))
 
     def _apply_gradient(self, start: QPointF, end: QPointF, mode: ToolMode) -> None:
         layer = self._active_layer()
@@ -1071,53 +2061,34 @@ class PainterBackend(QQuickPaintedItem):
 
         start_val = int(_clamp(self._gradient_start * 255.0, 0, 255))
         end_val = int(_clamp(self._gradient_end * 255.0, 0, 255))
-        if self._gradient_sample_start or self._gradient_sample_end:
-            self._ensure_composite()
-            src = self._composite
-            if self._gradient_sample_start:
-                sx = int(start.x())
-                sy = int(start.y())
-                if 0 <= sx < src.width() and 0 <= sy < src.height():
-                    start_val = src.pixelColor(sx, sy).red()
-            if self._gradient_sample_end:
-                ex = int(end.x())
-                ey = int(end.y())
-                if 0 <= ex < src.width() and 0 <= ey < src.height():
-                    end_val = src.pixelColor(ex, ey).red()
-
-        painter = QPainter(layer.image)
-        try:
-            painter.setRenderHint(QPainter.Antialiasing)
-
-            if mode == ToolMode.LINEAR_GRADIENT:
-                # Handle degenerate case
-                if start == end:
-                    painter.fillRect(0, 0, layer.image.width(), layer.image.height(), QColor(start_val, start_val, start_val, 255))
-                else:
-                    gradient = QLinearGradient(start, end)
-                    if self._gradient_clamp:
-                        gradient.setSpread(QGradient.PadSpread)
-                    else:
-                        gradient.setSpread(QGradient.ReflectSpread)
-                    gradient.setColorAt(0.0, QColor(start_val, start_val, start_val, 255))
-                    gradient.setColorAt(1.0, QColor(end_val, end_val, end_val, 255))
-                    painter.fillRect(0, 0, layer.image.width(), layer.image.height(), gradient)
-            else:
-                radius = math.hypot(end.x() - start.x(), end.y() - start.y())
-                if radius < 1e-3:
-                    painter.fillRect(0, 0, layer.image.width(), layer.image.height(), QColor(start_val, start_val, start_val, 255))
-                else:
-                    grad = QRadialGradient(start, radius)
-                    if self._gradient_clamp:
-                        grad.setSpread(QGradient.PadSpread)
-                    else:
-                        grad.setSpread(QGradient.ReflectSpread)
-                    grad.setColorAt(0.0, QColor(start_val, start_val, start_val, 255))
-                    grad.setColorAt(1.0, QColor(end_val, end_val, end_val, 255))
-                    painter.fillRect(0, 0, layer.image.width(), layer.image.height(), grad)
-        finally:
-            painter.end()
-        self._mark_composite_dirty()
+        if self._gradient_sample_start:
+            sampled = self._sample_point(start)
+            if sampled is not None:
+                start_val = sampled
+        if self._gradient_sample_end:
+            sampled = self._sample_point(end)
+            if sampled is not None:
+                end_val = sampled
+
+        rect, coverage = self._selection_work_area()
+        with layer.buffer.edit(rect) as pixels:
+            original = pixels.copy() if coverage is not None else None
+            # Exact per-pixel evaluation instead of QLinearGradient/QRadialGradient,
+            # so baked masks do not depend on Qt's gradient interpolation.
+            rasterize_gradient(
+                pixels,
+                mode == ToolMode.LINEAR_GRADIENT,
+                (start.x(), start.y()),
+                (end.x(), end.y()),
+                start_val,
+                end_val,
+                reflect=not self._gradient_clamp,
+                mask=coverage > 0 if coverage is not None else None,
+                origin=(rect[0], rect[1]),
+            )
+            if original is not None:
+                blend_masked(pixels, original, coverage)
+        self._mark_composite_dirty(rect)
         self.update()
 
     def _qt_composition_mode(self, blend: BlendMode) -> QPainter.CompositionMode:
@@ -1129,26 +2100,6 @@ class PainterBackend(QQuickPaintedItem):
             return QPainter.CompositionMode_Xor
         return QPainter.CompositionMode_SourceOver
 
-    def _resize_layer(self, layer: Layer, new_w: int, new_h: int, anchor: CanvasAnchor) -> Layer:
-        new_image = QImage(new_w, new_h, QImage.Format_ARGB32_Premultiplied)
-        new_image.fill(Qt.transparent)
-
-        old_w, old_h = layer.image.width(), layer.image.height()
-        dx, dy = self._anchor_offset(old_w, old_h, new_w, new_h, anchor)
-
-        painter = QPainter(new_image)
-        painter.setCompositionMode(QPainter.CompositionMode_Source)
-        painter.drawImage(dx, dy, layer.image)
-        painter.end()
-
-        return Layer(
-            name=layer.name,
-            image=new_image,
-            opacity=layer.opacity,
-            visible=layer.visible,
-            blend_mode=layer.blend_mode,
-        )
-
     def _anchor_offset(self, old_w: int, old_h: int, new_w: int, new_h: int, anchor: CanvasAnchor) -> Tuple[int, int]:
         if anchor == CanvasAnchor.CENTER:
             dx = (new_w - old_w) // 2
@@ -1168,14 +2119,46 @@ class PainterBackend(QQuickPaintedItem):
         return dx, dy
 
     def _push_undo_state(self) -> None:
+        if self._transaction_depth > 0:
+            if self._transaction_pushed:
+                # The entry taken when the transaction started already covers this change
+                self._set_dirty(True)
+                return
+            self._transaction_pushed = True
         state = self._capture_state()
         self._undo_stack.append(state)
         if len(self._undo_stack) > self.UNDO_LIMIT:
             self._undo_stack.pop(0)
         self._redo_stack.clear()
+        self._journal_undo_depth = min(self._journal_undo_depth + 1, self.UNDO_LIMIT)
+        self._journal_redo_depth = 0
         self._update_undo_redo_flags()
         self._set_dirty(True)
 
+    def _end_transactions(self) -> None:
+        self._transaction_depth = 0
+        self._transaction_pushed = False
+
+    def _journal_history_step(self, undo: bool, redo_entry: bool = False) -> None:
+        """
+        Tracks an undo (or redo) that consumed a history entry. Entries older
+        than the last checkpoint cannot be rebuilt by replay, so restoring one
+        writes a new checkpoint instead.
+        """
+        if undo:
+            replayable = self._journal_undo_depth > 0
+            if replayable:
+                self._journal_undo_depth -= 1
+                if redo_entry:
+                    self._journal_redo_depth += 1
+        else:
+            replayable = self._journal_redo_depth > 0
+            if replayable:
+                self._journal_redo_depth -= 1
+                self._journal_undo_depth += 1
+        if not replayable:
+            self._write_checkpoint(replayable=False)
+
     def _capture_state(self) -> LayerState:
         snapshot_layers = [self._clone_layer(layer) for layer in self._layers]
         return LayerState(
@@ -1191,13 +2174,124 @@ class PainterBackend(QQuickPaintedItem):
         self._active_layer_index = max(0, min(state.active_index, len(self._layers) - 1))
         self._canvas_width = state.canvas_width
         self._canvas_height = state.canvas_height
-        self._composite = self._make_canvas_image(fill_transparent=True)
+        if size_changed:
+            self._reset_selection()
+            self._reset_composite()
         self._mark_layers_changed()
         if size_changed:
             self.canvasSizeChanged.emit()
 
-    def _mark_composite_dirty(self) -> None:
-        self._composite_dirty = True
+    def _selection_work_area(self) -> Tuple[Rect, Optional[np.ndarray]]:
+        """Area a masked operation must process, plus its coverage (None without a selection)."""
+        if self._selection.is_empty:
+            return (0, 0, self._canvas_width, self._canvas_height), None
+        rect = self._selection.bounds
+        return rect, self._selection.mask_for(rect)
+
+    def _set_selection(self, selection: Selection) -> None:
+        self._selection = selection
+        self._selection_overlay = selection.overlay(QColor(77, 136, 255, 70))
+        self.selectionChanged.emit()
+        self.update()
+
+    def _reset_selection(self) -> None:
+        self._set_selection(Selection(self._canvas_width, self._canvas_height))
+
+    def _mark_composite_dirty(self, area: Union[QRect, QRectF, Rect, None] = None) -> None:
+        if area is None:
+            area = QRect(0, 0, self._canvas_width, self._canvas_height)
+        elif isinstance(area, QRectF):
+            area = area.toAlignedRect()
+        elif isinstance(area, tuple):
+            area = QRect(*area)
+        self._composite_dirty += area.intersected(QRect(0, 0, self._canvas_width, self._canvas_height))
+        # Restarting the timer debounces thumbnail work for as long as edits keep coming
+        self._thumbnail_timer.start()
+
+    def _refresh_thumbnails(self, request: bool = True) -> None:
+        """Shows ready thumbnails and, with ``request``, queues renders for layers whose pixels changed."""
+        if request and self._stroke_begun:
+            self._thumbnail_timer.start()
+            return
+        changed = False
+        cache = thumbnail_cache()
+        for layer in self._layers:
+            key = thumbnail_key(layer.buffer.generation, self._canvas_width, self._canvas_height)
+            url = thumbnail_url(key)
+            if layer.thumbnail == url:
+                continue
+            if key in cache:
+                layer.thumbnail = url
+                changed = True
+            elif request:
+                self._thumbnails.request(key, layer.buffer.clone(), self._canvas_width, self._canvas_height)
+        if changed:
+            self._sync_layer_model()
+
+    def _compress_cold_layers(self) -> None:
+        """
+        Queues the tiles of cold layers for background compression: hidden
+        layers, layers other than the active one left unedited for
+        COLD_LAYER_SECONDS, and undo/redo snapshots. Tiles shared with a warm
+        layer stay as they are; compressed tiles are expanded again on demand
+        when they are shown, edited or exported.
+        """
+        self._update_memory_stats()
+        if self._stroke_begun or self._compressor.busy:
+            return
+        now = time.monotonic()
+        seen: Dict[int, float] = {}
+        warm = set()
+        cold: List[TileBuffer] = []
+        for idx, layer in enumerate(self._layers):
+            generation = layer.buffer.generation
+            seen[generation] = self._layer_seen.get(generation, now)
+            idle = now - seen[generation] >= self.COLD_LAYER_SECONDS
+            if idx == self._active_layer_index or (layer.visible and not idle):
+                warm.update(id(tile) for tile in layer.buffer.stored_tiles())
+            else:
+                cold.append(layer.buffer)
+        self._layer_seen = seen
+        for state in self._undo_stack + self._redo_stack:
+            cold.extend(layer.buffer for layer in state.layers)
+        tiles = {id(tile): tile for buffer in cold for tile in buffer.stored_tiles() if id(tile) not in warm}
+        self._compressor.request(tiles.values())
+
+    def _note_input(self, t: float) -> None:
+        """Starts timing input-to-paint latency from the event at ``t`` unless an earlier one is still waiting."""
+        # These tools leave the screen alone while the pointer moves, which would read as a stall
+        if self._tool_mode in (ToolMode.FILL, ToolMode.LINEAR_GRADIENT, ToolMode.RADIAL_GRADIENT, ToolMode.PICKER, ToolMode.SELECT_VALUE):
+            return
+        if self._input_pending is None:
+            sent = self._pointer_clock.to_monotonic(t)
+            self._input_pending = self._monotonic_ms() if sent is None else sent
+
+    def _update_latency_stats(self) -> None:
+        if self._latency.count == self._latency_count:
+            return
+        self._latency_count = self._latency.count
+        self._latency_summary = self._latency.summary()
+        self.inputLatencyChanged.emit()
+
+    def _update_memory_stats(self) -> None:
+        stats = (tile_pager().resident_bytes(), tile_pager().compressed_bytes())
+        if stats != self._memory_stats:
+            self._memory_stats = stats
+            self.memoryStatsChanged.emit()
+
+    def _layer_sources(self, indices: Optional[Sequence[int]] = None) -> List[LayerSource]:
+        """
+        Export compositor inputs, bottom to top: the visible layers, or the
+        layers at ``indices`` whatever their visibility.
+        """
+        if indices is None:
+            layers = [layer for layer in self._layers if layer.visible]
+        else:
+            layers = [self._layers[idx] for idx in sorted(set(indices)) if 0 <= idx < len(self._layers)]
+        return [(layer.buffer.clone(), _clamp(layer.opacity, 0.0, 1.0), layer.blend_mode.value) for layer in layers]
+
+    def _sync_layer_model(self) -> None:
+        self._layer_model.sync(self._layers, self._active_layer_index)
 
     def _mark_layers_changed(self) -> None:
         self._mark_composite_dirty()
@@ -1235,25 +2329,89 @@ class PainterBackend(QQuickPaintedItem):
         return img
 
     def _serialize_project(self) -> dict:
+        return dict(
+            self._project_settings(),
+            layers=[dict(self._layer_settings(layer), **self._serialize_pixels(layer.buffer)) for layer in self._layers],
+        )
+
+    def _project_settings(self) -> dict:
         return {
-            "version": 1,
+            "version": 2,
             "width": self._canvas_width,
             "height": self._canvas_height,
             "activeLayer": self._active_layer_index,
             "brushSize": self._brush_size,
             "grayValue": self._gray_value,
             "toolMode": self._tool_mode.value,
-            "layers": [
-                {
-                    "name": layer.name,
-                    "opacity": layer.opacity,
-                    "visible": layer.visible,
-                    "blendMode": layer.blend_mode.value,
-                    "image": self._image_to_base64(layer.image),
-                }
-                for layer in self._layers
-            ],
         }
 
+    def _layer_settings(self, layer: Layer) -> dict:
+        return {
+            "name": layer.name,
+            "opacity": layer.opacity,
+            "visible": layer.visible,
+            "blendMode": layer.blend_mode.value,
+        }
+
+    def _serialize_pixels(self, buffer: TileBuffer) -> dict:
+        # Only the content is stored, placed at "offset"; files without an
+        # offset hold the whole canvas
+        canvas = (0, 0, self._canvas_width, self._canvas_height)
+        bounds = buffer.bounds()
+        rect = intersect_rects(bounds, canvas) if bounds is not None else None
+        if rect is None:
+            rect = (0, 0, 1, 1)
+        return {"image": self._image_to_base64(buffer.image(rect)), "offset": [rect[0], rect[1]]}
+
+    def _checkpoint_snapshot(self) -> CheckpointSnapshot:
+        """
+        The current document for a checkpoint: settings, a copy-on-write clone
+        of each layer and the selection mask, plus the session fields beyond
+        the project file (open transaction, modified flag).
+        """
+        state = dict(
+            self._project_settings(),
+            layers=[self._layer_settings(layer) for layer in self._layers],
+            transaction=[self._transaction_depth, self._transaction_pushed],
+            modified=self._dirty,
+        )
+        bounds = self._selection.bounds
+        selection = None if bounds is None else (bounds, self._selection.mask_for(bounds))
+        return CheckpointSnapshot(state, [layer.buffer.clone() for layer in self._layers], selection)
+
+    def _write_checkpoint(self, replayable: bool = True) -> None:
+        """
+        Makes the current document the journal's new base; the file is written
+        in the background. ``replayable=False`` when the operation just
+        journaled cannot be replayed from the previous checkpoint.
+        """
+        if self._journal is None:
+            return
+        self._journal.checkpoint(self._checkpoint_snapshot(), replayable)
+        self._journal_undo_depth = 0
+        self._journal_redo_depth = 0
+
+    def _recover_session(self, state: dict, ops: Sequence[Operation]) -> None:
+        """Rebuilds a crashed session: checkpoint state, then the journaled operations."""
+        self._load_checkpoint(state)
+        try:
+            self._replay_operations(ops)
+        except Exception as exc:
+            print(f"Session recovery stopped early: {exc}")
+
+    def _load_checkpoint(self, state: dict) -> None:
+        self._load_project_data(state)
+        selection = state.get("selection")
+        if isinstance(selection, dict):
+            x, y, w, h = (int(v) for v in selection["rect"])
+            mask = np.frombuffer(zlib.decompress(base64.b64decode(selection["mask"])), dtype=np.uint8).reshape(h, w)
+            self._set_selection(Selection.from_mask(self._canvas_width, self._canvas_height, mask, (x, y)))
+        depth, pushed = state.get("transaction", [0, False])
+        self._transaction_depth = int(depth)
+        self._transaction_pushed = bool(pushed)
+        self._journal_undo_depth = 0
+        self._journal_redo_depth = 0
+        self._set_dirty(bool(state.get("modified", True)))
+
     def _monotonic_ms(self) -> float:
-        return time.monotonic() * 1000.0
+        return monotonic_ms()
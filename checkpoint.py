@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from raster import Rect, intersect_rects
+from tiles import TILE_SIZE, TileBuffer
+
+# zlib level of tiles that are not already compressed in memory.
+CHECKPOINT_COMPRESS_LEVEL = 1
+
+_MAGIC = b"MSPC"
+_VERSION = 1
+# magic, version
+_HEADER = struct.Struct("<4sH")
+# offset and length of the JSON index, magic again (missing from a torn file)
+_TRAILER = struct.Struct("<QI4s")
+
+
+@dataclass
+class CheckpointSnapshot:
+    """
+    The document as of a checkpoint request, cheap to take on the GUI thread:
+    ``state`` holds the project and session fields without pixels (its
+    "layers" entries carry name, opacity, visibility and blend mode),
+    ``buffers`` one copy-on-write clone per layer, and ``selection`` the
+    selection's bounds and mask, if any.
+    """
+
+    state: dict
+    buffers: List[TileBuffer] = field(default_factory=list)
+    selection: Optional[Tuple[Rect, np.ndarray]] = None
+
+
+def write_checkpoint(path: str, snapshot: CheckpointSnapshot, journal_id: int) -> None:
+    """
+    Writes and fsyncs ``snapshot`` to ``path``: the zlib streams of the layers'
+    tiles one after the other, then a JSON index of the state and tile
+    placements. Runs off the GUI thread; the snapshot is not shared with it.
+    """
+    state = snapshot.state
+    canvas = (0, 0, int(state["width"]), int(state["height"]))
+    layers = []
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION))
+        offset = _HEADER.size
+        for entry, buffer in zip(state["layers"], snapshot.buffers):
+            tiles = []
+            for x, y, visible, blob in buffer.tile_blobs(canvas, CHECKPOINT_COMPRESS_LEVEL):
+                visible = intersect_rects(visible, canvas)
+                if visible is None:
+                    continue
+                f.write(blob)
+                tiles.append([x, y, *visible, offset, len(blob)])
+                offset += len(blob)
+            layers.append(dict(entry, tiles=tiles))
+        index = dict(state, layers=layers, journalId=journal_id, selection=None)
+        if snapshot.selection is not None:
+            rect, mask = snapshot.selection
+            index["selection"] = {
+                "rect": list(rect),
+                "mask": base64.b64encode(zlib.compress(mask.tobytes(), CHECKPOINT_COMPRESS_LEVEL)).decode("ascii"),
+            }
+        data = json.dumps(index).encode("utf-8")
+        f.write(data)
+        f.write(_TRAILER.pack(offset, len(data), _MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    """
+    The state stored at ``path``, each layer entry's pixels rebuilt as a
+    TileBuffer under "buffer"; None if the file is missing or torn. Older
+    checkpoints, saved as project JSON, are returned as they are.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if data[:len(_MAGIC)] != _MAGIC:
+        try:
+            state = json.loads(data.decode("utf-8"))
+        except ValueError:
+            return None
+        return state if isinstance(state, dict) else None
+    try:
+        magic, version = _HEADER.unpack_from(data)
+        start, length, end_magic = _TRAILER.unpack_from(data, len(data) - _TRAILER.size)
+        if version != _VERSION or end_magic != _MAGIC:
+            return None
+        state = json.loads(data[start:start + length].decode("utf-8"))
+        for entry in state["layers"]:
+            buffer = TileBuffer()
+            for x, y, vx, vy, vw, vh, offset, size in entry.pop("tiles"):
+                pixels = np.frombuffer(zlib.decompress(data[offset:offset + size]), dtype=np.uint8)
+                pixels = pixels.reshape(TILE_SIZE, TILE_SIZE, 4)
+                buffer.write((vx, vy, vw, vh), pixels[vy - y:vy - y + vh, vx - x:vx - x + vw])
+            entry["buffer"] = buffer
+    except (ValueError, KeyError, TypeError, struct.error, zlib.error):
+        return None
+    return state
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import functools
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from filters import SmoothFilter, gray_planes, pixels_from_planes, smooth_pixels
+from raster import Rect, intersect_rects
+from selection import Selection
+from tiles import TileBuffer
+
+# Distance between dabs along a stroke, as a fraction of the brush diameter.
+DAB_SPACING = 0.25
+# Largest Gaussian radius of a blur dab; repeated dabs blur further.
+BLUR_DAB_MAX_RADIUS = 8
+
+
+@functools.lru_cache(maxsize=32)
+def dab_footprint(diameter: int) -> np.ndarray:
+    """(d, d) float32 weights of a soft round dab, 1 at the center easing to 0 at the rim. Read-only."""
+    radius = diameter * 0.5
+    offsets = np.arange(diameter, dtype=np.float32) + np.float32(0.5 - radius)
+    t = np.clip(1.0 - np.hypot(offsets[:, None], offsets[None, :]) / np.float32(radius), 0.0, 1.0)
+    weights = t * t * (3.0 - 2.0 * t)
+    weights.setflags(write=False)
+    return weights
+
+
+def blur_dab_radius(diameter: int) -> int:
+    return max(1, min(BLUR_DAB_MAX_RADIUS, diameter // 8))
+
+
+def dab_rect(x: float, y: float, diameter: int) -> Rect:
+    """Pixel box of a dab of ``diameter`` centered on (x, y)."""
+    return int(math.floor(x - diameter * 0.5 + 0.5)), int(math.floor(y - diameter * 0.5 + 0.5)), diameter, diameter
+
+
+class DabStroke:
+    """
+    One blur or smudge stroke: places dabs every DAB_SPACING diameters along
+    the pointer path and applies each to its footprint alone, so the cost of
+    an event is a few brush areas whatever the canvas size. A smudge stroke
+    carries the pixels it picked up from dab to dab.
+    """
+
+    def __init__(self, diameter: int, strength: float, smudge: bool) -> None:
+        self.diameter = max(1, int(diameter))
+        self.strength = float(strength)
+        self.smudge = smudge
+        self._spacing = max(1.0, self.diameter * DAB_SPACING)
+        # Path length since the last dab; None before the first one
+        self._travel: Optional[float] = None
+        self._pickup: Optional[np.ndarray] = None
+
+    def positions(self, x0: float, y0: float, x1: float, y1: float) -> List[Tuple[float, float]]:
+        """Dab centers along (x0, y0) -> (x1, y1), continuing the spacing of earlier segments."""
+        if self._travel is None:
+            self._travel = 0.0
+            return [(x1, y1)]
+        length = math.hypot(x1 - x0, y1 - y0)
+        out = []
+        distance = self._spacing - self._travel
+        while distance <= length:
+            t = distance / length
+            out.append((x0 + (x1 - x0) * t, y0 + (y1 - y0) * t))
+            distance += self._spacing
+        self._travel = length - (distance - self._spacing)
+        return out
+
+    def dab(self, buffer: TileBuffer, canvas: Rect, x: float, y: float, selection: Optional[Selection] = None) -> Optional[Tuple[Rect, np.ndarray]]:
+        """(rect, pixels) of one dab at (x, y) applied to ``buffer``, clipped to ``canvas``; None if nothing is touched."""
+        rect = dab_rect(x, y, self.diameter)
+        target = intersect_rects(rect, canvas)
+        if selection is not None and not selection.is_empty and target is not None:
+            target = selection.clip(target)
+        if target is None:
+            return None
+        tx, ty, tw, th = target
+        inner = (slice(ty - rect[1], ty - rect[1] + th), slice(tx - rect[0], tx - rect[0] + tw))
+        weights = dab_footprint(self.diameter)[inner]
+        if selection is not None and not selection.is_empty:
+            weights = weights * (selection.mask_for(target) * np.float32(1.0 / 255.0))
+        under = gray_planes(buffer.read(target))
+
+        if self.smudge:
+            if self._pickup is None:
+                self._pickup = gray_planes(buffer.read(rect))
+            pickup = self._pickup[:, inner[0], inner[1]]
+            # Picks up some of what is underneath, then lays the mix down
+            pickup += (under - pickup) * np.float32(1.0 - self.strength)
+            out = under + (pickup - under) * weights
+        else:
+            radius = blur_dab_radius(self.diameter)
+            halo = intersect_rects((tx - radius, ty - radius, tw + 2 * radius, th + 2 * radius), canvas)
+            hx, hy = halo[0], halo[1]
+            blurred = gray_planes(smooth_pixels(buffer.read(halo), SmoothFilter.GAUSSIAN, radius))
+            blurred = blurred[:, ty - hy:ty - hy + th, tx - hx:tx - hx + tw]
+            out = under + (blurred - under) * (weights * np.float32(self.strength))
+        return target, pixels_from_planes(out)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import math
+from enum import Enum
+from typing import Optional
+
+import numpy as np
+
+from raster import RGB_CHANNELS, WORKER_COUNT, Rect, worker_pool, write_gray
+from tiles import TILE_SIZE, TileBuffer
+
+# Column distance of columns without any feature pixel; its square exceeds
+# every real squared distance on canvases up to 32K, so it never wins.
+_NO_FEATURE = np.iinfo(np.uint16).max
+# Pixels per envelope band: large enough to amortize the per-column loop,
+# small enough to bound the band's stack arrays.
+DISTANCE_BAND_PIXELS = 1 << 22
+
+
+class DistanceMode(str, Enum):
+    OUTSIDE = "outside"
+    INSIDE = "inside"
+    SIGNED = "signed"
+
+
+def mask_from_buffer(buffer: TileBuffer, width: int, height: int, threshold: int = 128) -> np.ndarray:
+    """(height, width) bool mask of pixels whose flattened gray level (over black) is at least ``threshold``."""
+    mask = np.zeros((height, width), dtype=bool)
+    for x, y, pixels, visible in buffer.tiles_in((0, 0, width, height)):
+        vx, vy, vw, vh = visible
+        x0, y0 = max(vx, 0), max(vy, 0)
+        x1, y1 = min(vx + vw, width), min(vy + vh, height)
+        if x1 <= x0 or y1 <= y0:
+            continue
+        mask[y0:y1, x0:x1] = pixels[y0 - y:y1 - y, x0 - x:x1 - x, RGB_CHANNELS[0]] >= threshold
+    return mask
+
+
+def _column_distances(feature: np.ndarray, out: np.ndarray) -> None:
+    """
+    Distance along each row of ``feature`` (canvas columns, transposed) to
+    its nearest feature pixel, via two running extrema.
+    """
+    length = feature.shape[1]
+    index = np.arange(length, dtype=np.int32)
+    last = np.where(feature, index, np.int32(-(1 << 30)))
+    np.maximum.accumulate(last, axis=1, out=last)
+    following = np.where(feature[:, ::-1], index[::-1], np.int32(1 << 30))
+    np.minimum.accumulate(following, axis=1, out=following)
+    np.minimum(np.minimum(index - last, following[:, ::-1] - index), _NO_FEATURE, out=out, casting="unsafe")
+
+
+def _row_envelope(columns: np.ndarray) -> np.ndarray:
+    """
+    Squared distances of a band of rows from their (width, rows) column
+    distances: the
+    lower envelope of the parabolas (x - q)^2 + g(q)^2 per row
+    (Felzenszwalb & Huttenlocher), built left to right for all rows of the
+    band at once, so the Python loop runs per column rather than per pixel.
+    """
+    width, rows = columns.shape
+    # Flattened for gathers: column q of the band is g2[q * rows:(q + 1) * rows]
+    g2 = np.square(columns, dtype=np.float64).ravel()
+    h = g2 + np.repeat(np.square(np.arange(width, dtype=np.float64)), rows)
+    lane = np.arange(rows)
+    # Per row: stacks of envelope vertices and of where each one starts to win
+    v = np.zeros(width * rows, dtype=np.int32)
+    z = np.empty(width * rows, dtype=np.float64)
+    z[:rows] = -np.inf
+    # Flat stack index of every row's rightmost parabola, and that parabola
+    top = lane.copy()
+    top_v = np.zeros(rows, dtype=np.int32)
+    top_h = h[:rows]
+    top_z = z[:rows].copy()
+    for q in range(1, width):
+        hq = h[q * rows:(q + 1) * rows]
+        s = (hq - top_h) / (2.0 * (q - top_v))
+        # Pop hidden parabolas, revisiting only the rows that popped one
+        active = np.flatnonzero(s <= top_z)
+        while active.size:
+            top[active] -= rows
+            below = top[active]
+            vk = v[below]
+            s[active] = (hq[active] - h[vk * rows + active]) / (2.0 * (q - vk))
+            active = active[s[active] <= z[below]]
+        top += rows
+        v[top] = q
+        z[top] = s
+        top_v[:] = q
+        top_h = hq
+        top_z = s
+
+    # Parabola k wins from ceil(z[k]); vertices grow with k, so spreading
+    # each one from its first pixel with a running maximum finds them all.
+    # Later parabolas win ties, as the earlier one then covers no pixel.
+    depth = (top - lane) // rows
+    used = (np.arange(width)[:, None] <= depth).ravel()
+    starts = np.ceil(np.clip(z[used], 0, width)).astype(np.int64)
+    lanes = np.broadcast_to(lane, (width, rows)).ravel()[used]
+    inside = starts < width
+    nearest = np.zeros((rows, width), dtype=np.int32)
+    np.maximum.at(nearest.ravel(), lanes[inside] * width + starts[inside], v[used][inside])
+    np.maximum.accumulate(nearest, axis=1, out=nearest)
+    out = np.square(np.arange(width, dtype=np.float64) - nearest)
+    out += g2[nearest.astype(np.int64) * rows + lane[:, None]]
+    return out
+
+
+def distances(feature: np.ndarray) -> np.ndarray:
+    """
+    Exact Euclidean distance from every pixel to the nearest True pixel of
+    ``feature`` (0 on features, inf if there is none), as float32. Separable
+    and linear time: columns first, then rows in bands on the worker pool.
+    """
+    height, width = feature.shape
+    # Canvas columns as contiguous rows, so both passes scan memory in order
+    transposed = np.ascontiguousarray(feature.T)
+    columns = np.empty((width, height), dtype=np.uint16)
+
+    def column_strip(x0: int) -> None:
+        _column_distances(transposed[x0:x0 + TILE_SIZE], columns[x0:x0 + TILE_SIZE])
+
+    list(worker_pool().map(column_strip, range(0, width, TILE_SIZE)))
+    out = np.empty((height, width), dtype=np.float32)
+    # Smaller bands on small canvases, so every worker gets one
+    band_rows = max(1, min(DISTANCE_BAND_PIXELS // width, -(-height // WORKER_COUNT)))
+
+    def row_band(y0: int) -> None:
+        band = columns[:, y0:y0 + band_rows]
+        y1 = y0 + band.shape[1]
+        if not band.any():
+            out[y0:y1] = 0.0
+        elif (band == _NO_FEATURE).all():
+            # No feature anywhere: every distance is unbounded
+            out[y0:y1] = np.inf
+        else:
+            out[y0:y1] = np.sqrt(_row_envelope(np.ascontiguousarray(band)))
+
+    list(worker_pool().map(row_band, range(0, height, band_rows)))
+    return out
+
+
+def _content_region(mask: np.ndarray, margin: int) -> Optional[Rect]:
+    """Bounds of the True pixels of ``mask`` grown by ``margin`` and clipped to it; None if there are none."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not rows.size:
+        return None
+    cols = np.flatnonzero(mask[rows[0]:rows[-1] + 1].any(axis=0))
+    height, width = mask.shape
+    x0, y0 = max(int(cols[0]) - margin, 0), max(int(rows[0]) - margin, 0)
+    x1, y1 = min(int(cols[-1]) + 1 + margin, width), min(int(rows[-1]) + 1 + margin, height)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _remap(mode: DistanceMode, radius: float, smooth: bool, mask: np.ndarray, outside: Optional[np.ndarray], inside: Optional[np.ndarray]) -> np.ndarray:
+    if mode == DistanceMode.OUTSIDE:
+        t = 1.0 - np.minimum(outside / radius, 1.0)
+    elif mode == DistanceMode.INSIDE:
+        t = np.minimum(inside / radius, 1.0)
+    else:
+        # Half a pixel on either side puts the edge between the two pixels
+        signed = np.where(mask, inside - 0.5, 0.5 - outside)
+        t = np.clip(0.5 + signed / (2.0 * radius), 0.0, 1.0)
+    if smooth:
+        t = t * t * (3.0 - 2.0 * t)
+    return np.floor(t * 255.0 + 0.5)
+
+
+def distance_field(mask: np.ndarray, mode: DistanceMode, radius: float, smooth: bool = False) -> np.ndarray:
+    """
+    Gray levels (uint8) of the distance field of ``mask``, remapped over
+    ``radius`` pixels: OUTSIDE falls off from 255 at the mask edge to 0,
+    INSIDE rises from 0 at the edge to 255, SIGNED maps the signed distance
+    to the edge (measured between pixel centers) to 128 +- 127, inside high.
+    ``smooth`` eases the ramp with a smoothstep.
+
+    Every mode saturates more than ``radius`` pixels outside the mask, so
+    the transform only runs on the mask's bounds grown by that much; the
+    rest of the canvas gets the saturated level.
+    """
+    height, width = mask.shape
+    radius = max(float(radius), 1e-3)
+    # Level of a pixel far outside the mask
+    far = _remap(mode, radius, smooth, np.zeros(1, dtype=bool), np.full(1, np.inf, dtype=np.float32), np.zeros(1, dtype=np.float32))
+    out = np.full((height, width), far[0], dtype=np.uint8)
+    region = _content_region(mask, int(math.ceil(radius)) + 1)
+    if region is None:
+        return out
+    rx, ry, rw, rh = region
+    mask = mask[ry:ry + rh, rx:rx + rw]
+    outside = distances(mask) if mode != DistanceMode.INSIDE else None
+    inside = distances(~mask) if mode != DistanceMode.OUTSIDE else None
+    target = out[ry:ry + rh, rx:rx + rw]
+
+    def remap(y0: int) -> None:
+        rows = slice(y0, y0 + TILE_SIZE)
+        target[rows] = _remap(
+            mode,
+            radius,
+            smooth,
+            mask[rows],
+            None if outside is None else outside[rows],
+            None if inside is None else inside[rows],
+        )
+
+    list(worker_pool().map(remap, range(0, rh, TILE_SIZE)))
+    return out
+
+
+def gray_buffer(values: np.ndarray) -> TileBuffer:
+    """Opaque layer buffer of (h, w) uint8 gray levels."""
+    height, width = values.shape
+    buffer = TileBuffer()
+    for y0 in range(0, height, TILE_SIZE):
+        band = values[y0:y0 + TILE_SIZE]
+        pixels = np.empty(band.shape + (4,), dtype=np.uint8)
+        write_gray(pixels, band)
+        buffer.write((0, y0, width, band.shape[0]), pixels)
+    return buffer
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import os
+import struct
+import zlib
+from enum import Enum
+from typing import BinaryIO, Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from raster import ALPHA_CHANNEL, RGB_CHANNELS, Rect, intersect_rects, ordered_map
+from tiles import TILE_SIZE, TileBuffer
+
+# Rows composited and encoded per step; tile-aligned so each band reads whole tile rows.
+EXPORT_BAND_ROWS = TILE_SIZE
+PNG_COMPRESS_LEVEL = 6
+
+# (buffer, opacity, blend mode value) of one visible layer, bottom to top
+LayerSource = Tuple[TileBuffer, float, str]
+
+
+class HeightmapFormat(str, Enum):
+    PNG16 = "png16"
+    R16 = "r16"
+    NPY = "npy"
+
+
+def heightmap_format(path: str) -> Optional[HeightmapFormat]:
+    """Format implied by the file extension: .png, .r16/.raw (16-bit little-endian) or .npy."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png":
+        return HeightmapFormat.PNG16
+    if ext in (".r16", ".raw"):
+        return HeightmapFormat.R16
+    if ext == ".npy":
+        return HeightmapFormat.NPY
+    return None
+
+
+# --- Compositing ---
+
+
+def composite_values(sources: Sequence[LayerSource], rect: Rect) -> np.ndarray:
+    """
+    Flattened gray level of ``rect`` as (h, w) float32 in [0, 1], composited
+    in floating point so opacity blends keep their fractional values. The
+    result is the premultiplied red channel, i.e. the stack flattened onto
+    black; blend modes follow Qt's composition formulas.
+    """
+    x, y, w, h = rect
+    color = np.zeros((h, w), dtype=np.float32)
+    alpha = np.zeros((h, w), dtype=np.float32)
+    for buffer, opacity, mode in sources:
+        bounds = buffer.bounds()
+        if opacity <= 0.0 or bounds is None or intersect_rects(bounds, rect) is None:
+            continue
+        scale = np.float32(1.0 / 255.0)
+        opacity = np.float32(opacity)
+        # Missing tiles are transparent, which leaves the destination
+        # unchanged in every blend mode, so only stored tiles are blended.
+        for tx, ty, pixels, visible in buffer.tiles_in(rect):
+            part = intersect_rects(rect, visible)
+            if part is None:
+                continue
+            px, py, pw, ph = part
+            src = pixels[py - ty:py - ty + ph, px - tx:px - tx + pw]
+            dst = (slice(py - y, py - y + ph), slice(px - x, px - x + pw))
+            _blend(color[dst], alpha[dst], src[..., RGB_CHANNELS[0]] * scale, src[..., ALPHA_CHANNEL] * scale, opacity, mode)
+    return color
+
+
+def _blend(dc: np.ndarray, da: np.ndarray, sc: np.ndarray, sa: np.ndarray, opacity: np.float32, mode: str) -> None:
+    """Composites premultiplied (sc, sa) at ``opacity`` onto (dc, da) in place."""
+    if mode == "add":
+        # Qt fades the clamped sum rather than the source for Plus
+        dc += opacity * (np.minimum(dc + sc, 1.0) - dc)
+        da += opacity * (np.minimum(da + sa, 1.0) - da)
+        return
+    sc = sc * opacity
+    sa = sa * opacity
+    if mode == "multiply":
+        dc[...] = sc * dc + sc * (1.0 - da) + dc * (1.0 - sa)
+        da[...] = sa + da - sa * da
+    elif mode == "xor":
+        dc[...] = sc * (1.0 - da) + dc * (1.0 - sa)
+        da[...] = sa * (1.0 - da) + da * (1.0 - sa)
+    else:
+        dc[...] = sc + dc * (1.0 - sa)
+        da[...] = sa + da * (1.0 - sa)
+
+
+def stream_bands(height: int, render: Callable[[int, int], np.ndarray], write: Callable[[np.ndarray], None]) -> None:
+    """
+    Calls ``render(y0, y1)`` for consecutive row bands on the worker pool and
+    passes the results to ``write`` in order on this thread. At most a pool's
+    worth of bands is in flight, so memory stays a few bands whatever the
+    image size.
+    """
+    bands = [(y, min(height, y + EXPORT_BAND_ROWS)) for y in range(0, height, EXPORT_BAND_ROWS)]
+    for band in ordered_map(lambda rows: render(*rows), bands):
+        write(band)
+
+
+def quantize16(values: np.ndarray) -> np.ndarray:
+    return np.floor(np.clip(values, 0.0, 1.0) * 65535.0 + 0.5).astype(np.uint16)
+
+
+def quantize8(values: np.ndarray) -> np.ndarray:
+    return np.floor(np.clip(values, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+
+# --- Writers ---
+
+
+class PngStreamWriter:
+    """
+    Writes a PNG row band by row band: every band is filtered (PNG "Up"
+    filter) and pushed through one deflate stream into IDAT chunks, so only
+    the current band is ever held in memory.
+    """
+
+    _COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+    def __init__(self, path: str, width: int, height: int, channels: int = 1, bit_depth: int = 16) -> None:
+        self._file: BinaryIO = open(path, "wb")
+        self._dtype = np.dtype(">u2") if bit_depth == 16 else np.dtype(np.uint8)
+        self._row_bytes = width * channels * self._dtype.itemsize
+        self._previous = np.zeros(self._row_bytes, dtype=np.uint8)
+        self._deflate = zlib.compressobj(PNG_COMPRESS_LEVEL)
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, self._COLOR_TYPES[channels], 0, 0, 0))
+
+    def write(self, band: np.ndarray) -> None:
+        """Appends (h, w) or (h, w, channels) samples (uint16 for 16-bit, uint8 for 8-bit)."""
+        rows = np.ascontiguousarray(band, dtype=self._dtype).view(np.uint8).reshape(-1, self._row_bytes)
+        filtered = np.empty((rows.shape[0], self._row_bytes + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(rows[0], self._previous, out=filtered[0, 1:])
+        np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+        self._previous = rows[-1].copy()
+        data = self._deflate.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self) -> None:
+        self._chunk(b"IDAT", self._deflate.flush())
+        self._chunk(b"IEND", b"")
+        self._file.close()
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+
+class RawStreamWriter:
+    """Headerless little-endian 16-bit samples, row after row (.r16 / .raw heightmaps)."""
+
+    def __init__(self, path: str) -> None:
+        self._file: BinaryIO = open(path, "wb")
+
+    def write(self, band: np.ndarray) -> None:
+        self._file.write(np.ascontiguousarray(band, dtype="<u2").tobytes())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class NpyStreamWriter:
+    """float32 ``.npy`` written through a memory map, one band at a time."""
+
+    def __init__(self, path: str, width: int, height: int, channels: int = 1) -> None:
+        shape = (height, width) if channels == 1 else (height, width, channels)
+        self._array = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+        self._row = 0
+
+    def write(self, band: np.ndarray) -> None:
+        self._array[self._row:self._row + band.shape[0]] = band
+        self._row += band.shape[0]
+        # Hand finished pages to the OS so they need not stay resident
+        self._array.flush()
+
+    def close(self) -> None:
+        self._array.flush()
+        del self._array
+
+
+def export_heightmap(sources: Sequence[LayerSource], width: int, height: int, path: str, fmt: HeightmapFormat) -> None:
+    """Streams the flattened gray levels of a ``width`` x ``height`` canvas to ``path``."""
+    if fmt == HeightmapFormat.NPY:
+        writer = NpyStreamWriter(path, width, height)
+    elif fmt == HeightmapFormat.R16:
+        writer = RawStreamWriter(path)
+    else:
+        writer = PngStreamWriter(path, width, height, channels=1, bit_depth=16)
+
+    def render(y0: int, y1: int) -> np.ndarray:
+        values = composite_values(sources, (0, y0, width, y1 - y0))
+        return values if fmt == HeightmapFormat.NPY else quantize16(values)
+
+    try:
+        stream_bands(height, render, writer.write)
+    finally:
+        writer.close()
+
+
+def export_channel_pack(
+    channels: Sequence[Sequence[LayerSource]],
+    width: int,
+    height: int,
+    path: str,
+    bit_depth: int = 8,
+) -> None:
+    """
+    Writes one output channel per entry of ``channels`` (1 = gray, 2 = gray +
+    alpha, 3 = RGB, 4 = RGBA), each the flattened gray level of its own layer
+    group, in a single banded pass: every band composites all channels
+    before it is encoded. ``.npy`` paths get float32 (h, w, c) arrays, other
+    paths an 8- or 16-bit PNG.
+    """
+    count = len(channels)
+    if not 1 <= count <= 4:
+        raise ValueError("channel packing needs 1 to 4 channels")
+    npy = os.path.splitext(path)[1].lower() == ".npy"
+    if npy:
+        writer = NpyStreamWriter(path, width, height, channels=count)
+    else:
+        writer = PngStreamWriter(path, width, height, channels=count, bit_depth=bit_depth)
+
+    def render(y0: int, y1: int) -> np.ndarray:
+        rect = (0, y0, width, y1 - y0)
+        values = np.stack([composite_values(group, rect) for group in channels], axis=-1)
+        if count == 1:
+            values = values[..., 0]
+        if npy:
+            return values
+        return quantize16(values) if bit_depth == 16 else quantize8(values)
+
+    try:
+        stream_bands(height, render, writer.write)
+    finally:
+        writer.close()
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import functools
+from enum import Enum
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from raster import ALPHA_CHANNEL, RGB_CHANNELS, Rect, gray_pixels, intersect_rects, iter_tiles, ordered_map
+from selection import blend_masked
+from tiles import TileBuffer
+
+SMOOTH_MAX_RADIUS = 128
+# Longest side of the low-resolution filter preview, in pixels.
+FILTER_PREVIEW_SIZE = 384
+
+
+class SmoothFilter(str, Enum):
+    GAUSSIAN = "gaussian"
+    BOX = "box"
+    BILATERAL = "bilateral"
+
+
+@functools.lru_cache(maxsize=64)
+def gaussian_kernel(radius: int) -> np.ndarray:
+    """Normalized float32 taps over [-radius, radius], with sigma = radius / 3. Cached and read-only."""
+    sigma = max(radius / 3.0, 1e-3)
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * np.square(x / sigma))
+    kernel = (kernel / kernel.sum()).astype(np.float32)
+    kernel.setflags(write=False)
+    return kernel
+
+
+def _taps(src: np.ndarray, axis: int, start: int, length: int) -> np.ndarray:
+    """``length`` samples of ``src`` from ``start`` along ``axis``."""
+    index = [slice(None)] * src.ndim
+    index[axis] = slice(start, start + length)
+    return src[tuple(index)]
+
+
+def _box_pass(src: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """
+    Sums of 2 * radius + 1 samples along ``axis`` via a running sum, whatever
+    the radius. Integer samples keep the sums exact (int32 holds two passes
+    of uint8 values at SMOOTH_MAX_RADIUS).
+    """
+    size = 2 * radius + 1
+    length = src.shape[axis] - 2 * radius
+    shape = list(src.shape)
+    shape[axis] += 1
+    sums = np.zeros(shape, dtype=np.int32)
+    np.cumsum(src, axis=axis, dtype=np.int32, out=_taps(sums, axis, 1, src.shape[axis]))
+    return _taps(sums, axis, size, length) - _taps(sums, axis, 0, length)
+
+
+def _convolve_pass(src: np.ndarray, kernel: np.ndarray, axis: int) -> np.ndarray:
+    """Applies the symmetric ``kernel`` along ``axis`` (valid part only), a pair of taps at a time."""
+    radius = kernel.shape[0] // 2
+    length = src.shape[axis] - 2 * radius
+    out = _taps(src, axis, radius, length) * kernel[radius]
+    pair = np.empty_like(out)
+    for k in range(radius):
+        np.add(_taps(src, axis, k, length), _taps(src, axis, 2 * radius - k, length), out=pair)
+        pair *= kernel[k]
+        out += pair
+    return out
+
+
+def _bilateral_pass(src: np.ndarray, kernel: np.ndarray, edge: float, axis: int) -> np.ndarray:
+    """
+    Gaussian pass along ``axis`` whose taps are also weighted by how close
+    their gray level (plane 0) is to the center's, so steps in height
+    survive while gentle slopes are smoothed.
+    """
+    radius = kernel.shape[0] // 2
+    length = src.shape[axis] - 2 * radius
+    center = _taps(src, axis, radius, length)
+    scale = np.float32(-0.5 / (edge * edge))
+    # The center tap always weighs in, so the total is never zero
+    out = center * kernel[radius]
+    total = np.full(center.shape[1:], kernel[radius], dtype=np.float32)
+    weight = np.empty_like(total)
+    for k in range(kernel.shape[0]):
+        if k == radius:
+            continue
+        taps = _taps(src, axis, k, length)
+        np.subtract(taps[0], center[0], out=weight)
+        np.square(weight, out=weight)
+        weight *= scale
+        np.exp(weight, out=weight)
+        weight *= kernel[k]
+        out += weight * taps
+        total += weight
+    out /= total
+    return out
+
+
+def _smooth_planes(planes: np.ndarray, kind: SmoothFilter, radius: int, edge: float) -> np.ndarray:
+    """Filters (c, h + 2r, w + 2r) float32 planes into their (c, h, w) center, horizontal pass first."""
+    if kind == SmoothFilter.BOX:
+        sums = _box_pass(_box_pass(planes.astype(np.int32), radius, 2), radius, 1)
+        return sums * np.float32(1.0 / (2 * radius + 1) ** 2)
+    kernel = gaussian_kernel(radius)
+    if kind == SmoothFilter.BILATERAL:
+        return _bilateral_pass(_bilateral_pass(planes, kernel, edge, 2), kernel, edge, 1)
+    return _convolve_pass(_convolve_pass(planes, kernel, 2), kernel, 1)
+
+
+def gray_planes(pixels: np.ndarray) -> np.ndarray:
+    """
+    Premultiplied gray and alpha of BGRA pixels as (2, h, w) float32 planes
+    (gray layers need no other channel), each scanned along contiguous rows.
+    """
+    return np.stack((pixels[..., RGB_CHANNELS[0]], pixels[..., ALPHA_CHANNEL])).astype(np.float32)
+
+
+def pixels_from_planes(planes: np.ndarray) -> np.ndarray:
+    """Rounds filtered (gray, alpha) planes back to BGRA, keeping gray <= alpha."""
+    values = planes + np.float32(0.5)
+    np.clip(values, 0.0, 255.0, out=values)
+    values = values.astype(np.uint8)
+    np.minimum(values[0], values[1], out=values[0])
+    return gray_pixels(values[0], values[1])
+
+
+def smooth_pixels(pixels: np.ndarray, kind: SmoothFilter, radius: int, edge: float = 32.0) -> np.ndarray:
+    """Smoothed copy of (h, w, 4) BGRA ``pixels``, edges extended past the border."""
+    if radius <= 0:
+        return pixels.copy()
+    planes = np.pad(gray_planes(pixels), ((0, 0), (radius, radius), (radius, radius)), mode="edge")
+    return pixels_from_planes(_smooth_planes(planes, kind, radius, edge))
+
+
+def _is_flat(source: TileBuffer, rect: Rect) -> bool:
+    """Whether every pixel of ``rect`` has the same value, from the cached tile contents only."""
+    value = None
+    area = 0
+    for part, uniform in source.content_parts(rect):
+        if uniform is None or (value is not None and uniform != value):
+            return False
+        value = uniform
+        area += part[2] * part[3]
+    return value is not None and area == rect[2] * rect[3]
+
+
+def smooth_tiles(
+    source: TileBuffer,
+    rect: Rect,
+    canvas: Rect,
+    kind: SmoothFilter,
+    radius: int,
+    edge: float = 32.0,
+    coverage: Optional[np.ndarray] = None,
+) -> Iterator[Tuple[Rect, np.ndarray]]:
+    """
+    (tile, pixels) of ``rect`` smoothed, tile by tile on the worker pool.
+    Each tile reads a halo of ``radius`` pixels around it from ``source``
+    (pass a clone when writing the results back into the same layer),
+    extended by edge replication past ``canvas``. Tiles the filter leaves
+    unchanged (transparent or flat surroundings) and tiles outside the
+    selection ``coverage`` of ``rect`` are not yielded; the others are
+    already blended through their coverage.
+    """
+    rx, ry = rect[0], rect[1]
+
+    def job(tile: Rect) -> Tuple[Rect, Optional[np.ndarray]]:
+        x, y, w, h = tile
+        part_coverage = None if coverage is None else coverage[y - ry:y - ry + h, x - rx:x - rx + w]
+        if part_coverage is not None and not part_coverage.any():
+            return tile, None
+        halo = intersect_rects((x - radius, y - radius, w + 2 * radius, h + 2 * radius), canvas)
+        if halo is None or source.bounds() is None or intersect_rects(halo, source.bounds()) is None:
+            return tile, None
+        if _is_flat(source, halo):
+            return tile, None
+        hx, hy, hw, hh = halo
+        pad = ((0, 0), (hy - (y - radius), (y + h + radius) - (hy + hh)), (hx - (x - radius), (x + w + radius) - (hx + hw)))
+        planes = np.pad(gray_planes(source.read(halo)), pad, mode="edge")
+        pixels = pixels_from_planes(_smooth_planes(planes, kind, radius, edge))
+        if part_coverage is not None:
+            blend_masked(pixels, source.read(tile), part_coverage)
+        return tile, pixels
+
+    for tile, pixels in ordered_map(job, iter_tiles(rect)):
+        if pixels is not None:
+            yield tile, pixels
@@ -0,0 +1,418 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from checkpoint import CheckpointSnapshot, read_checkpoint, write_checkpoint
+
+# File names inside the recovery directory.
+CHECKPOINT_NAME = "checkpoint.pms"
+JOURNAL_NAME = "journal.bin"
+# Journal that goes with a checkpoint being put in place (see Journal.checkpoint).
+NEXT_JOURNAL_SUFFIX = ".next"
+# Longest a committed record waits before it is fsynced with its batch.
+JOURNAL_SYNC_MS = 250
+# Pending bytes that force an early write.
+JOURNAL_BATCH_BYTES = 1 << 20
+
+_MAGIC = b"MSPJ"
+_VERSION = 1
+# magic, version, journal id (matches the checkpoint the records apply to)
+_HEADER = struct.Struct("<4sHQ")
+# payload length, crc32 of kind + payload, kind
+_RECORD = struct.Struct("<IIB")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+_KIND_CALL = 1
+_KIND_GESTURE = 2
+# Follows an operation the journal cannot rebuild; see Journal.checkpoint()
+_KIND_BARRIER = 3
+_GESTURE_JSON = struct.Struct("<I")
+
+
+@dataclass
+class CallOp:
+    """A journaled backend slot call, e.g. ``CallOp("setLayerOpacity", (1, 0.5))``."""
+
+    name: str
+    args: Tuple[Any, ...] = ()
+
+
+@dataclass
+class GestureOp:
+    """
+    One press/move.../release input sequence. ``points`` is an (n, 3) float64
+    array of x, y and the event time in ms; ``settings`` holds the tool
+    properties in effect (tool mode, brush size, gray value, ...).
+    """
+
+    settings: Dict[str, Any]
+    points: np.ndarray = field(default_factory=lambda: np.zeros((0, 3), dtype=np.float64))
+
+
+Operation = Union[CallOp, GestureOp]
+
+
+def encode_operation(op: Operation) -> Tuple[int, bytes]:
+    if isinstance(op, CallOp):
+        return _KIND_CALL, json.dumps([op.name, list(op.args)], separators=(",", ":")).encode("utf-8")
+    header = json.dumps(op.settings, separators=(",", ":")).encode("utf-8")
+    points = np.ascontiguousarray(op.points, dtype="<f8")
+    return _KIND_GESTURE, _GESTURE_JSON.pack(len(header)) + header + points.tobytes()
+
+
+def decode_operation(kind: int, payload: bytes) -> Operation:
+    if kind == _KIND_CALL:
+        name, args = json.loads(payload.decode("utf-8"))
+        return CallOp(str(name), tuple(args))
+    if kind == _KIND_GESTURE:
+        (size,) = _GESTURE_JSON.unpack_from(payload)
+        start = _GESTURE_JSON.size
+        settings = json.loads(payload[start:start + size].decode("utf-8"))
+        points = np.frombuffer(payload, dtype="<f8", offset=start + size).reshape(-1, 3).astype(np.float64)
+        return GestureOp(settings, points)
+    raise ValueError(f"unknown journal record kind {kind}")
+
+
+def _record_bytes(op: Operation) -> bytes:
+    kind, payload = encode_operation(op)
+    crc = zlib.crc32(payload, zlib.crc32(bytes((kind,))))
+    return _RECORD.pack(len(payload), crc, kind) + payload
+
+
+_BARRIER_RECORD = _RECORD.pack(0, zlib.crc32(bytes((_KIND_BARRIER,))), _KIND_BARRIER)
+
+
+def read_journal(path: str) -> Tuple[Optional[int], List[Operation], int]:
+    """
+    (journal id, operations, valid length) of a journal file. Reading stops at
+    the first torn or corrupt record, which is what a crash mid-write leaves,
+    and before the operation a barrier record follows.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, [], 0
+    if len(data) < _HEADER.size:
+        return None, [], 0
+    magic, version, journal_id = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        return None, [], 0
+    ops: List[Operation] = []
+    offset = _HEADER.size
+    previous = offset
+    while offset + _RECORD.size <= len(data):
+        length, crc, kind = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload, zlib.crc32(bytes((kind,)))) != crc:
+            break
+        if kind == _KIND_BARRIER:
+            if ops:
+                ops.pop()
+                offset = previous
+            break
+        previous = offset
+        try:
+            ops.append(decode_operation(kind, payload))
+        except (ValueError, KeyError, json.JSONDecodeError, struct.error):
+            break
+        offset = start + length
+    return journal_id, ops, offset
+
+
+def _read_session(directory: str) -> Optional[Tuple[dict, List[Operation], int, bool]]:
+    # (state, operations, valid journal length, whether the operations come
+    # from the next journal, which has not been renamed into place yet)
+    state = read_checkpoint(os.path.join(directory, CHECKPOINT_NAME))
+    if state is None:
+        return None
+    expected = int(state.get("journalId", 0))
+    path = os.path.join(directory, JOURNAL_NAME)
+    journal_id, ops, valid = read_journal(path)
+    if journal_id == expected:
+        return state, ops, valid, False
+    # Crashed between the two renames of a checkpoint: its journal is still
+    # next to the old one
+    journal_id, ops, valid = read_journal(path + NEXT_JOURNAL_SUFFIX)
+    if journal_id == expected:
+        return state, ops, valid, True
+    # Crashed right after writing a checkpoint: it already holds everything
+    return state, [], 0, False
+
+
+def read_session(directory: str) -> Optional[Tuple[dict, List[Operation]]]:
+    """Checkpoint state and journaled operations of a recovery directory, without opening it for writing."""
+    session = _read_session(directory)
+    return None if session is None else session[:2]
+
+
+def _checkpoint_pool() -> ThreadPoolExecutor:
+    # One thread: checkpoints are put in place in the order they were asked for
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="msp-checkpoint")
+    return _executor
+
+
+@dataclass
+class _CheckpointJob:
+    snapshot: CheckpointSnapshot
+    # Records appended since the snapshot was taken: the new journal starts with them
+    carry: bytearray = field(default_factory=bytearray)
+
+
+def _fsync_directory(directory: str) -> None:
+    # Makes renames durable; not supported (nor needed) on Windows
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """
+    Append-only operation log next to a checkpoint in ``directory``. The
+    document is the checkpoint with the journal's operations replayed on top.
+
+    ``append()`` only queues the encoded record; a writer thread writes and
+    fsyncs queued records in batches (group commit), so a record is durable at
+    most ``JOURNAL_SYNC_MS`` after it was appended. ``checkpoint()`` writes a
+    new checkpoint in the background and then starts a journal tagged with its
+    id; until the switch, records keep going to the current journal, so either
+    pair on disk rebuilds the document.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.checkpoint_path = os.path.join(directory, CHECKPOINT_NAME)
+        self.journal_path = os.path.join(directory, JOURNAL_NAME)
+        self._journal_id = 0
+        self._fd: Optional[int] = None
+        self._pending = bytearray()
+        self._first_pending = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        # Serializes file I/O between the writer thread and checkpoint()/close()
+        self._io_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        # Checkpoints asked for and not yet in place, oldest first
+        self._checkpoints: List[_CheckpointJob] = []
+        self._checkpoint_done: Optional[Future] = None
+
+    # --- Recovery ---
+
+    def recover(self) -> Optional[Tuple[dict, List[Operation]]]:
+        """
+        The checkpoint state and the operations recorded after it, or None if
+        the directory holds no session. Keeps appending after the last valid
+        record.
+        """
+        session = _read_session(self.directory)
+        if session is None:
+            return None
+        state, ops, valid, pending_rename = session
+        if pending_rename:
+            os.replace(self.journal_path + NEXT_JOURNAL_SUFFIX, self.journal_path)
+            _fsync_directory(self.directory)
+        self._journal_id = int(state.get("journalId", 0))
+        self._open(valid)
+        return state, ops
+
+    # --- Writing ---
+
+    def checkpoint(self, snapshot: CheckpointSnapshot, replayable: bool = True) -> None:
+        """
+        Makes ``snapshot`` the new base. It is encoded and written on a
+        background thread; records appended meanwhile still go to the current
+        journal and are kept to start the new one, which replaces it once the
+        checkpoint has been renamed into place. A newer request supersedes one
+        still waiting.
+
+        ``replayable=False`` means the last appended operation cannot be
+        rebuilt from the current checkpoint (e.g. an undo past it): a barrier
+        record follows it, and a crash before the new checkpoint is in place
+        recovers the document as it was before that operation.
+        """
+        job = _CheckpointJob(snapshot)
+        with self._cond:
+            if self._closed:
+                return
+            if not replayable:
+                self._queue(_BARRIER_RECORD)
+            self._checkpoints.append(job)
+        self._checkpoint_done = _checkpoint_pool().submit(self._run_checkpoint, job)
+
+    def wait(self) -> None:
+        """Blocks until the checkpoints asked for so far are in place (or have failed)."""
+        done = self._checkpoint_done
+        if done is not None:
+            done.result()
+
+    def append(self, op: Operation) -> None:
+        record = _record_bytes(op)
+        with self._cond:
+            if self._closed:
+                return
+            self._queue(record)
+
+    def flush(self) -> None:
+        """Blocks until every appended record is on disk."""
+        with self._cond:
+            data = bytes(self._pending)
+            self._pending.clear()
+            journal_id = self._journal_id
+        self._write(data, journal_id)
+
+    def close(self, discard: bool = False) -> None:
+        """Stops the writer; with ``discard`` (clean exit) the session files are removed."""
+        self.wait()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        if discard:
+            with self._cond:
+                self._pending.clear()
+        else:
+            self.flush()
+        with self._io_lock:
+            self._close_fd()
+            if discard:
+                for path in (self.journal_path, self.checkpoint_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    # --- Internals ---
+
+    def _queue(self, record: bytes) -> None:
+        # Called with _cond held
+        if not self._pending:
+            self._first_pending = time.monotonic()
+        self._pending += record
+        for job in self._checkpoints:
+            job.carry += record
+        self._cond.notify()
+
+    def _run_checkpoint(self, job: _CheckpointJob) -> None:
+        with self._cond:
+            if self._checkpoints[-1] is not job:
+                # A newer snapshot is queued and covers this one
+                self._checkpoints.remove(job)
+                return
+            # Only this thread switches journals, so the id cannot move meanwhile
+            journal_id = self._journal_id + 1
+        tmp = self.checkpoint_path + ".tmp"
+        next_path = self.journal_path + NEXT_JOURNAL_SUFFIX
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_checkpoint(tmp, job.snapshot, journal_id)
+            with self._io_lock:
+                with self._cond:
+                    carry = bytes(job.carry)
+                with open(next_path, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, _VERSION, journal_id))
+                    f.write(carry)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.checkpoint_path)
+                os.replace(next_path, self.journal_path)
+                _fsync_directory(self.directory)
+                with self._cond:
+                    # Records queued so far are covered by the checkpoint or
+                    # carried over, and batches the writer already took are
+                    # dropped by the id check in _write()
+                    late = bytes(job.carry[len(carry):])
+                    self._checkpoints.remove(job)
+                    self._pending.clear()
+                    self._journal_id = journal_id
+                self._open_locked(_HEADER.size + len(carry))
+                if late:
+                    os.write(self._fd, late)
+                    os.fsync(self._fd)
+        except OSError as exc:
+            print(f"Failed to write recovery checkpoint: {exc}")
+            with self._cond:
+                if job in self._checkpoints:
+                    self._checkpoints.remove(job)
+            for path in (tmp, next_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return
+        self._start_writer()
+
+    def _open(self, valid_length: int) -> None:
+        with self._io_lock:
+            self._open_locked(valid_length)
+        self._start_writer()
+
+    def _open_locked(self, valid_length: int) -> None:
+        self._close_fd()
+        fd = os.open(self.journal_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        if valid_length < _HEADER.size:
+            os.ftruncate(fd, 0)
+            os.write(fd, _HEADER.pack(_MAGIC, _VERSION, self._journal_id))
+        else:
+            # Drop a torn tail so new records follow the last valid one
+            os.ftruncate(fd, valid_length)
+        os.lseek(fd, 0, os.SEEK_END)
+        os.fsync(fd)
+        self._fd = fd
+
+    def _start_writer(self) -> None:
+        if self._writer is None and not self._closed:
+            self._writer = threading.Thread(target=self._write_loop, name="msp-journal", daemon=True)
+            self._writer.start()
+
+    def _close_fd(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _write(self, data: bytes, journal_id: int) -> None:
+        if not data:
+            return
+        with self._io_lock:
+            if self._fd is None or journal_id != self._journal_id:
+                return
+            os.write(self._fd, data)
+            os.fsync(self._fd)
+
+    def _write_loop(self) -> None:
+        interval = JOURNAL_SYNC_MS / 1000.0
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # Let a batch gather unless it is already large
+                while not self._closed and len(self._pending) < JOURNAL_BATCH_BYTES:
+                    remaining = self._first_pending + interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                data = bytes(self._pending)
+                self._pending.clear()
+                journal_id = self._journal_id
+            self._write(data, journal_id)
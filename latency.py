@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+from PySide6.QtCore import QEvent, QObject
+from PySide6.QtGui import QWindow
+
+# Input-to-paint latencies kept for monitoring (the most recent ones).
+LATENCY_SAMPLES = 256
+
+_POINTER_EVENTS = {
+    QEvent.MouseButtonPress,
+    QEvent.MouseMove,
+    QEvent.MouseButtonRelease,
+    QEvent.TabletPress,
+    QEvent.TabletMove,
+    QEvent.TabletRelease,
+    QEvent.TouchBegin,
+    QEvent.TouchUpdate,
+    QEvent.TouchEnd,
+}
+
+
+def monotonic_ms() -> float:
+    return time.monotonic() * 1000.0
+
+
+class PointerClock(QObject):
+    """
+    Event filter on the canvas window that remembers the timestamp of the
+    pointer event being delivered, so QML handlers (which do not see it) can
+    pass it on with the event's position. Timestamps come from the window
+    system's clock; the smallest gap seen between an event's timestamp and
+    its arrival maps them onto monotonic_ms(), so time spent queued behind a
+    busy GUI thread counts as latency.
+    """
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self._window: Optional[QWindow] = None
+        self._timestamp: Optional[float] = None
+        self._offset: Optional[float] = None
+
+    def attach(self, window: Optional[QWindow]) -> None:
+        if self._window is not None:
+            self._window.removeEventFilter(self)
+        self._window = window
+        if window is not None:
+            window.installEventFilter(self)
+
+    def timestamp(self) -> Optional[float]:
+        """Timestamp (ms) of the latest pointer event; None before the first one."""
+        return self._timestamp
+
+    def to_monotonic(self, timestamp: float) -> Optional[float]:
+        """``timestamp`` on the monotonic_ms() clock; None until an event has been seen."""
+        if self._offset is None:
+            return None
+        return timestamp + self._offset
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() in _POINTER_EVENTS:
+            stamp = float(event.timestamp())
+            offset = monotonic_ms() - stamp
+            if self._offset is None or offset < self._offset:
+                self._offset = offset
+            self._timestamp = stamp
+        return False
+
+
+class LatencyLog:
+    """Ring buffer of the last LATENCY_SAMPLES input-to-paint latencies, in ms."""
+
+    def __init__(self, size: int = LATENCY_SAMPLES) -> None:
+        self._samples = np.zeros(size, dtype=np.float64)
+        # Samples recorded so far, including overwritten ones
+        self.count = 0
+
+    def record(self, ms: float) -> None:
+        self._samples[self.count % len(self._samples)] = ms
+        self.count += 1
+
+    def samples(self) -> np.ndarray:
+        """The kept samples, oldest first."""
+        size = len(self._samples)
+        if self.count <= size:
+            return self._samples[:self.count].copy()
+        start = self.count % size
+        return np.concatenate((self._samples[start:], self._samples[:start]))
+
+    def summary(self) -> Tuple[float, float, float]:
+        """(median, 95th percentile, maximum) of the kept samples; zeros while empty."""
+        samples = self.samples()
+        if not samples.size:
+            return 0.0, 0.0, 0.0
+        median, p95 = np.percentile(samples, (50, 95))
+        return float(median), float(p95), float(samples.max())
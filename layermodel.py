@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from PySide6.QtCore import Property, QAbstractListModel, QByteArray, QModelIndex, QObject, Qt, Signal
+
+if TYPE_CHECKING:
+    from backend import Layer
+
+# (name, opacity, visible, blendMode, active, thumbnail)
+Row = Tuple[str, float, bool, str, bool, str]
+
+NAME_ROLE = Qt.UserRole + 1
+OPACITY_ROLE = Qt.UserRole + 2
+VISIBLE_ROLE = Qt.UserRole + 3
+BLEND_MODE_ROLE = Qt.UserRole + 4
+ACTIVE_ROLE = Qt.UserRole + 5
+THUMBNAIL_ROLE = Qt.UserRole + 6
+
+_ROLE_COLUMNS = {
+    NAME_ROLE: 0,
+    Qt.DisplayRole: 0,
+    OPACITY_ROLE: 1,
+    VISIBLE_ROLE: 2,
+    BLEND_MODE_ROLE: 3,
+    ACTIVE_ROLE: 4,
+    THUMBNAIL_ROLE: 5,
+}
+
+
+def _row(layer: Layer, active: bool) -> Row:
+    return (layer.name, float(layer.opacity), bool(layer.visible), layer.blend_mode.value, active, layer.thumbnail)
+
+
+def _runs(rows: Sequence[int]) -> Iterator[Tuple[int, int]]:
+    """Consecutive (first, last) ranges of sorted row numbers."""
+    start = prev = None
+    for row in rows:
+        if start is None:
+            start = prev = row
+        elif row == prev + 1:
+            prev = row
+        else:
+            yield start, prev
+            start = prev = row
+    if start is not None:
+        yield start, prev
+
+
+class LayerListModel(QAbstractListModel):
+    """
+    Layer panel model. Keeps its own copy of the displayed metadata and, on
+    ``sync()``, diffs it against the layer stack so views only receive
+    inserts/removals for rows that actually appeared or vanished and
+    ``dataChanged`` for rows whose metadata differs. Delegates survive undo,
+    redo and metadata edits.
+    """
+
+    countChanged = Signal()
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self._rows: List[Row] = []
+
+    @Property(int, notify=countChanged)
+    def count(self) -> int:
+        return len(self._rows)
+
+    # --- QAbstractListModel ---
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        column = _ROLE_COLUMNS.get(role)
+        if column is None:
+            return None
+        return self._rows[index.row()][column]
+
+    def roleNames(self) -> Dict[int, QByteArray]:
+        return {
+            NAME_ROLE: QByteArray(b"name"),
+            OPACITY_ROLE: QByteArray(b"opacity"),
+            VISIBLE_ROLE: QByteArray(b"visible"),
+            BLEND_MODE_ROLE: QByteArray(b"blendMode"),
+            ACTIVE_ROLE: QByteArray(b"active"),
+            THUMBNAIL_ROLE: QByteArray(b"thumbnail"),
+        }
+
+    # --- Updates from the backend ---
+
+    def move(self, from_row: int, to_row: int) -> None:
+        """Mirrors a single-layer move; call before the next ``sync()``."""
+        if from_row == to_row or not 0 <= from_row < len(self._rows):
+            return
+        # Qt's destination is the row the item is placed *before*
+        destination = to_row + 1 if to_row > from_row else to_row
+        self.beginMoveRows(QModelIndex(), from_row, from_row, QModelIndex(), destination)
+        self._rows.insert(to_row, self._rows.pop(from_row))
+        self.endMoveRows()
+
+    def sync(self, layers: Sequence[Layer], active_index: int) -> None:
+        rows = [_row(layer, idx == active_index) for idx, layer in enumerate(layers)]
+        if len(rows) != len(self._rows):
+            self._splice(rows)
+            self.countChanged.emit()
+        changed = [idx for idx, (old, new) in enumerate(zip(self._rows, rows)) if old != new]
+        self._rows = rows
+        for first, last in _runs(changed):
+            self.dataChanged.emit(self.index(first), self.index(last))
+
+    def _splice(self, rows: List[Row]) -> None:
+        # Rows outside the longest common prefix/suffix (ignoring the active
+        # flag and thumbnail, which change independently) are removed and
+        # re-inserted.
+        old = self._rows
+        n, m = len(old), len(rows)
+        shortest = min(n, m)
+        prefix = 0
+        while prefix < shortest and old[prefix][:4] == rows[prefix][:4]:
+            prefix += 1
+        suffix = 0
+        while suffix < shortest - prefix and old[n - 1 - suffix][:4] == rows[m - 1 - suffix][:4]:
+            suffix += 1
+        if n - suffix > prefix:
+            self.beginRemoveRows(QModelIndex(), prefix, n - suffix - 1)
+            self._rows = old[:prefix] + old[n - suffix:]
+            self.endRemoveRows()
+        if m - suffix > prefix:
+            self.beginInsertRows(QModelIndex(), prefix, m - suffix - 1)
+            self._rows = self._rows[:prefix] + rows[prefix:m - suffix] + self._rows[prefix:]
+            self.endInsertRows()
@@ -6,10 +6,11 @@ from typing import Optional
 
 from PySide6.QtGui import QGuiApplication
 from PySide6.QtQml import QQmlApplicationEngine, qmlRegisterType
-from PySide6.QtCore import QUrl, QFileSystemWatcher
+from PySide6.QtCore import QUrl, QFileSystemWatcher, QStandardPaths
 from PySide6.QtQuickControls2 import QQuickStyle
 
 from backend import PainterBackend
+from thumbnails import PROVIDER_ID, ThumbnailProvider
 
 
 def load_qml(engine: QQmlApplicationEngine, qml_url: QUrl) -> None:
@@ -22,10 +23,18 @@ def load_qml(engine: QQmlApplicationEngine, qml_url: QUrl) -> None:
 
 def main() -> int:
     app = QGuiApplication(sys.argv)
+    app.setApplicationName("MaskShadePainter")
     qmlRegisterType(PainterBackend, "MSP", 1, 0, "PainterBackend")
     QQuickStyle.setStyle("Basic")
 
     engine = QQmlApplicationEngine()
+    engine.addImageProvider(PROVIDER_ID, ThumbnailProvider())
+    # Checkpoint and operation journal used to restore a crashed session
+    data_dir = QStandardPaths.writableLocation(QStandardPaths.AppLocalDataLocation)
+    engine.rootContext().setContextProperty("recoveryDirectory", os.path.join(data_dir, "recovery"))
+    # Page files of disk-backed layers
+    cache_dir = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+    engine.rootContext().setContextProperty("scratchDirectory", os.path.join(cache_dir, "scratch"))
     qml_path = os.path.join(os.path.dirname(__file__), "main.qml")
     qml_url = QUrl.fromLocalFile(qml_path)
     load_qml(engine, qml_url)
@@ -22,6 +22,14 @@ ApplicationWindow {
     property var pendingAction: null
     readonly property bool hasUnsavedChanges: canvas && canvas.modified
 
+    // Starts crash-recovery journaling; a session left by a crash is restored here
+    Component.onCompleted: {
+        if (canvas) {
+            canvas.scratchDirectory = scratchDirectory
+            canvas.journalDirectory = recoveryDirectory
+        }
+    }
+
     function requireConfirmation(action) {
         if (hasUnsavedChanges) {
             pendingAction = action
@@ -72,6 +80,7 @@ ApplicationWindow {
             MenuItem { text: "Open..."; onTriggered: triggerOpen() }
             MenuItem { text: "Import as calque..."; onTriggered: triggerImportLayer() }
             MenuItem { text: "Export PNG..."; onTriggered: triggerExportPng() }
+            MenuItem { text: "Export Channel Pack..."; onTriggered: channelPackDialog.open() }
             MenuSeparator { }
             MenuItem {
                 text: "Save"
@@ -95,6 +104,14 @@ ApplicationWindow {
                 onTriggered: if (canvas) canvas.redo()
             }
             MenuSeparator { }
+            MenuItem { text: "Select All"; onTriggered: if (canvas) canvas.selectAll() }
+            MenuItem {
+                text: "Deselect"
+                enabled: canvas ? canvas.hasSelection : false
+                onTriggered: if (canvas) canvas.clearSelection()
+            }
+            MenuItem { text: "Invert Selection"; onTriggered: if (canvas) canvas.invertSelection() }
+            MenuSeparator { }
             MenuItem { text: "Copy"; onTriggered: console.log("TODO copy") }
             MenuItem { text: "Paste"; onTriggered: console.log("TODO paste") }
         }
@@ -102,6 +119,14 @@ ApplicationWindow {
             title: "Canvas"
             MenuItem { text: "Resize Canvas..."; onTriggered: resizeDialog.open() }
             MenuItem { text: "Change Size with Extension..."; onTriggered: extendDialog.open() }
+            MenuItem { text: "Scale Canvas..."; onTriggered: scaleDialog.open() }
+            MenuSeparator { }
+            MenuItem {
+                text: "Disk-Backed Layers"
+                checkable: true
+                checked: canvas ? canvas.diskBackedLayers : false
+                onTriggered: if (canvas) canvas.diskBackedLayers = checked
+            }
         }
         Menu {
             title: "Layers"
@@ -111,6 +136,9 @@ ApplicationWindow {
             MenuSeparator { }
             MenuItem { text: "Merge Down"; onTriggered: console.log("TODO layer merge") }
             MenuItem { text: "Histogram Adjust..."; onTriggered: console.log("TODO histogram adjust") }
+            MenuItem { text: "Smooth..."; onTriggered: smoothFilterDialog.open() }
+            MenuItem { text: "Distance Field..."; onTriggered: distanceFieldDialog.open() }
+            MenuItem { text: "Morphology..."; onTriggered: morphologyDialog.open() }
         }
         Menu {
             title: "Help"
@@ -154,7 +182,7 @@ ApplicationWindow {
                 }
                 Loader {
                     sourceComponent: fillOptions
-                    active: canvas && canvas.toolMode === "fill"
+                    active: canvas && (canvas.toolMode === "fill" || canvas.toolMode === "selectValue")
                 }
                 Loader {
                     sourceComponent: gradientOptions
@@ -239,14 +267,31 @@ ApplicationWindow {
                             anchors.margins: 6
                             clip: true
                             spacing: 6
-                            model: canvas ? canvas.layersModel : []
+                            model: canvas ? canvas.layersModel : null
                             delegate: Components.LayerItem {
-                                layerData: modelData
+                                layerData: model
                                 backend: canvas
                                 settingsDialog: layerSettingsDialog
                             }
                         }
                     }
+                    Label {
+                        // Layer tile memory: in RAM / compressed (cold layers)
+                        text: canvas ? "Memory " + (canvas.residentBytes / 1048576).toFixed(0) + " MB, compressed "
+                                       + (canvas.compressedBytes / 1048576).toFixed(1) + " MB" : ""
+                        font.family: Theme.fonts.sans
+                        font.pixelSize: 11
+                        color: Theme.colors.textMuted
+                    }
+                    Label {
+                        // Pointer event to frame on screen, over the recent strokes
+                        text: canvas ? "Input latency " + canvas.inputLatencyMs.toFixed(0) + " ms, p95 "
+                                       + canvas.inputLatencyP95Ms.toFixed(0) + " ms, max "
+                                       + canvas.inputLatencyMaxMs.toFixed(0) + " ms" : ""
+                        font.family: Theme.fonts.sans
+                        font.pixelSize: 11
+                        color: Theme.colors.textMuted
+                    }
                 }
             }
         }
@@ -266,6 +311,41 @@ ApplicationWindow {
         y: (window.height - height) / 2
     }
 
+    Dialogs.CanvasScaleDialog {
+        id: scaleDialog
+        backend: canvas
+        x: (window.width - width) / 2
+        y: (window.height - height) / 2
+    }
+
+    Dialogs.ChannelPackDialog {
+        id: channelPackDialog
+        backend: canvas
+        x: (window.width - width) / 2
+        y: (window.height - height) / 2
+    }
+
+    Dialogs.SmoothFilterDialog {
+        id: smoothFilterDialog
+        backend: canvas
+        x: (window.width - width) / 2
+        y: (window.height - height) / 2
+    }
+
+    Dialogs.DistanceFieldDialog {
+        id: distanceFieldDialog
+        backend: canvas
+        x: (window.width - width) / 2
+        y: (window.height - height) / 2
+    }
+
+    Dialogs.MorphologyDialog {
+        id: morphologyDialog
+        backend: canvas
+        x: (window.width - width) / 2
+        y: (window.height - height) / 2
+    }
+
     Dialogs.LayerSettingsDialog {
         id: layerSettingsDialog
         backend: canvas
@@ -443,7 +523,7 @@ ApplicationWindow {
         contentItem: ColumnLayout {
             spacing: 10
             Label {
-                text: "Chemin de l'image (png/jpg/bmp)"
+                text: "Chemin des images (png/jpg/bmp), séparés par ;"
                 color: Theme.colors.textOnLight
                 font.family: Theme.fonts.sans
             }
@@ -467,9 +547,9 @@ ApplicationWindow {
             importPathField.selectAll()
         }
         onAccepted: {
-            var path = importPathField.text.trim()
-            if (canvas && path) {
-                canvas.importImageAsLayer(path)
+            var paths = importPathField.text.split(";").map(function(p) { return p.trim() }).filter(function(p) { return p.length > 0 })
+            if (canvas && paths.length > 0) {
+                canvas.importImagesAsLayers(paths)
             }
         }
     }
@@ -477,13 +557,18 @@ ApplicationWindow {
     Platform.FileDialog {
         id: importPicker
         title: "Importer une image"
-        fileMode: Platform.FileDialog.OpenFile
+        fileMode: Platform.FileDialog.OpenFiles
         nameFilters: ["Images (*.png *.jpg *.jpeg *.bmp)", "All files (*)"]
         onAccepted: {
-            var path = normalizePath(file)
-            if (canvas && path) {
-                importPathField.text = path
-                canvas.importImageAsLayer(path)
+            var paths = []
+            for (var i = 0; i < files.length; ++i) {
+                var path = normalizePath(files[i])
+                if (path)
+                    paths.push(path)
+            }
+            if (canvas && paths.length > 0) {
+                importPathField.text = paths.join(";")
+                canvas.importImagesAsLayers(paths)
                 importDialog.close()
             }
         }
@@ -491,7 +576,7 @@ ApplicationWindow {
 
     Dialog {
         id: exportDialog
-        title: "Export Flattened PNG"
+        title: "Export Flattened Image"
         modal: true
         width: 480
         standardButtons: Dialog.Ok | Dialog.Cancel
@@ -499,6 +584,23 @@ ApplicationWindow {
         x: (window.width - width) / 2
         y: (window.height - height) / 2
         property alias pathText: exportPathField.text
+        // File extension per entry of exportFormatCombo
+        readonly property var formatExtensions: [".png", ".png", ".r16", ".npy"]
+
+        function exportTo(path) {
+            var ext = formatExtensions[exportFormatCombo.currentIndex]
+            var lower = path.toLowerCase()
+            if (!(lower.endsWith(ext) || (ext === ".r16" && lower.endsWith(".raw"))))
+                path = path + ext
+            if (!canvas)
+                return path
+            if (exportFormatCombo.currentIndex === 0)
+                canvas.exportPng(path)
+            else
+                canvas.exportHeightmap(path)
+            return path
+        }
+
         contentItem: ColumnLayout {
             spacing: 10
             Label {
@@ -520,6 +622,17 @@ ApplicationWindow {
                     onClicked: exportPicker.open()
                 }
             }
+            Label {
+                text: "Format"
+                color: Theme.colors.textOnLight
+                font.family: Theme.fonts.sans
+            }
+            ComboBox {
+                id: exportFormatCombo
+                Layout.fillWidth: true
+                model: ["PNG 8-bit RGBA", "PNG 16-bit grayscale heightmap", "RAW 16-bit heightmap (.r16)", "NumPy float32 (.npy)"]
+                currentIndex: 0
+            }
         }
         onOpened: {
             exportPathField.forceActiveFocus()
@@ -529,10 +642,7 @@ ApplicationWindow {
             var path = exportPathField.text.trim()
             if (!path)
                 return
-            if (!path.toLowerCase().endsWith(".png"))
-                path = path + ".png"
-            if (canvas)
-                canvas.exportPng(path)
+            exportTo(path)
         }
     }
 
@@ -545,20 +655,25 @@ ApplicationWindow {
         }
     }
 
+    Connections {
+        target: Qt.application
+        function onAboutToQuit() {
+            // A clean exit leaves nothing to recover
+            if (canvas)
+                canvas.closeJournal()
+        }
+    }
+
     Platform.FileDialog {
         id: exportPicker
         title: "Exporter en PNG"
         fileMode: Platform.FileDialog.SaveFile
-        nameFilters: ["PNG image (*.png)", "All files (*)"]
+        nameFilters: ["PNG image (*.png)", "RAW heightmap (*.r16 *.raw)", "NumPy array (*.npy)", "All files (*)"]
         onAccepted: {
             var path = normalizePath(file)
             if (!path)
                 return
-            if (!path.toLowerCase().endsWith(".png"))
-                path = path + ".png"
-            exportPathField.text = path
-            if (canvas)
-                canvas.exportPng(path)
+            exportPathField.text = exportDialog.exportTo(path)
             exportDialog.close()
         }
     }
@@ -610,6 +725,36 @@ ApplicationWindow {
                             radius: 4
                         }
                 }
+                ToolButton {
+                    icon.source: "assets/icons/blur.svg"
+                    icon.color: Theme.colors.textPrimary
+                    ToolTip.visible: hovered
+                    ToolTip.text: "Blur"
+                    checkable: true
+                    checked: canvas && canvas.toolMode === "blur"
+                    ButtonGroup.group: toolButtonsGroup
+                        onClicked: if (canvas) canvas.toolMode = "blur"
+                        background: Rectangle {
+                            color: parent.checked ? "#2f343d" : "transparent"
+                            border.color: parent.checked ? Theme.colors.layerActiveBorder : "transparent"
+                            radius: 4
+                        }
+                }
+                ToolButton {
+                    icon.source: "assets/icons/smudge.svg"
+                    icon.color: Theme.colors.textPrimary
+                    ToolTip.visible: hovered
+                    ToolTip.text: "Smudge"
+                    checkable: true
+                    checked: canvas && canvas.toolMode === "smudge"
+                    ButtonGroup.group: toolButtonsGroup
+                        onClicked: if (canvas) canvas.toolMode = "smudge"
+                        background: Rectangle {
+                            color: parent.checked ? "#2f343d" : "transparent"
+                            border.color: parent.checked ? Theme.colors.layerActiveBorder : "transparent"
+                            radius: 4
+                        }
+                }
                 ToolButton {
                     icon.source: "assets/icons/temporal.svg"
                     icon.color: Theme.colors.textPrimary
@@ -669,6 +814,51 @@ ApplicationWindow {
                             border.color: parent.checked ? Theme.colors.layerActiveBorder : "transparent"
                             radius: 4
                         }
+                }
+                ToolButton {
+                    icon.source: "assets/icons/select-rect.svg"
+                    icon.color: Theme.colors.textPrimary
+                    ToolTip.visible: hovered
+                    ToolTip.text: "Rectangle Select"
+                    checkable: true
+                    checked: canvas && canvas.toolMode === "selectRect"
+                    ButtonGroup.group: toolButtonsGroup
+                        onClicked: if (canvas) canvas.toolMode = "selectRect"
+                        background: Rectangle {
+                            color: parent.checked ? "#2f343d" : "transparent"
+                            border.color: parent.checked ? Theme.colors.layerActiveBorder : "transparent"
+                            radius: 4
+                        }
+                }
+                ToolButton {
+                    icon.source: "assets/icons/select-lasso.svg"
+                    icon.color: Theme.colors.textPrimary
+                    ToolTip.visible: hovered
+                    ToolTip.text: "Lasso Select"
+                    checkable: true
+                    checked: canvas && canvas.toolMode === "selectLasso"
+                    ButtonGroup.group: toolButtonsGroup
+                        onClicked: if (canvas) canvas.toolMode = "selectLasso"
+                        background: Rectangle {
+                            color: parent.checked ? "#2f343d" : "transparent"
+                            border.color: parent.checked ? Theme.colors.layerActiveBorder : "transparent"
+                            radius: 4
+                        }
+                }
+                ToolButton {
+                    icon.source: "assets/icons/select-value.svg"
+                    icon.color: Theme.colors.textPrimary
+                    ToolTip.visible: hovered
+                    ToolTip.text: "Select by Value"
+                    checkable: true
+                    checked: canvas && canvas.toolMode === "selectValue"
+                    ButtonGroup.group: toolButtonsGroup
+                        onClicked: if (canvas) canvas.toolMode = "selectValue"
+                        background: Rectangle {
+                            color: parent.checked ? "#2f343d" : "transparent"
+                            border.color: parent.checked ? Theme.colors.layerActiveBorder : "transparent"
+                            radius: 4
+                        }
                     }
                 }
                 Item { Layout.fillWidth: true }
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import math
+from typing import List
+
+import numpy as np
+from PySide6.QtCore import QRect, QSize
+from PySide6.QtGui import QImage, QRegion
+
+from raster import Rect, const_image_array, image_array, run_tiled
+
+# Rectangles a dirty region may have before it is handled as its bounding box.
+COARSE_RECT_LIMIT = 16
+
+# Stop halving once the shorter side would drop below this many pixels.
+MIN_LEVEL_SIZE = 64
+
+
+def downsample_half(src: np.ndarray) -> np.ndarray:
+    """2x2 box filter over premultiplied pixels; odd edges replicate the last row/column."""
+    h, w = src.shape[:2]
+    if h % 2 or w % 2:
+        src = np.pad(src, ((0, h % 2), (0, w % 2), (0, 0)), mode="edge")
+    s = src.astype(np.uint16)
+    total = s[0::2, 0::2] + s[1::2, 0::2] + s[0::2, 1::2] + s[1::2, 1::2]
+    return ((total + 2) >> 2).astype(np.uint8)
+
+
+class MipPyramid:
+    """
+    Half-resolution copies of the composite for zoomed-out display. Levels are
+    refreshed lazily from per-level dirty regions (kept in base coordinates),
+    and only up to the level actually requested.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self._width = width
+        self._height = height
+        self._levels: List[QImage] = []
+        self._dirty: List[QRegion] = []
+        w, h = width, height
+        while min(w, h) // 2 >= MIN_LEVEL_SIZE:
+            w = (w + 1) // 2
+            h = (h + 1) // 2
+            image = QImage(w, h, QImage.Format_ARGB32_Premultiplied)
+            self._levels.append(image)
+            self._dirty.append(QRegion(0, 0, width, height))
+
+    @property
+    def level_count(self) -> int:
+        """Number of levels including the full-resolution base (level 0)."""
+        return len(self._levels) + 1
+
+    def level_for_scale(self, scale: float) -> int:
+        """Finest level that is still at least as dense as the screen."""
+        if scale <= 0.0 or scale >= 1.0:
+            return 0
+        return min(int(math.floor(math.log2(1.0 / scale))), len(self._levels))
+
+    def size(self, level: int) -> QSize:
+        if level == 0:
+            return QSize(self._width, self._height)
+        return self._levels[level - 1].size()
+
+    def invalidate(self, region: QRegion) -> None:
+        for idx in range(len(self._dirty)):
+            self._dirty[idx] += region
+
+    def image(self, base: QImage, level: int, area: QRect = QRect()) -> QImage:
+        """Level ``level`` (>= 1) with every dirty pixel inside ``area`` (base coords) refreshed."""
+        for idx in range(level):
+            self._refresh(base, idx, area)
+        return self._levels[level - 1]
+
+    def _refresh(self, base: QImage, idx: int, area: QRect) -> None:
+        pending = self._dirty[idx]
+        if pending.isEmpty():
+            return
+        todo = pending if area.isNull() else pending.intersected(area)
+        if todo.isEmpty():
+            return
+        src_image = base if idx == 0 else self._levels[idx - 1]
+        src = const_image_array(src_image)
+        dst = image_array(self._levels[idx])
+        step = 1 << (idx + 1)
+        for rect in coarse_rects(todo):
+            # Base-coordinate rect -> destination level pixels, expanded outward.
+            x0 = rect.left() // step
+            y0 = rect.top() // step
+            x1 = min(dst.shape[1], -(-(rect.right() + 1) // step))
+            y1 = min(dst.shape[0], -(-(rect.bottom() + 1) // step))
+            if x1 <= x0 or y1 <= y0:
+                continue
+
+            def job(tile: Rect) -> None:
+                tx, ty, tw, th = tile
+                block = src[ty * 2:min(src.shape[0], (ty + th) * 2), tx * 2:min(src.shape[1], (tx + tw) * 2)]
+                dst[ty:ty + th, tx:tx + tw] = downsample_half(block)
+
+            run_tiled((x0, y0, x1 - x0, y1 - y0), job)
+        self._dirty[idx] = pending.subtracted(todo)
+
+
+def coarse_rects(region: QRegion) -> List[QRect]:
+    """
+    Rectangles covering ``region``: its own ones, or its bounding box once a
+    long stroke has fragmented it into more than COARSE_RECT_LIMIT slivers,
+    which is cheaper to process as one.
+    """
+    rects = list(region)
+    if len(rects) > COARSE_RECT_LIMIT:
+        return [region.boundingRect()]
+    return rects
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import math
+from enum import Enum
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from raster import ALPHA_CHANNEL, RGB_CHANNELS, Rect, gray_pixels, intersect_rects, ordered_map
+from selection import blend_masked
+from tiles import TILE_SIZE, TileBuffer
+
+MORPHOLOGY_MAX_RADIUS = 512
+
+# (dy, dx, half-length) of one line segment of a structuring element
+Segment = Tuple[int, int, int]
+
+
+class MorphologyOp(str, Enum):
+    DILATE = "dilate"
+    ERODE = "erode"
+    OPEN = "open"
+    CLOSE = "close"
+
+
+class StructuringShape(str, Enum):
+    SQUARE = "square"
+    ROUND = "round"
+
+
+def structuring_segments(radius: int, shape: StructuringShape) -> List[Segment]:
+    """
+    Line segments whose Minkowski sum is the structuring element of
+    ``radius``: a square is a horizontal and a vertical one; ROUND adds the
+    two diagonals for an octagon reaching ``radius`` along the axes and
+    about ``radius`` along the diagonals (the usual disk approximation).
+    """
+    if shape == StructuringShape.SQUARE:
+        return [(0, 1, radius), (1, 0, radius)]
+    # The axis segments fill the odd lattice points the diagonal ones skip
+    diagonal = min(int(round(radius * (1.0 - math.sqrt(0.5)))), (radius - 1) // 2)
+    axis = radius - 2 * diagonal
+    return [(0, 1, axis), (1, 0, axis), (1, 1, diagonal), (1, -1, diagonal)]
+
+
+def _combine(planes: np.ndarray, dy: int, dx: int, op: Callable) -> None:
+    """planes[p] = op(planes[p], planes[p + (dy, dx)]) in place, where p + (dy, dx) is inside the array."""
+    height, width = planes.shape[1:]
+    rows = slice(0, height - dy), slice(dy, height)
+    cols = (slice(0, width - dx), slice(dx, width)) if dx >= 0 else (slice(-dx, width), slice(0, width + dx))
+    target = planes[:, rows[0], cols[0]]
+    op(target, planes[:, rows[1], cols[1]], out=target)
+
+
+def _line_pass(planes: np.ndarray, segment: Segment, op: Callable) -> None:
+    """
+    Replaces every sample by ``op`` (np.maximum / np.minimum) over the
+    2 * half + 1 samples centered on it along (dy, dx), in place, with
+    windows doubled in length at each step: log2(length) whole-array
+    operations whatever the radius. Samples within ``half`` steps of the
+    array edge come out wrong; callers keep a margin.
+    """
+    dy, dx, half = segment
+    if half <= 0:
+        return
+    length = 2 * half + 1
+    span = 1
+    while span < length:
+        step = min(span, length - span)
+        _combine(planes, step * dy, step * dx, op)
+        span += step
+    # Windows start at their sample; move them to their center
+    sy, sx = half * dy, half * dx
+    height, width = planes.shape[1:]
+    src_cols = slice(0, width - sx) if sx >= 0 else slice(-sx, width)
+    dst_cols = slice(sx, width) if sx >= 0 else slice(0, width + sx)
+    planes[:, sy:, dst_cols] = planes[:, :height - sy, src_cols]
+
+
+def _fill_outside(planes: np.ndarray, inside: Optional[Rect], value: int) -> None:
+    """Sets every sample of ``planes`` outside the local rect ``inside`` (all of them for None) to ``value``."""
+    if inside is None:
+        planes[...] = value
+        return
+    x, y, w, h = inside
+    planes[:, :y] = value
+    planes[:, y + h:] = value
+    planes[:, y:y + h, :x] = value
+    planes[:, y:y + h, x + w:] = value
+
+
+def _steps(op: MorphologyOp) -> List[Tuple[Callable, int]]:
+    """(extremum, value beyond the canvas) of each elementary pass, in order."""
+    dilate = (np.maximum, 0)
+    # The canvas border does not eat into masks that touch it
+    erode = (np.minimum, 255)
+    return {
+        MorphologyOp.DILATE: [dilate],
+        MorphologyOp.ERODE: [erode],
+        MorphologyOp.OPEN: [erode, dilate],
+        MorphologyOp.CLOSE: [dilate, erode],
+    }[op]
+
+
+def morphology_reach(op: MorphologyOp, radius: int) -> int:
+    """How far past a layer's content the result of ``op`` can have content."""
+    return radius if op in (MorphologyOp.DILATE, MorphologyOp.CLOSE) else 0
+
+
+def morph_bands(
+    source: TileBuffer,
+    rect: Rect,
+    canvas: Rect,
+    op: MorphologyOp,
+    radius: int,
+    shape: StructuringShape = StructuringShape.ROUND,
+    coverage: Optional[np.ndarray] = None,
+) -> Iterator[Tuple[Rect, np.ndarray]]:
+    """
+    (band, pixels) of ``rect`` after ``op`` with a structuring element of
+    ``radius``, as grayscale max / min filters on the premultiplied gray and
+    alpha planes (hard masks stay hard, soft edges keep their ramp). Row
+    bands of ``rect`` are processed on the worker pool, each from a margin
+    of ``radius`` per pass read from ``source`` (pass a clone when writing
+    back into the same layer); beyond ``canvas`` dilation sees transparency
+    and erosion sees white. Bands outside the selection ``coverage`` of
+    ``rect`` are not yielded; the others are blended through it.
+    """
+    segments = structuring_segments(radius, shape)
+    steps = _steps(op)
+    margin = radius * len(steps)
+    # Bands at least twice the margin tall, so reading it at most doubles the work
+    band_rows = TILE_SIZE * max(1, -(-2 * margin // TILE_SIZE))
+    rx, ry, rw, rh = rect
+
+    def band(y0: int) -> Tuple[Rect, Optional[np.ndarray]]:
+        out_rect = (rx, y0, rw, min(band_rows, ry + rh - y0))
+        _x, _y, _w, bh = out_rect
+        part_coverage = None if coverage is None else coverage[y0 - ry:y0 - ry + bh]
+        if part_coverage is not None and not part_coverage.any():
+            return out_rect, None
+        region = (rx - margin, y0 - margin, rw + 2 * margin, bh + 2 * margin)
+        planes = np.empty((2, region[3], region[2]), dtype=np.uint8)
+        inside = intersect_rects(region, canvas)
+        local = None
+        if inside is not None:
+            ix, iy, iw, ih = inside
+            local = (ix - region[0], iy - region[1], iw, ih)
+            pixels = source.read(inside)
+            planes[0, local[1]:local[1] + ih, local[0]:local[0] + iw] = pixels[..., RGB_CHANNELS[0]]
+            planes[1, local[1]:local[1] + ih, local[0]:local[0] + iw] = pixels[..., ALPHA_CHANNEL]
+        # Opaque layers keep their alpha, and in white-on-transparent masks
+        # gray equals alpha: either way one plane carries everything.
+        opaque = local is not None and bool((pixels[..., ALPHA_CHANNEL] == 255).all())
+        shared = not opaque and (local is None or np.array_equal(pixels[..., RGB_CHANNELS[0]], pixels[..., ALPHA_CHANNEL]))
+        work = planes[:1] if opaque or shared else planes
+        for extremum, outside in steps:
+            # Each pass sees its own neutral value beyond the canvas
+            _fill_outside(work, local, outside)
+            for segment in segments:
+                _line_pass(work, segment, extremum)
+        center = work[:, margin:margin + bh, margin:margin + rw]
+        if opaque:
+            alpha = np.full_like(center[0], 255)
+        else:
+            alpha = center[0] if shared else center[1]
+        pixels = gray_pixels(center[0], alpha)
+        if part_coverage is not None:
+            blend_masked(pixels, source.read(out_rect), part_coverage)
+        return out_rect, pixels
+
+    for out_rect, pixels in ordered_map(band, range(ry, ry + rh, band_rows)):
+        if pixels is not None:
+            yield out_rect, pixels
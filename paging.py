@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import itertools
+import tempfile
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PySide6.QtCore import QObject, Signal
+
+if TYPE_CHECKING:
+    from tiles import Tile
+
+# Resident tile pixels kept while paging is enabled (the working set).
+PAGING_BUDGET_BYTES = 1 << 30
+# Tiles per scratch file; files are created as the paged-out set grows.
+SCRATCH_SEGMENT_TILES = 256
+# zlib level for cold tiles: the fastest one, masks compress well regardless.
+COMPRESS_LEVEL = 1
+
+# Unique per tile for the life of the process (ids of dead objects are reused)
+_serials = itertools.count(1)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _scratch_map(directory: str, shape: Tuple[int, ...]) -> np.memmap:
+    """Zero-filled uint8 array over a temporary file that is deleted once unmapped."""
+    with tempfile.TemporaryFile(prefix="msp-", dir=directory) as f:
+        # The mapping keeps its own handle, so nothing is left behind, even after a crash
+        return np.memmap(f, dtype=np.uint8, mode="w+", shape=shape)
+
+
+class TilePager:
+    """
+    Process-wide LRU working set of tile pixels. Every tile registers on
+    creation; while paging is enabled, the least recently used tiles beyond
+    the byte budget are written to memory-mapped scratch files and their
+    in-memory copy dropped, and a paged-out tile is read back the next time
+    its pixels are accessed. Tiles keep their scratch slot while resident, so
+    evicting a tile that was only read does not write it again.
+
+    Cold tiles can also be compressed in memory (see CompressionService). A
+    compressed tile keeps its blob until it is next written, so dropping its
+    pixels again (to evict or recompress it) costs nothing.
+
+    Disabling paging stops eviction; tiles already on disk are paged in as
+    they are used.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._budget: Optional[int] = None
+        self._directory = ""
+        # serial -> weak tile, for every live tile
+        self._refs: Dict[int, weakref.ref] = {}
+        # Serials of tiles whose pixels are in memory, least recently used first
+        self._resident: "OrderedDict[int, None]" = OrderedDict()
+        # serial -> scratch slot of tiles written out at least once
+        self._slots: Dict[int, int] = {}
+        # serial -> size of the tile's compressed blob
+        self._compressed: Dict[int, int] = {}
+        self._free: List[int] = []
+        # Memory-mapped scratch files of SCRATCH_SEGMENT_TILES slots each
+        self._segments: List[np.memmap] = []
+        # Serials of collected tiles; appended from GC callbacks, drained under the lock
+        self._dead: List[int] = []
+        self._tile_bytes = 0
+        self._tile_shape: Tuple[int, ...] = ()
+
+    # --- Configuration ---
+
+    @property
+    def enabled(self) -> bool:
+        return self._budget is not None
+
+    def enable(self, directory: str = "", budget: int = PAGING_BUDGET_BYTES) -> None:
+        with self._lock:
+            self._directory = directory or tempfile.gettempdir()
+            self._budget = budget
+            self._evict()
+
+    def disable(self) -> None:
+        with self._lock:
+            self._budget = None
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            self._drain()
+            return len(self._resident) * self._tile_bytes
+
+    def paged_bytes(self) -> int:
+        """Bytes of tile data currently held only in scratch files."""
+        with self._lock:
+            self._drain()
+            paged = sum(1 for serial in self._slots if serial not in self._resident and serial not in self._compressed)
+            return paged * self._tile_bytes
+
+    def compressed_bytes(self) -> int:
+        """Bytes of compressed blobs held in memory."""
+        with self._lock:
+            self._drain()
+            return sum(self._compressed.values())
+
+    def scratch_array(self, shape: Tuple[int, ...]) -> np.memmap:
+        """Zero-filled array backed by a scratch file, for large buffers outside the tile grid."""
+        return _scratch_map(self._directory or tempfile.gettempdir(), shape)
+
+    # --- Tile hooks ---
+
+    def track(self, tile: Tile) -> None:
+        serial = tile.serial
+        ref = weakref.ref(tile, lambda _ref: self._dead.append(serial))
+        with self._lock:
+            self._drain()
+            if not self._tile_bytes:
+                self._tile_bytes = tile.resident_pixels.nbytes
+                self._tile_shape = tile.resident_pixels.shape
+            self._refs[serial] = ref
+            self._resident[serial] = None
+            self._evict()
+
+    def touch(self, tile: Tile) -> None:
+        if self._budget is None:
+            return
+        with self._lock:
+            if tile.serial in self._resident:
+                self._resident.move_to_end(tile.serial)
+
+    def page_in(self, tile: Tile) -> np.ndarray:
+        with self._lock:
+            return self._page_in(tile)
+
+    def writable(self, tile: Tile) -> np.ndarray:
+        """Pixels about to be modified: pages them in and drops the now stale blob."""
+        with self._lock:
+            pixels = self._page_in(tile)
+            tile.version += 1
+            tile.dirty = True
+            if tile.compressed is not None:
+                tile.compressed = None
+                self._compressed.pop(tile.serial, None)
+            return pixels
+
+    def compression_jobs(self, tiles: Iterable[Tile]) -> List[Tuple[Tile, np.ndarray, int]]:
+        """
+        (tile, pixels, version) of the resident ``tiles`` that need encoding.
+        Tiles that still have a valid blob just drop their pixels here.
+        """
+        jobs = []
+        with self._lock:
+            self._drain()
+            for tile in tiles:
+                pixels = tile.resident_pixels
+                if pixels is None:
+                    continue
+                if tile.compressed is not None:
+                    self._drop_pixels(tile)
+                else:
+                    jobs.append((tile, pixels, tile.version))
+        return jobs
+
+    def commit_compressed(self, results: Iterable[Tuple[Tile, np.ndarray, int, bytes]]) -> None:
+        """Stores encoded blobs, skipping tiles written (or evicted) since their job was made."""
+        with self._lock:
+            for tile, pixels, version, blob in results:
+                if tile.version != version or tile.resident_pixels is not pixels:
+                    continue
+                tile.compressed = blob
+                self._compressed[tile.serial] = len(blob)
+                self._drop_pixels(tile)
+
+    # --- Internals ---
+
+    def _page_in(self, tile: Tile) -> np.ndarray:
+        self._drain()
+        pixels = tile.resident_pixels
+        if pixels is not None:
+            self._resident.move_to_end(tile.serial)
+            return pixels
+        if tile.compressed is not None:
+            pixels = np.frombuffer(zlib.decompress(tile.compressed), dtype=np.uint8).reshape(self._tile_shape).copy()
+        else:
+            slot = self._slots[tile.serial]
+            segment = self._segments[slot // SCRATCH_SEGMENT_TILES]
+            pixels = np.array(segment[slot % SCRATCH_SEGMENT_TILES])
+        tile.resident_pixels = pixels
+        self._resident[tile.serial] = None
+        self._evict()
+        return pixels
+
+    def _drop_pixels(self, tile: Tile) -> None:
+        tile.resident_pixels = None
+        self._resident.pop(tile.serial, None)
+
+    def _drain(self) -> None:
+        while self._dead:
+            serial = self._dead.pop()
+            self._refs.pop(serial, None)
+            self._resident.pop(serial, None)
+            self._compressed.pop(serial, None)
+            slot = self._slots.pop(serial, None)
+            if slot is not None:
+                self._free.append(slot)
+
+    def _allocate_slot(self, shape: Tuple[int, ...]) -> int:
+        if not self._free:
+            base = len(self._segments) * SCRATCH_SEGMENT_TILES
+            self._segments.append(_scratch_map(self._directory, (SCRATCH_SEGMENT_TILES,) + shape))
+            self._free.extend(range(base + SCRATCH_SEGMENT_TILES - 1, base - 1, -1))
+        return self._free.pop()
+
+    def _evict(self) -> None:
+        if self._budget is None or not self._tile_bytes:
+            return
+        # The most recently used tile always stays, whatever the budget
+        keep = max(1, self._budget // self._tile_bytes)
+        while len(self._resident) > keep:
+            serial, _ = self._resident.popitem(last=False)
+            tile = self._refs[serial]()
+            if tile is None or tile.resident_pixels is None:
+                continue
+            if tile.compressed is not None:
+                # The blob already holds the pixels
+                tile.resident_pixels = None
+                continue
+            slot = self._slots.get(serial)
+            if slot is None or tile.dirty:
+                if slot is None:
+                    slot = self._allocate_slot(tile.resident_pixels.shape)
+                    self._slots[serial] = slot
+                segment = self._segments[slot // SCRATCH_SEGMENT_TILES]
+                segment[slot % SCRATCH_SEGMENT_TILES] = tile.resident_pixels
+                tile.dirty = False
+            tile.resident_pixels = None
+
+
+_pager = TilePager()
+
+
+def tile_pager() -> TilePager:
+    return _pager
+
+
+def next_serial() -> int:
+    return next(_serials)
+
+
+def _compression_pool() -> ThreadPoolExecutor:
+    # One background thread, like thumbnails: never competes with the raster pool
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="msp-compress")
+    return _executor
+
+
+def _encode(jobs: List[Tuple[Tile, np.ndarray, int]]) -> List[Tuple[Tile, np.ndarray, int, bytes]]:
+    return [(tile, pixels, version, zlib.compress(pixels, COMPRESS_LEVEL)) for tile, pixels, version in jobs]
+
+
+class CompressionService(QObject):
+    """
+    Compresses tiles on a background thread; results are committed on the
+    GUI thread, where every edit runs, so a tile written while its job was
+    in flight is recognized by its version and left alone.
+    """
+
+    finished = Signal()
+    _encoded = Signal(object)
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self._busy = False
+        self._encoded.connect(self._commit)
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def request(self, tiles: Iterable[Tile]) -> None:
+        """Queues ``tiles`` for compression unless a batch is still running. Call on the GUI thread."""
+        if self._busy:
+            return
+        jobs = tile_pager().compression_jobs(tiles)
+        if not jobs:
+            self.finished.emit()
+            return
+        self._busy = True
+
+        def done(future: Future) -> None:
+            self._encoded.emit([] if future.exception() is not None else future.result())
+
+        _compression_pool().submit(_encode, jobs).add_done_callback(done)
+
+    def _commit(self, results: List[Tuple[Tile, np.ndarray, int, bytes]]) -> None:
+        tile_pager().commit_compressed(results)
+        self._busy = False
+        self.finished.emit()
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import math
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, Optional, Tuple, TypeVar
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+# ARGB32 pixels are stored as native-endian 32-bit words: BGRA byte order on
+# little-endian machines, ARGB on big-endian ones.
+ALPHA_CHANNEL = 3 if sys.byteorder == "little" else 0
+GRAY_CHANNELS = slice(0, 3) if sys.byteorder == "little" else slice(1, 4)
+RGB_CHANNELS = (2, 1, 0) if sys.byteorder == "little" else (1, 2, 3)
+
+TILE_SIZE = 256
+
+WORKER_COUNT = max(1, min(8, os.cpu_count() or 1))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+Rect = Tuple[int, int, int, int]
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+def worker_pool() -> ThreadPoolExecutor:
+    """Shared pool for tile jobs; NumPy releases the GIL on large array ops."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKER_COUNT, thread_name_prefix="msp-raster")
+    return _executor
+
+
+def ordered_map(job: Callable[[_T], _R], items: Iterable[_T]) -> Iterator[_R]:
+    """
+    ``job`` over ``items`` on the worker pool, yielding results in order. Only
+    a pool's worth of jobs runs ahead of the consumer, so results never pile
+    up however many items there are.
+    """
+    limit = max(2, WORKER_COUNT)
+    pending: Deque[Future] = deque()
+    for item in items:
+        pending.append(worker_pool().submit(job, item))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def image_array(image: QImage) -> np.ndarray:
+    """Writable (h, w, 4) uint8 view over an ARGB32 image's pixels (detaches shared data)."""
+    width, height = image.width(), image.height()
+    raw = np.frombuffer(image.bits(), dtype=np.uint8)
+    return raw.reshape(height, image.bytesPerLine())[:, :width * 4].reshape(height, width, 4)
+
+
+def const_image_array(image: QImage) -> np.ndarray:
+    """Read-only view; does not detach implicitly shared images."""
+    width, height = image.width(), image.height()
+    raw = np.frombuffer(image.constBits(), dtype=np.uint8)
+    return raw.reshape(height, image.bytesPerLine())[:, :width * 4].reshape(height, width, 4)
+
+
+def intersect_rects(a: Rect, b: Rect) -> Optional[Rect]:
+    x0 = max(a[0], b[0])
+    y0 = max(a[1], b[1])
+    x1 = min(a[0] + a[2], b[0] + b[2])
+    y1 = min(a[1] + a[3], b[1] + b[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def iter_tiles(rect: Rect, tile: int = TILE_SIZE) -> Iterator[Rect]:
+    x0, y0, w, h = rect
+    for ty in range(y0, y0 + h, tile):
+        for tx in range(x0, x0 + w, tile):
+            yield tx, ty, min(tile, x0 + w - tx), min(tile, y0 + h - ty)
+
+
+def run_tiled(rect: Rect, job: Callable[[Rect], None], tile: int = TILE_SIZE, parallel: bool = True) -> None:
+    tiles = list(iter_tiles(rect, tile))
+    if not parallel or len(tiles) < 2:
+        for t in tiles:
+            job(t)
+        return
+    # list() re-raises the first worker exception on the calling thread
+    list(worker_pool().map(job, tiles))
+
+
+def gradient_parameter(
+    linear: bool,
+    start: Tuple[float, float],
+    end: Tuple[float, float],
+    rect: Rect,
+    reflect: bool,
+) -> np.ndarray:
+    """Gradient position t for each pixel centre in ``rect`` with pad or reflect spread."""
+    x0, y0, w, h = rect
+    xs = np.arange(x0, x0 + w, dtype=np.float64) + 0.5 - start[0]
+    ys = np.arange(y0, y0 + h, dtype=np.float64) + 0.5 - start[1]
+    dx = end[0] - start[0]
+    dy = end[1] - start[1]
+    if linear:
+        inv = 1.0 / (dx * dx + dy * dy)
+        t = (ys[:, None] * (dy * inv)) + (xs[None, :] * (dx * inv))
+    else:
+        t = np.hypot(ys[:, None], xs[None, :]) * (1.0 / math.hypot(dx, dy))
+    if reflect:
+        t = np.abs(t)
+        t = np.mod(t, 2.0)
+        t = np.where(t > 1.0, 2.0 - t, t)
+    else:
+        t = np.clip(t, 0.0, 1.0)
+    return t
+
+
+def rasterize_gradient(
+    pixels: np.ndarray,
+    linear: bool,
+    start: Tuple[float, float],
+    end: Tuple[float, float],
+    start_value: int,
+    end_value: int,
+    reflect: bool = False,
+    mask: Optional[np.ndarray] = None,
+    origin: Tuple[int, int] = (0, 0),
+    parallel: bool = True,
+) -> None:
+    """
+    Writes an opaque gray gradient into ``pixels``, a region whose top-left
+    pixel sits at canvas position ``origin``. Values are computed in float64
+    and rounded half-up, so results are identical on every platform.
+    ``mask`` (shaped like the region) limits writes.
+    """
+    height, width = pixels.shape[:2]
+    ox, oy = origin
+    length = math.hypot(end[0] - start[0], end[1] - start[1])
+    degenerate = length < 1e-3
+    span = float(end_value - start_value)
+
+    def job(tile: Rect) -> None:
+        tx, ty, tw, th = tile
+        sel = None
+        if mask is not None:
+            sel = mask[ty:ty + th, tx:tx + tw]
+            if not sel.any():
+                return
+        if degenerate:
+            values = np.full((th, tw), start_value, dtype=np.uint8)
+        else:
+            t = gradient_parameter(linear, start, end, (tx + ox, ty + oy, tw, th), reflect)
+            values = np.floor(start_value + span * t + 0.5).astype(np.uint8)
+        write_gray(pixels[ty:ty + th, tx:tx + tw], values, sel)
+
+    run_tiled((0, 0, width, height), job, parallel=parallel)
+
+
+def write_gray(pixels: np.ndarray, values, mask: Optional[np.ndarray] = None) -> None:
+    """Stores opaque gray ``values`` (scalar or array) into a BGRA view, optionally masked."""
+    if mask is None:
+        pixels[..., GRAY_CHANNELS] = np.asarray(values, dtype=np.uint8)[..., None]
+        pixels[..., ALPHA_CHANNEL] = 255
+        return
+    sel = mask.astype(bool, copy=False)
+    values = np.broadcast_to(np.asarray(values, dtype=np.uint8), sel.shape)
+    pixels[..., ALPHA_CHANNEL][sel] = 255
+    pixels[..., GRAY_CHANNELS][sel] = values[sel][:, None]
+
+
+def gray_values(pixels: np.ndarray) -> np.ndarray:
+    """Unpremultiplied gray level (red channel) per pixel, as QColor.red() reports it."""
+    red = pixels[..., RGB_CHANNELS[0]].astype(np.uint32)
+    alpha = pixels[..., ALPHA_CHANNEL].astype(np.uint32)
+    safe = np.maximum(alpha, 1)
+    out = np.minimum((red * 255 + safe // 2) // safe, 255)
+    out[alpha == 0] = 0
+    return out.astype(np.uint8)
+
+
+def premultiply(values: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+    """round(values * alpha / 255) without floating point."""
+    t = values.astype(np.uint32) * alpha.astype(np.uint32) + 128
+    return ((t + (t >> 8)) >> 8).astype(np.uint8)
+
+
+def gray_pixels(gray: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+    """(h, w, 4) premultiplied pixels from premultiplied gray and alpha planes (uint8, gray <= alpha)."""
+    words = gray.astype(np.uint32)
+    # ARGB32 pixels are native 0xAARRGGBB words, whatever the byte order
+    words *= 0x010101
+    words |= alpha.astype(np.uint32) << 24
+    return words.view(np.uint8).reshape(words.shape + (4,))
+
+
+def match_values(pixels: np.ndarray, seed_val: int, seed_alpha: int, threshold: int) -> np.ndarray:
+    """Fill tolerance test: transparent seeds match transparent pixels, others compare gray levels."""
+    alpha = pixels[..., ALPHA_CHANNEL]
+    if seed_alpha == 0:
+        return alpha == 0
+    diff = np.abs(gray_values(pixels).astype(np.int16) - int(seed_val))
+    return (alpha != 0) & (diff <= threshold)
+
+
+def _run_end(row: np.ndarray) -> int:
+    """Length of the leading run of True values."""
+    if row.all():
+        return len(row)
+    return int(np.argmin(row))
+
+
+def flood_region(match: np.ndarray, x: int, y: int) -> np.ndarray:
+    """4-connected region of ``match`` containing (x, y), filled span by span."""
+    height = match.shape[0]
+    region = np.zeros(match.shape, dtype=bool)
+    if not match[y, x]:
+        return region
+    stack = [(x, y)]
+    while stack:
+        sx, sy = stack.pop()
+        if region[sy, sx]:
+            continue
+        row = match[sy]
+        left = sx - _run_end(row[sx::-1]) + 1
+        right = sx + _run_end(row[sx:])
+        region[sy, left:right] = True
+        for ny in (sy - 1, sy + 1):
+            if ny < 0 or ny >= height:
+                continue
+            open_px = match[ny, left:right] & ~region[ny, left:right]
+            if not open_px.any():
+                continue
+            edges = np.diff(open_px.astype(np.int8), prepend=0)
+            stack.extend((left + int(s), ny) for s in np.flatnonzero(edges == 1))
+    return region
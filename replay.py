@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from journal import CallOp, GestureOp, Operation, read_journal, read_session
+
+if TYPE_CHECKING:
+    from backend import PainterBackend
+
+# Time between script gesture points that carry no timestamp.
+SCRIPT_INTERVAL_MS = 16.0
+
+
+def _script_operation(entry: Dict[str, Any]) -> Operation:
+    if "call" in entry:
+        return CallOp(str(entry["call"]), tuple(entry.get("args", ())))
+    if "gesture" in entry:
+        rows = entry.get("points", [])
+        points = np.zeros((len(rows), 3), dtype=np.float64)
+        for idx, row in enumerate(rows):
+            points[idx, 0] = float(row[0])
+            points[idx, 1] = float(row[1])
+            points[idx, 2] = float(row[2]) if len(row) > 2 else idx * SCRIPT_INTERVAL_MS
+        return GestureOp(dict(entry["gesture"]), points)
+    raise ValueError(f"script entry needs 'call' or 'gesture': {entry!r}")
+
+
+def load_operations(path: str) -> List[Operation]:
+    """
+    Operations of a binary session journal or of a JSON script: a list of
+    ``{"call": "setLayerOpacity", "args": [1, 0.5]}`` slot calls and
+    ``{"gesture": {"toolMode": "brush", ...}, "points": [[x, y, ms], ...]}``
+    input sequences. Point times are optional (spaced SCRIPT_INTERVAL_MS
+    apart); settings a gesture leaves out keep their current value.
+    """
+    journal_id, ops, _ = read_journal(path)
+    if journal_id is not None:
+        return ops
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError("a replay script is a JSON list of operations")
+    return [_script_operation(entry) for entry in entries]
+
+
+def save_operations(ops: Sequence[Operation], path: str) -> None:
+    """Writes operations as a JSON script, e.g. to attach a journal to a bug report."""
+    entries: List[Dict[str, Any]] = []
+    for op in ops:
+        if isinstance(op, CallOp):
+            entries.append({"call": op.name, "args": list(op.args)})
+        else:
+            entries.append({"gesture": op.settings, "points": op.points.tolist()})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=1)
+
+
+def operation_kind(op: Operation) -> str:
+    """Grouping key for timings: the slot name, or ``gesture:<toolMode>``."""
+    if isinstance(op, CallOp):
+        return op.name
+    return f"gesture:{op.settings.get('toolMode', '?')}"
+
+
+@dataclass
+class ReplayStats:
+    operations: int = 0
+    seconds: float = 0.0
+    # kind -> (count, seconds)
+    by_kind: Dict[str, Tuple[int, float]] = field(default_factory=dict)
+
+    def add(self, kind: str, seconds: float) -> None:
+        count, total = self.by_kind.get(kind, (0, 0.0))
+        self.by_kind[kind] = (count + 1, total + seconds)
+        self.operations += 1
+        self.seconds += seconds
+
+    def summary(self) -> str:
+        rate = self.operations / self.seconds if self.seconds > 0 else float("inf")
+        lines = [f"{self.operations} operations in {self.seconds * 1000.0:.1f} ms ({rate:.1f} ops/s)"]
+        for kind, (count, total) in sorted(self.by_kind.items(), key=lambda item: -item[1][1]):
+            lines.append(f"  {kind:<28} {count:>6}  {total * 1000.0:>10.1f} ms  {total * 1000.0 / count:>8.2f} ms/op")
+        return "\n".join(lines)
+
+
+def replay(backend: PainterBackend, ops: Sequence[Operation], record: bool = False) -> ReplayStats:
+    """
+    Runs ``ops`` on ``backend`` back to back, with no event loop or repaint in
+    between, and times each one. With ``record`` the operations are journaled
+    like live edits (macro playback); otherwise they are not.
+    """
+    stats = ReplayStats()
+    clock = [time.perf_counter()]
+
+    def step(op: Operation) -> None:
+        now = time.perf_counter()
+        stats.add(operation_kind(op), now - clock[0])
+        clock[0] = now
+
+    backend._replay_operations(ops, record=record, step=step)
+    return stats
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded or scripted operations headless.")
+    parser.add_argument("script", nargs="?", help="JSON script or journal.bin")
+    parser.add_argument("--session", help="recovery directory: its checkpoint is the base, its journal the script")
+    parser.add_argument("--project", help="project file to start from (default: blank canvas)")
+    parser.add_argument("--size", default="", help="blank canvas size as WxH")
+    parser.add_argument("--repeat", type=int, default=1, help="runs from the same base document, for benchmarking")
+    parser.add_argument("--output", help="PNG of the final composite")
+    args = parser.parse_args(argv)
+    if not args.script and not args.session:
+        parser.error("a script or --session is required")
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtGui import QGuiApplication
+
+    from backend import PainterBackend
+
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+    base: Optional[dict] = None
+    ops: List[Operation] = []
+    if args.session:
+        session = read_session(args.session)
+        if session is None:
+            print(f"No session in {args.session}")
+            return 1
+        base, ops = session
+    if args.script:
+        ops = load_operations(args.script)
+
+    backend: Optional[PainterBackend] = None
+    for run in range(max(1, args.repeat)):
+        backend = PainterBackend()
+        if base is not None:
+            backend._load_checkpoint(base)
+        elif args.project:
+            if not backend.loadProject(args.project):
+                return 1
+        elif args.size:
+            width, height = (int(v) for v in args.size.lower().split("x"))
+            backend.newCanvas(width, height)
+        stats = replay(backend, ops)
+        print(f"run {run + 1}: {stats.summary()}")
+
+    if args.output and backend is not None and not backend.exportPng(args.output):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
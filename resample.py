@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import math
+from enum import Enum
+from typing import Optional, Tuple
+
+import numpy as np
+
+from raster import ALPHA_CHANNEL, GRAY_CHANNELS, WORKER_COUNT, Rect, worker_pool
+from tiles import TILE_SIZE, TileBuffer
+
+LANCZOS_LOBES = 3
+# Source columns read per strip of output columns when downscaling.
+RESAMPLE_STRIP_PIXELS = 1024
+# Upper bound on the working memory of resampling jobs running at once.
+RESAMPLE_INFLIGHT_BYTES = 256 << 20
+
+
+class ResampleFilter(str, Enum):
+    BOX = "box"
+    LANCZOS = "lanczos"
+    AREA = "area"
+
+
+def _lanczos(x: np.ndarray) -> np.ndarray:
+    out = np.sinc(x) * np.sinc(x / LANCZOS_LOBES)
+    out[np.abs(x) >= LANCZOS_LOBES] = 0.0
+    return out
+
+
+def _box(x: np.ndarray) -> np.ndarray:
+    return ((x >= -0.5) & (x < 0.5)).astype(np.float64)
+
+
+_KERNELS: dict = {
+    ResampleFilter.BOX: (_box, 0.5),
+    ResampleFilter.LANCZOS: (_lanczos, float(LANCZOS_LOBES)),
+}
+
+
+def filter_weights(src_size: int, dst_size: int, method: ResampleFilter) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per output sample, the source indices (edge-clamped) and normalized
+    weights as two (dst_size, taps) arrays. Kernels widen by the reduction
+    factor when downsampling; ``AREA`` weighs each source pixel by its exact
+    overlap with the output pixel's footprint.
+    """
+    scale = src_size / dst_size
+    centers = (np.arange(dst_size, dtype=np.float64) + 0.5) * scale
+    if method == ResampleFilter.AREA:
+        half = 0.5 * scale
+        support = half
+    else:
+        kernel, radius = _KERNELS[method]
+        stretch = max(scale, 1.0)
+        support = radius * stretch
+    taps = int(math.ceil(support * 2.0)) + 2
+    first = np.floor(centers - support).astype(np.int64)
+    index = first[:, None] + np.arange(taps)[None, :]
+    if method == ResampleFilter.AREA:
+        lo = np.maximum(index, centers[:, None] - half)
+        hi = np.minimum(index + 1, centers[:, None] + half)
+        weights = np.maximum(hi - lo, 0.0)
+    else:
+        weights = kernel((index + 0.5 - centers[:, None]) / stretch)
+    total = weights.sum(axis=1, keepdims=True)
+    weights /= np.where(total == 0.0, 1.0, total)
+    return np.clip(index, 0, src_size - 1), weights
+
+
+def _resample_rows(src: np.ndarray, index: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Applies (index, weights) along axis 0 of ``src``, one tap at a time to bound memory."""
+    out = np.zeros((index.shape[0],) + src.shape[1:], dtype=np.float32)
+    for k in range(index.shape[1]):
+        w = weights[:, k]
+        if not w.any():
+            continue
+        out += w.reshape((-1,) + (1,) * (src.ndim - 1)) * src[index[:, k]]
+    return out
+
+
+def _to_pixels(values: np.ndarray) -> np.ndarray:
+    """Rounds filtered premultiplied values back to uint8, keeping color <= alpha."""
+    out = np.clip(np.floor(values + 0.5), 0.0, 255.0).astype(np.uint8)
+    # Lanczos overshoot can push color above alpha, which is invalid premultiplied
+    alpha = out[..., ALPHA_CHANNEL:ALPHA_CHANNEL + 1]
+    np.minimum(out[..., GRAY_CHANNELS], alpha, out=out[..., GRAY_CHANNELS])
+    return out
+
+
+def _strip_width(src_size: int, dst_size: int) -> int:
+    """Output columns per strip, so a strip reads about RESAMPLE_STRIP_PIXELS source columns whatever the scale."""
+    scale = max(src_size / dst_size, 1.0)
+    width = max(1, int(RESAMPLE_STRIP_PIXELS / scale))
+    if width >= TILE_SIZE:
+        # Whole tiles, so strips write their output tiles in one piece
+        width -= width % TILE_SIZE
+    return min(width, dst_size)
+
+
+def resample_buffer(
+    source: TileBuffer,
+    src_rect: Rect,
+    dst_size: Tuple[int, int],
+    method: ResampleFilter,
+    parallel: bool = True,
+) -> TileBuffer:
+    """
+    Scales ``src_rect`` of ``source`` into a new buffer of ``dst_size`` at the
+    canvas origin. Output is produced in blocks of TILE_SIZE rows by a strip
+    of columns; each block streams the source rows its vertical taps need a
+    tile row at a time, filtering each chunk horizontally into a float
+    accumulator for the block. Strips are sized in source columns, so a job
+    holds a few megabytes whatever the scale factor, and jobs in flight are
+    bounded by RESAMPLE_INFLIGHT_BYTES: the working set never approaches a
+    second full-size image.
+    """
+    sx, sy, sw, sh = src_rect
+    dw, dh = dst_size
+    col_index, col_weights = filter_weights(sw, dw, method)
+    row_index, row_weights = filter_weights(sh, dh, method)
+    col_weights = col_weights.astype(np.float32)
+    row_weights = row_weights.astype(np.float32)
+    out = TileBuffer()
+
+    def block(job: Tuple[int, int, int, int]) -> Tuple[Rect, Optional[np.ndarray]]:
+        y0, y1, x0, x1 = job
+        rect = (x0, y0, x1 - x0, y1 - y0)
+        rows, weights = row_index[y0:y1], row_weights[y0:y1]
+        cols = col_index[x0:x1]
+        lo, hi = int(rows.min()), int(rows.max()) + 1
+        clo, chi = int(cols.min()), int(cols.max()) + 1
+        if not any(True for _ in source.tiles_in((sx + clo, sy + lo, chi - clo, hi - lo))):
+            return rect, None
+        acc = np.zeros((y1 - y0, x1 - x0, 4), dtype=np.float32)
+        r0 = lo
+        while r0 < hi:
+            # Chunks end on source tile rows, so each reads whole tiles
+            r1 = min(hi, (sy + r0) // TILE_SIZE * TILE_SIZE + TILE_SIZE - sy)
+            area = (sx + clo, sy + r0, chi - clo, r1 - r0)
+            if any(True for _ in source.tiles_in(area)):
+                src = source.read(area)
+                # Horizontal pass on the transposed view so both passes filter axis 0
+                horizontal = _resample_rows(src.swapaxes(0, 1), cols - clo, col_weights[x0:x1]).swapaxes(0, 1)
+                for k in range(rows.shape[1]):
+                    # Tap k's source row grows with the output row: the rows
+                    # it takes from this chunk are a contiguous run.
+                    first, last = np.searchsorted(rows[:, k], (r0, r1))
+                    if first < last:
+                        acc[first:last] += weights[first:last, k, None, None] * horizontal[rows[first:last, k] - r0]
+            r0 = r1
+        return rect, _to_pixels(acc)
+
+    def store(result: Tuple[Rect, Optional[np.ndarray]]) -> None:
+        rect, pixels = result
+        if pixels is not None:
+            out.write(rect, pixels)
+
+    strip = _strip_width(sw, dw)
+    jobs = [
+        (y, min(dh, y + TILE_SIZE), x, min(dw, x + strip))
+        for y in range(0, dh, TILE_SIZE)
+        for x in range(0, dw, strip)
+    ]
+    if not parallel or len(jobs) < 2:
+        for job in jobs:
+            store(block(job))
+        return out
+    # Per job: a source chunk, its horizontal pass and the accumulator (float32)
+    source_cols = min(sw, int(strip * max(sw / dw, 1.0)) + col_index.shape[1])
+    job_bytes = TILE_SIZE * (source_cols * 4 + strip * 16 * 2)
+    # Jobs are submitted at most a budget's worth at a time and stored by this
+    # thread as they finish, so finished blocks never pile up in memory.
+    chunk = max(1, min(max(2, WORKER_COUNT), RESAMPLE_INFLIGHT_BYTES // job_bytes))
+    for start in range(0, len(jobs), chunk):
+        for result in worker_pool().map(block, jobs[start:start + chunk]):
+            store(result)
+    return out
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from PySide6.QtCore import QPointF, Qt
+from PySide6.QtGui import QColor, QImage, QPainter, QPolygonF
+
+from raster import ALPHA_CHANNEL, RGB_CHANNELS, Rect, image_array, intersect_rects
+
+
+class Selection:
+    """
+    8-bit coverage mask (0 = unselected, 255 = selected) stored cropped to its
+    bounding box, so masked operations only ever touch that box.
+    """
+
+    def __init__(self, canvas_width: int, canvas_height: int) -> None:
+        self._canvas = (0, 0, canvas_width, canvas_height)
+        self._origin: Tuple[int, int] = (0, 0)
+        self._mask: Optional[np.ndarray] = None
+
+    # --- Construction ---
+
+    @classmethod
+    def from_mask(cls, canvas_width: int, canvas_height: int, mask: np.ndarray, origin: Tuple[int, int] = (0, 0)) -> "Selection":
+        sel = cls(canvas_width, canvas_height)
+        sel._assign(mask, origin)
+        return sel
+
+    @classmethod
+    def from_rect(cls, canvas_width: int, canvas_height: int, rect: Rect) -> "Selection":
+        sel = cls(canvas_width, canvas_height)
+        clipped = intersect_rects(rect, sel._canvas)
+        if clipped is not None:
+            sel._origin = (clipped[0], clipped[1])
+            sel._mask = np.full((clipped[3], clipped[2]), 255, dtype=np.uint8)
+        return sel
+
+    @classmethod
+    def from_polygon(cls, canvas_width: int, canvas_height: int, points: Sequence[Tuple[float, float]]) -> "Selection":
+        sel = cls(canvas_width, canvas_height)
+        if len(points) < 3:
+            return sel
+        x0 = int(np.floor(min(p[0] for p in points)))
+        y0 = int(np.floor(min(p[1] for p in points)))
+        x1 = int(np.ceil(max(p[0] for p in points))) + 1
+        y1 = int(np.ceil(max(p[1] for p in points))) + 1
+        bounds = intersect_rects((x0, y0, x1 - x0, y1 - y0), sel._canvas)
+        if bounds is None:
+            return sel
+        bx, by, bw, bh = bounds
+        # Rasterize through QPainter so lasso edges get antialiased coverage
+        image = QImage(bw, bh, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(255, 255, 255, 255))
+        painter.translate(-bx, -by)
+        painter.drawPolygon(QPolygonF([QPointF(x, y) for x, y in points]))
+        painter.end()
+        sel._assign(image_array(image)[..., ALPHA_CHANNEL].copy(), (bx, by))
+        return sel
+
+    def _assign(self, mask: np.ndarray, origin: Tuple[int, int]) -> None:
+        rows = np.flatnonzero(mask.any(axis=1))
+        if rows.size == 0:
+            self._mask = None
+            self._origin = (0, 0)
+            return
+        cols = np.flatnonzero(mask.any(axis=0))
+        y0, y1 = int(rows[0]), int(rows[-1]) + 1
+        x0, x1 = int(cols[0]), int(cols[-1]) + 1
+        self._mask = np.ascontiguousarray(mask[y0:y1, x0:x1], dtype=np.uint8)
+        self._origin = (origin[0] + x0, origin[1] + y0)
+
+    # --- Queries ---
+
+    @property
+    def is_empty(self) -> bool:
+        return self._mask is None
+
+    @property
+    def bounds(self) -> Optional[Rect]:
+        if self._mask is None:
+            return None
+        h, w = self._mask.shape
+        return self._origin[0], self._origin[1], w, h
+
+    def clip(self, rect: Rect) -> Optional[Rect]:
+        """Intersection of ``rect`` with the selection bounding box."""
+        bounds = self.bounds
+        if bounds is None:
+            return None
+        return intersect_rects(rect, bounds)
+
+    def mask_for(self, rect: Rect) -> np.ndarray:
+        """Coverage for ``rect`` in canvas coordinates; zero outside the selection."""
+        x, y, w, h = rect
+        out = np.zeros((h, w), dtype=np.uint8)
+        bounds = self.bounds
+        if bounds is None:
+            return out
+        inter = intersect_rects(rect, bounds)
+        if inter is None:
+            return out
+        ix, iy, iw, ih = inter
+        ox, oy = self._origin
+        out[iy - y:iy - y + ih, ix - x:ix - x + iw] = self._mask[iy - oy:iy - oy + ih, ix - ox:ix - ox + iw]
+        return out
+
+    def inverted(self) -> "Selection":
+        _, _, cw, ch = self._canvas
+        full = np.full((ch, cw), 255, dtype=np.uint8)
+        full -= self.mask_for(self._canvas)
+        return Selection.from_mask(cw, ch, full)
+
+    def overlay(self, color: QColor) -> Optional[QImage]:
+        """Tinted preview image covering the bounding box."""
+        if self._mask is None:
+            return None
+        h, w = self._mask.shape
+        image = QImage(w, h, QImage.Format_ARGB32_Premultiplied)
+        pixels = image_array(image)
+        alpha = self._mask.astype(np.uint16) * color.alpha() // 255
+        for channel, value in zip(RGB_CHANNELS, (color.red(), color.green(), color.blue())):
+            pixels[..., channel] = (alpha * value // 255).astype(np.uint8)
+        pixels[..., ALPHA_CHANNEL] = alpha.astype(np.uint8)
+        return image
+
+
+def blend_masked(region: np.ndarray, original: np.ndarray, coverage: np.ndarray) -> None:
+    """Keeps ``region`` only where selected: region = original + (region - original) * coverage."""
+    if (coverage == 255).all():
+        return
+    weight = coverage.astype(np.uint32)[..., None]
+    mixed = (region.astype(np.uint32) * weight + original.astype(np.uint32) * (255 - weight) + 127) // 255
+    region[...] = mixed.astype(np.uint8)
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+from PySide6.QtCore import QPointF
+from PySide6.QtGui import QPolygonF
+
+
+def simplify_polyline(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Ramer-Douglas-Peucker on an (N, D) array. Returns a boolean keep mask.
+    Extra columns (e.g. scaled time) take part in the error metric, so
+    pauses and speed changes survive simplification.
+    """
+    count = len(points)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    keep[0] = True
+    keep[-1] = True
+    if count < 3 or tolerance <= 0.0:
+        keep[:] = True
+        return keep
+
+    tol_sq = tolerance * tolerance
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a = points[first]
+        seg = points[last] - a
+        rel = points[first + 1:last] - a
+        seg_len_sq = float(np.dot(seg, seg))
+        if seg_len_sq <= 1e-12:
+            dist_sq = np.einsum("ij,ij->i", rel, rel)
+        else:
+            proj = np.clip(rel @ seg / seg_len_sq, 0.0, 1.0)
+            off = rel - proj[:, None] * seg
+            dist_sq = np.einsum("ij,ij->i", off, off)
+        worst = int(np.argmax(dist_sq))
+        if dist_sq[worst] > tol_sq:
+            split = first + 1 + worst
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+class StrokePath:
+    """
+    Growable float64 storage for a captured stroke (x, y, timestamp ms).
+    Keeps a QPolygonF mirror for the on-canvas preview and simplifies itself
+    once it grows past ``max_points`` so long strokes stay bounded.
+    """
+
+    INITIAL_CAPACITY = 256
+    MAX_POINTS = 4096
+    # Pixels of allowed deviation per millisecond of timing error when
+    # simplifying; keeps the time parameterization within ~tolerance.
+    TIME_TOLERANCE_MS = 8.0
+
+    def __init__(self, tolerance: float = 0.35, max_points: int = MAX_POINTS) -> None:
+        self._data = np.empty((self.INITIAL_CAPACITY, 3), dtype=np.float64)
+        self._count = 0
+        self._base_tolerance = tolerance
+        # Raised by _reduce for the rest of the current stroke only
+        self._tolerance = tolerance
+        self._max_points = max(16, int(max_points))
+        self._preview = QPolygonF()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __bool__(self) -> bool:
+        return self._count > 0
+
+    @property
+    def points(self) -> np.ndarray:
+        return self._data[:self._count, :2]
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._data[:self._count, 2]
+
+    @property
+    def preview(self) -> QPolygonF:
+        return self._preview
+
+    def first(self) -> Optional[QPointF]:
+        if not self._count:
+            return None
+        return QPointF(self._data[0, 0], self._data[0, 1])
+
+    def last(self) -> Optional[QPointF]:
+        if not self._count:
+            return None
+        idx = self._count - 1
+        return QPointF(self._data[idx, 0], self._data[idx, 1])
+
+    def clear(self) -> None:
+        self._count = 0
+        self._tolerance = self._base_tolerance
+        self._preview = QPolygonF()
+
+    def reset(self, x: float, y: float, t: float) -> None:
+        self.clear()
+        self.append(x, y, t)
+
+    def append(self, x: float, y: float, t: float) -> None:
+        if self._count == len(self._data):
+            grown = np.empty((len(self._data) * 2, 3), dtype=np.float64)
+            grown[:self._count] = self._data[:self._count]
+            self._data = grown
+        self._data[self._count] = (x, y, t)
+        self._count += 1
+        self._preview.append(QPointF(x, y))
+        if self._count > self._max_points:
+            self._reduce()
+
+    def simplify(self, tolerance: Optional[float] = None) -> None:
+        """Drop points that lie within ``tolerance`` px of the simplified path."""
+        if self._count < 3:
+            return
+        tol = self._tolerance if tolerance is None else tolerance
+        keep = simplify_polyline(self._weighted(tol), tol)
+        kept = self._data[:self._count][keep]
+        self._count = len(kept)
+        self._data[:self._count] = kept
+        self._rebuild_preview()
+
+    def _weighted(self, tolerance: float) -> np.ndarray:
+        view = self._data[:self._count].copy()
+        view[:, 2] -= view[0, 2]
+        view[:, 2] *= tolerance / self.TIME_TOLERANCE_MS
+        return view
+
+    def _reduce(self) -> None:
+        tol = self._tolerance
+        while self._count > self._max_points // 2:
+            self.simplify(tol)
+            tol *= 2.0
+        self._tolerance = max(self._tolerance, tol * 0.5)
+
+    def _rebuild_preview(self) -> None:
+        self._preview = QPolygonF([QPointF(x, y) for x, y in self._data[:self._count, :2]])
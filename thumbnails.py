@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+from PySide6.QtCore import QObject, QSize, Qt, Signal
+from PySide6.QtGui import QImage
+from PySide6.QtQuick import QQuickImageProvider
+
+from raster import image_array
+from tiles import TileBuffer
+
+# Longest side of a layer thumbnail, in pixels.
+THUMBNAIL_SIZE = 64
+# Thumbnails kept in memory (about 16 KB each at full size).
+THUMBNAIL_CACHE_SIZE = 512
+# Host name of the QML image provider: image://layers/<key>
+PROVIDER_ID = "layers"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_cache: Optional["ThumbnailCache"] = None
+
+
+def thumbnail_key(generation: int, width: int, height: int) -> str:
+    return f"{generation}-{width}x{height}"
+
+
+def thumbnail_url(key: str) -> str:
+    return f"image://{PROVIDER_ID}/{key}"
+
+
+def _thumbnail_pool() -> ThreadPoolExecutor:
+    # One background thread: previews are low priority and must not compete
+    # with the raster pool used by interactive tools.
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="msp-thumbs")
+    return _executor
+
+
+def render_thumbnail(buffer: TileBuffer, width: int, height: int, size: int = THUMBNAIL_SIZE) -> QImage:
+    """
+    Area-averaged preview of the canvas-sized region of ``buffer``, built tile
+    by tile. Large layers are subsampled with a stride of a quarter thumbnail
+    pixel, so the cost depends on the thumbnail size rather than the layer's.
+    """
+    scale = min(1.0, size / max(width, height))
+    tw = max(1, round(width * scale))
+    th = max(1, round(height * scale))
+    step = max(1, int(1.0 / scale) // 4)
+
+    xs = np.arange(0, width, step)
+    ys = np.arange(0, height, step)
+    col_cell = xs * tw // width
+    row_cell = ys * th // height
+    counts = np.outer(np.bincount(row_cell, minlength=th), np.bincount(col_cell, minlength=tw))
+    sums = np.zeros((th, tw, 4), dtype=np.uint64)
+
+    for tx, ty, pixels, visible in buffer.tiles_in((0, 0, width, height)):
+        # Sample positions are a regular grid, so each tile's share is a strided slice
+        vx, vy, vw, vh = visible
+        c0, c1 = np.searchsorted(xs, (vx, vx + vw))
+        r0, r1 = np.searchsorted(ys, (vy, vy + vh))
+        if c1 <= c0 or r1 <= r0:
+            continue
+        block = pixels[ys[r0] - ty:ys[r1 - 1] - ty + 1:step, xs[c0] - tx:xs[c1 - 1] - tx + 1:step]
+        rows = row_cell[r0:r1]
+        cols = col_cell[c0:c1]
+        row_starts = np.flatnonzero(np.diff(rows, prepend=-1))
+        col_starts = np.flatnonzero(np.diff(cols, prepend=-1))
+        part = np.add.reduceat(np.add.reduceat(block.astype(np.uint32), row_starts, axis=0), col_starts, axis=1)
+        sums[rows[row_starts][:, None], cols[col_starts][None, :]] += part.astype(np.uint64)
+
+    image = QImage(tw, th, QImage.Format_ARGB32_Premultiplied)
+    total = counts[..., None].astype(np.uint64)
+    # Missing tiles add nothing, which averages them in as transparent
+    image_array(image)[...] = ((sums + total // 2) // np.maximum(total, 1)).astype(np.uint8)
+    return image
+
+
+class ThumbnailCache:
+    """Thread-safe LRU of rendered thumbnails keyed by ``thumbnail_key``."""
+
+    def __init__(self, capacity: int = THUMBNAIL_CACHE_SIZE) -> None:
+        self._capacity = capacity
+        self._images: "OrderedDict[str, QImage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[QImage]:
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key: str, image: QImage) -> None:
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self._capacity:
+                self._images.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._images.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._images
+
+
+def thumbnail_cache() -> ThumbnailCache:
+    """Cache shared by every backend and the QML image provider."""
+    global _cache
+    if _cache is None:
+        _cache = ThumbnailCache()
+    return _cache
+
+
+class ThumbnailService(QObject):
+    """Renders thumbnails on a background thread; ``ready`` fires on the GUI thread."""
+
+    ready = Signal(str)
+    _rendered = Signal(str, QImage)
+
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        # Buffer clones being rendered. Held here so the last reference (and
+        # the tile refcount release) is dropped on the GUI thread.
+        self._pending: Dict[str, TileBuffer] = {}
+        self._rendered.connect(self._finish)
+
+    def request(self, key: str, buffer: TileBuffer, width: int, height: int) -> None:
+        """Queues a render of ``buffer`` (pass a clone) unless it is cached or in flight."""
+        if key in self._pending or key in thumbnail_cache():
+            return
+        self._pending[key] = buffer
+
+        def done(future: Future) -> None:
+            image = QImage() if future.exception() is not None else future.result()
+            self._rendered.emit(key, image)
+
+        _thumbnail_pool().submit(render_thumbnail, buffer, width, height).add_done_callback(done)
+
+    def _finish(self, key: str, image: QImage) -> None:
+        self._pending.pop(key, None)
+        if image.isNull():
+            return
+        thumbnail_cache().put(key, image)
+        self.ready.emit(key)
+
+
+class ThumbnailProvider(QQuickImageProvider):
+    """Serves cached thumbnails to QML; never renders on the requesting thread."""
+
+    def __init__(self) -> None:
+        super().__init__(QQuickImageProvider.Image)
+
+    def requestImage(self, id: str, size: QSize, requested_size: QSize) -> QImage:
+        image = thumbnail_cache().get(id)
+        if image is None:
+            image = QImage(1, 1, QImage.Format_ARGB32_Premultiplied)
+            image.fill(Qt.transparent)
+            return image
+        if requested_size.isValid() and not requested_size.isEmpty():
+            return image.scaled(requested_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return image
@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import itertools
+import weakref
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+from paging import next_serial, tile_pager
+from raster import Rect, const_image_array, image_array, intersect_rects
+
+TILE_SIZE = 256
+
+TileKey = Tuple[int, int]
+
+# Process-wide, so a generation number identifies one pixel state of one buffer
+_generations = itertools.count(1)
+
+_FULL_TILE: Rect = (0, 0, TILE_SIZE, TILE_SIZE)
+
+
+class Tile:
+    """
+    One TILE_SIZE x TILE_SIZE premultiplied ARGB32 block; ``refs`` counts the
+    tables sharing it. The pixels may live only in a scratch file or a
+    compressed blob (see paging.py); ``pixels`` reads them back transparently.
+    """
+
+    __slots__ = ("resident_pixels", "refs", "serial", "dirty", "compressed", "version", "_content", "_content_version", "__weakref__")
+
+    def __init__(self, pixels: np.ndarray) -> None:
+        self.resident_pixels: Optional[np.ndarray] = pixels
+        self.refs = 1
+        self.serial = next_serial()
+        # Changed since last written to scratch (see paging.py)
+        self.dirty = True
+        self.compressed: Optional[bytes] = None
+        # Bumped on every write, so background compression can detect races
+        self.version = 0
+        self._content: Tuple[Optional[int], Optional[Rect]] = (None, None)
+        self._content_version = -1
+        tile_pager().track(self)
+
+    @property
+    def pixels(self) -> np.ndarray:
+        pixels = self.resident_pixels
+        if pixels is None:
+            return tile_pager().page_in(self)
+        tile_pager().touch(self)
+        return pixels
+
+    def content(self) -> Tuple[Optional[int], Optional[Rect]]:
+        """
+        (uniform, bounds): the packed ARGB32 value shared by every pixel, or
+        None, and the tile-local rect enclosing its non-zero pixels, or None
+        for an all-transparent tile. Computed on first use after each write.
+        """
+        version = self.version
+        if self._content_version != version:
+            self._content = _tile_content(self.pixels)
+            self._content_version = version
+        return self._content
+
+
+class _TileTable:
+    __slots__ = ("tiles", "clips", "refs")
+
+    def __init__(self, tiles: Optional[Dict[TileKey, Tile]] = None, clips: Optional[Dict[TileKey, Rect]] = None) -> None:
+        self.tiles: Dict[TileKey, Tile] = tiles if tiles is not None else {}
+        # Tile-local visible rect of partially cropped tiles; pixels outside it
+        # read as transparent and are cleared when the tile is next written.
+        self.clips: Dict[TileKey, Rect] = clips if clips is not None else {}
+        self.refs = 1
+
+
+def _release_table(table: _TileTable) -> None:
+    table.refs -= 1
+    if table.refs == 0:
+        for tile in table.tiles.values():
+            tile.refs -= 1
+
+
+def tile_image(pixels: np.ndarray) -> QImage:
+    """Zero-copy QImage over a tile; only valid while ``pixels`` is alive."""
+    return QImage(pixels.data, TILE_SIZE, TILE_SIZE, TILE_SIZE * 4, QImage.Format_ARGB32_Premultiplied)
+
+
+def _tile_span(start: int, length: int) -> range:
+    return range(start // TILE_SIZE, (start + length - 1) // TILE_SIZE + 1)
+
+
+def _tile_content(pixels: np.ndarray) -> Tuple[Optional[int], Optional[Rect]]:
+    values = pixels.view(np.uint32).reshape(pixels.shape[:2])
+    first = values[0, 0]
+    if (values == first).all():
+        return int(first), (_FULL_TILE if first else None)
+    rows = np.flatnonzero(values.any(axis=1))
+    cols = np.flatnonzero(values.any(axis=0))
+    return None, (int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1))
+
+
+def _clear_outside(pixels: np.ndarray, clip: Rect) -> None:
+    x, y, w, h = clip
+    pixels[:y] = 0
+    pixels[y + h:] = 0
+    pixels[y:y + h, :x] = 0
+    pixels[y:y + h, x + w:] = 0
+
+
+class TileBuffer:
+    """
+    Sparse, unbounded grid of copy-on-write pixel tiles. Missing tiles read as
+    transparent. ``clone()`` shares the whole tile table in O(1); the first
+    write copies the table (pointers only) and then each touched tile once.
+
+    All rects are in canvas coordinates; the grid itself sits at ``origin``,
+    so ``shift()`` and ``crop()`` reposition and trim a layer without
+    touching pixels.
+    """
+
+    def __init__(self) -> None:
+        self._set_table(_TileTable())
+        self._origin: Tuple[int, int] = (0, 0)
+        self._generation = next(_generations)
+        self._bounds: Optional[Rect] = None
+        self._bounds_generation = 0
+
+    def _set_table(self, table: _TileTable) -> None:
+        self._table = table
+        self._finalizer = weakref.finalize(self, _release_table, table)
+
+    # --- Sharing ---
+
+    def clone(self) -> "TileBuffer":
+        copy = TileBuffer.__new__(TileBuffer)
+        self._table.refs += 1
+        copy._set_table(self._table)
+        copy._origin = self._origin
+        copy._generation = self._generation
+        copy._bounds = self._bounds
+        copy._bounds_generation = self._bounds_generation
+        return copy
+
+    def _writable_table(self) -> _TileTable:
+        table = self._table
+        if table.refs > 1:
+            tiles = dict(table.tiles)
+            for tile in tiles.values():
+                tile.refs += 1
+            self._finalizer.detach()
+            _release_table(table)
+            self._set_table(_TileTable(tiles, dict(table.clips)))
+        return self._table
+
+    def _writable_tile(self, key: TileKey) -> np.ndarray:
+        table = self._writable_table()
+        tile = table.tiles.get(key)
+        clip = table.clips.pop(key, None)
+        if tile is None:
+            tile = Tile(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+            table.tiles[key] = tile
+        elif tile.refs > 1:
+            tile.refs -= 1
+            tile = Tile(tile.pixels.copy())
+            table.tiles[key] = tile
+        # The caller writes right away, while the tile is the most recently
+        # used and cannot be evicted
+        pixels = tile_pager().writable(tile)
+        if clip is not None:
+            # Materialize the crop before hidden pixels could become visible
+            _clear_outside(pixels, clip)
+        return pixels
+
+    # --- Queries ---
+
+    @property
+    def generation(self) -> int:
+        """Changes on every pixel write; clones share it until one of them is written."""
+        return self._generation
+
+    @property
+    def origin(self) -> Tuple[int, int]:
+        """Canvas position of the tile grid's (0, 0)."""
+        return self._origin
+
+    def tile_count(self) -> int:
+        return len(self._table.tiles)
+
+    def stored_tiles(self) -> List[Tile]:
+        """The tile objects of this buffer (shared with its clones), e.g. for memory policies."""
+        return list(self._table.tiles.values())
+
+    def tiles_in(self, rect: Rect) -> Iterator[Tuple[int, int, np.ndarray, Rect]]:
+        """
+        (x, y, pixels, visible) for every stored tile overlapping ``rect`` that
+        has content: the tile's canvas position, its pixels (read-only by
+        contract) and the canvas rect of its non-transparent part not hidden
+        by a crop. Pixels outside ``visible`` read as transparent.
+        """
+        for px, py, tile, visible in self._content_tiles(rect):
+            yield px, py, tile.pixels, visible
+
+    def tile_blobs(self, rect: Rect, level: int) -> Iterator[Tuple[int, int, Rect, bytes]]:
+        """
+        (x, y, visible, blob) for every stored tile overlapping ``rect`` that
+        has content, as ``tiles_in`` but with the whole tile's pixels as a
+        zlib stream. Cold tiles compressed in memory (see paging.py) hand
+        over their blob as is. Safe on a clone from another thread.
+        """
+        for px, py, tile, visible in self._content_tiles(rect):
+            blob = tile.compressed
+            if blob is None:
+                blob = zlib.compress(tile.pixels, level)
+            yield px, py, visible, blob
+
+    def content_parts(self, rect: Rect) -> Iterator[Tuple[Rect, Optional[int]]]:
+        """
+        (part, uniform) for every stored tile overlapping ``rect`` that has
+        content: the canvas rect of that content inside ``rect`` and the
+        tile's uniform pixel value (see ``Tile.content``). Operations that
+        leave transparent pixels unchanged only need to visit these parts.
+        """
+        for _px, _py, tile, visible in self._content_tiles(rect):
+            part = intersect_rects(rect, visible)
+            if part is not None:
+                yield part, tile.content()[0]
+
+    def bounds(self) -> Optional[Rect]:
+        """Canvas rect enclosing every non-transparent pixel, or None if there is none."""
+        if self._bounds_generation != self._generation:
+            ox, oy = self._origin
+            clips = self._table.clips
+            x0 = y0 = x1 = y1 = None
+            for (tx, ty), tile in self._table.tiles.items():
+                content = tile.content()[1]
+                if content is None:
+                    continue
+                px = tx * TILE_SIZE + ox
+                py = ty * TILE_SIZE + oy
+                cx, cy, cw, ch = clips.get((tx, ty), _FULL_TILE)
+                visible = intersect_rects((px + cx, py + cy, cw, ch), (px + content[0], py + content[1], content[2], content[3]))
+                if visible is None:
+                    continue
+                vx, vy, vw, vh = visible
+                x0 = vx if x0 is None else min(x0, vx)
+                y0 = vy if y0 is None else min(y0, vy)
+                x1 = vx + vw if x1 is None else max(x1, vx + vw)
+                y1 = vy + vh if y1 is None else max(y1, vy + vh)
+            self._bounds = None if x0 is None else (x0, y0, x1 - x0, y1 - y0)
+            self._bounds_generation = self._generation
+        return self._bounds
+
+    def _content_tiles(self, rect: Rect) -> Iterator[Tuple[int, int, Tile, Rect]]:
+        x, y, w, h = rect
+        if w <= 0 or h <= 0:
+            return
+        ox, oy = self._origin
+        tiles = self._table.tiles
+        clips = self._table.clips
+        for ty in _tile_span(y - oy, h):
+            for tx in _tile_span(x - ox, w):
+                tile = tiles.get((tx, ty))
+                if tile is None:
+                    continue
+                content = tile.content()[1]
+                if content is None:
+                    continue
+                px = tx * TILE_SIZE + ox
+                py = ty * TILE_SIZE + oy
+                cx, cy, cw, ch = clips.get((tx, ty), _FULL_TILE)
+                visible = intersect_rects((px + cx, py + cy, cw, ch), (px + content[0], py + content[1], content[2], content[3]))
+                if visible is not None:
+                    yield px, py, tile, visible
+
+    # --- Pixel access ---
+
+    def read(self, rect: Rect, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Copy of ``rect`` as an (h, w, 4) array, transparent where no tile exists."""
+        x, y, w, h = rect
+        if out is None:
+            out = np.zeros((h, w, 4), dtype=np.uint8)
+        else:
+            out[...] = 0
+        for tx, ty, pixels, visible in self.tiles_in(rect):
+            part = intersect_rects(rect, visible)
+            if part is None:
+                continue
+            x0, y0, pw, ph = part
+            out[y0 - y:y0 - y + ph, x0 - x:x0 - x + pw] = pixels[y0 - ty:y0 - ty + ph, x0 - tx:x0 - tx + pw]
+        return out
+
+    def write(self, rect: Rect, pixels: np.ndarray) -> None:
+        x, y, w, h = rect
+        if w <= 0 or h <= 0:
+            return
+        ox, oy = self._origin
+        tiles = self._table.tiles
+        written = False
+        for ty_idx in _tile_span(y - oy, h):
+            for tx_idx in _tile_span(x - ox, w):
+                tx = tx_idx * TILE_SIZE + ox
+                ty = ty_idx * TILE_SIZE + oy
+                x0 = max(x, tx)
+                y0 = max(y, ty)
+                x1 = min(x + w, tx + TILE_SIZE)
+                y1 = min(y + h, ty + TILE_SIZE)
+                src = pixels[y0 - y:y1 - y, x0 - x:x1 - x]
+                key = (tx_idx, ty_idx)
+                tile = tiles.get(key)
+                # Keep the grid sparse: clearing pixels of a missing tile is a no-op
+                if tile is None:
+                    if not src.any():
+                        continue
+                elif (tile.refs > 1 or self._table.refs > 1) and key not in self._table.clips:
+                    # Whole-area edits (fills, filters) rewrite mostly unchanged
+                    # pixels; do not copy shared tiles they leave as they were
+                    if np.array_equal(tile.pixels[y0 - ty:y1 - ty, x0 - tx:x1 - tx], src):
+                        continue
+                dst = self._writable_tile(key)
+                dst[y0 - ty:y1 - ty, x0 - tx:x1 - tx] = src
+                tiles = self._table.tiles
+                written = True
+        if written:
+            self._generation = next(_generations)
+
+    @contextmanager
+    def edit(self, rect: Rect) -> Iterator[np.ndarray]:
+        """Writable (h, w, 4) copy of ``rect`` that is stored back on exit."""
+        pixels = self.read(rect)
+        yield pixels
+        self.write(rect, pixels)
+
+    def image(self, rect: Rect) -> QImage:
+        """Detached QImage copy of ``rect``."""
+        x, y, w, h = rect
+        image = QImage(w, h, QImage.Format_ARGB32_Premultiplied)
+        self.read(rect, out=image_array(image))
+        return image
+
+    def write_image(self, x: int, y: int, image: QImage) -> None:
+        self.write((x, y, image.width(), image.height()), const_image_array(image))
+
+    # --- Geometry ---
+
+    def shift(self, dx: int, dy: int) -> None:
+        """Moves the content by (dx, dy) canvas pixels."""
+        if dx or dy:
+            self._origin = (self._origin[0] + dx, self._origin[1] + dy)
+            self._generation = next(_generations)
+
+    def crop(self, rect: Rect) -> None:
+        """
+        Hides everything outside ``rect``. Tiles entirely outside are dropped
+        and straddling tiles only get a visible rect, so no pixels are copied.
+        """
+        ox, oy = self._origin
+        local = (rect[0] - ox, rect[1] - oy, rect[2], rect[3])
+        table = self._table
+        dropped = []
+        clipped: Dict[TileKey, Rect] = {}
+        for key in table.tiles:
+            tx = key[0] * TILE_SIZE
+            ty = key[1] * TILE_SIZE
+            cx, cy, cw, ch = table.clips.get(key, _FULL_TILE)
+            visible = intersect_rects((tx + cx, ty + cy, cw, ch), local)
+            if visible is None:
+                dropped.append(key)
+            elif visible[2] != cw or visible[3] != ch:
+                clipped[key] = (visible[0] - tx, visible[1] - ty, visible[2], visible[3])
+        if not dropped and not clipped:
+            return
+        table = self._writable_table()
+        for key in dropped:
+            table.tiles.pop(key).refs -= 1
+            table.clips.pop(key, None)
+        table.clips.update(clipped)
+        self._generation = next(_generations)
+
+    @classmethod
+    def from_image(cls, image: QImage, x: int = 0, y: int = 0) -> "TileBuffer":
+        buffer = cls()
+        buffer.write_image(x, y, image)
+        return buffer